@@ -0,0 +1,82 @@
+"""
+Compares the former VIEW covid_data_calculated with the materialized table.
+
+Usage: python -m benchmarks.calculated_data [config.ini] [repetitions]
+"""
+import sys
+import timeit
+from datetime import date, timedelta
+
+from covidbot.__main__ import parse_config, get_connection
+from covidbot.covid_data import CovidData
+
+VIEW_NAME = "benchmark_covid_data_calculated_view"
+
+VIEW_QUERIES = {
+    "latest district row": f"SELECT * FROM {VIEW_NAME} WHERE rs=%s ORDER BY date DESC LIMIT 1",
+    "graph series": f"SELECT new_cases, county_name, date FROM {VIEW_NAME} WHERE rs=%s AND date >= %s ORDER BY date",
+    "country plausibility check": f"SELECT new_cases, new_deaths FROM {VIEW_NAME} WHERE rs=0 "
+                                  f"ORDER BY date DESC LIMIT 1",
+}
+
+TABLE_QUERIES = {
+    "latest district row": "SELECT d.*, c.county_name, c.type, c.parent FROM covid_data_calculated d "
+                           "LEFT JOIN counties c ON c.rs = d.rs WHERE d.rs=%s ORDER BY d.date DESC LIMIT 1",
+    "graph series": "SELECT d.new_cases, c.county_name, d.date FROM covid_data_calculated d "
+                    "LEFT JOIN counties c ON c.rs = d.rs WHERE d.rs=%s AND d.date >= %s ORDER BY d.date",
+    "country plausibility check": "SELECT new_cases, new_deaths FROM covid_data_calculated WHERE rs=0 "
+                                  "ORDER BY date DESC LIMIT 1",
+}
+
+
+def run_query(connection, query: str, district_id: int, oldest_date: date):
+    args = []
+    if "%s" in query:
+        args.append(district_id)
+    if query.count("%s") == 2:
+        args.append(oldest_date)
+
+    with connection.cursor() as cursor:
+        cursor.execute(query, args)
+        cursor.fetchall()
+
+
+def main():
+    config_file = sys.argv[1] if len(sys.argv) > 1 else "config.ini"
+    repetitions = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+
+    connection = get_connection(parse_config(config_file))
+    # Make sure the table exists and is migrated
+    CovidData(connection)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'CREATE OR REPLACE VIEW {VIEW_NAME} AS '
+                       'SELECT c.rs, c.county_name, c.type, c.parent, covid_data.date, '
+                       'covid_data.total_cases, covid_data.total_cases - y.total_cases as new_cases, '
+                       'covid_data.total_deaths, covid_data.total_deaths - y.total_deaths as new_deaths, '
+                       'covid_data.incidence, covid_data.last_update '
+                       'FROM covid_data '
+                       'LEFT JOIN covid_data y on y.rs = covid_data.rs AND '
+                       'y.date = subdate(covid_data.date, 1) '
+                       'LEFT JOIN counties c on c.rs = covid_data.rs '
+                       'ORDER BY covid_data.date DESC')
+
+    district_id = 3151
+    oldest_date = date.today() - timedelta(days=49)
+    try:
+        print(f"{'Query':30} {'View (ms)':>12} {'Table (ms)':>12} {'Speedup':>8}")
+        for name, view_query in VIEW_QUERIES.items():
+            table_query = TABLE_QUERIES[name]
+            view_time = timeit.timeit(lambda: run_query(connection, view_query, district_id, oldest_date),
+                                      number=repetitions) / repetitions * 1000
+            table_time = timeit.timeit(lambda: run_query(connection, table_query, district_id, oldest_date),
+                                       number=repetitions) / repetitions * 1000
+            print(f"{name:30} {view_time:12.2f} {table_time:12.2f} {view_time / table_time:7.1f}x")
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP VIEW IF EXISTS {VIEW_NAME}')
+        connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compares the per-graph render time of building the figure from scratch, as before, with the reused FigureTemplate.
+
+Usage: python -m benchmarks.figure_template [repetitions]
+"""
+import datetime
+import os
+import sys
+import tempfile
+import timeit
+
+from covidbot.covid_data.figure_template import FigureTemplate
+from covidbot.covid_data.visualization import Visualization
+
+
+def fresh_template(quadratic: bool, with_date: bool) -> FigureTemplate:
+    # Former behaviour: decode the logo and build the whole figure for every graph
+    FigureTemplate._logo = None
+    return FigureTemplate(quadratic, with_date, FigureTemplate.load_logo())
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    current_date = datetime.date.today()
+    x_data = [current_date - datetime.timedelta(days=i) for i in range(49, -1, -1)]
+    y_data = [100 + (i % 7) * 10 for i in range(len(x_data))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        filepath = os.path.join(directory, "graph.jpg")
+
+        def render():
+            Visualization._draw_incidence_graph(filepath, "Benchmark", current_date, x_data, y_data)
+
+        def setup_only():
+            Visualization.setup_plot(current_date, "Benchmark", "7-Tage-Inzidenz")
+
+        cached_get = FigureTemplate.__dict__['get']
+        results = {}
+        for name, get in [("before", staticmethod(fresh_template)), ("after", cached_get)]:
+            FigureTemplate.get = get
+            # Warm up matplotlib's font cache
+            render()
+            results[name] = (timeit.timeit(setup_only, number=repetitions) / repetitions * 1000,
+                             timeit.timeit(render, number=repetitions) / repetitions * 1000)
+        FigureTemplate.get = cached_get
+
+    print(f"{'':10} {'setup_plot (ms)':>16} {'graph (ms)':>12}")
+    for name, (setup_time, render_time) in results.items():
+        print(f"{name:10} {setup_time:16.2f} {render_time:12.2f}")
+    print(f"{'speedup':10} {results['before'][0] / results['after'][0]:15.1f}x "
+          f"{results['before'][1] / results['after'][1]:11.1f}x")
+
+
+if __name__ == "__main__":
+    main()
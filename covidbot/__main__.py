@@ -4,6 +4,7 @@ import configparser
 import locale
 import logging
 import os
+from datetime import timedelta
 from os.path import abspath
 from sys import exit
 from typing import List
@@ -96,7 +97,8 @@ class MessengerBotSetup:
         self.connections.append(user_monitor_conn)
 
         data = CovidData(data_conn)
-        visualization = Visualization(data_conn, self.config['GENERAL'].get('CACHE_DIR', 'graphics'))
+        visualization = Visualization(data_conn, self.config['GENERAL'].get('CACHE_DIR', 'graphics'),
+                                      render_workers=self.config['GENERAL'].getint('RENDER_WORKERS', fallback=2))
         user_manager = UserManager(self.name, user_conn, activated_default=users_activated)
         bot = Bot(user_manager, data, visualization, command_formatter=command_format,
                   has_location_feature=location_feature)
@@ -143,14 +145,16 @@ class MessengerBotSetup:
             from covidbot.interfaces.signal_interface import SignalInterface
             return SignalInterface(bot, self.config['SIGNAL'].get('PHONE_NUMBER'),
                                    self.config['SIGNAL'].get('SIGNALD_SOCKET'),
-                                   dev_chat=self.config['SIGNAL'].get('DEV_CHAT'))
+                                   dev_chat=self.config['SIGNAL'].get('DEV_CHAT'),
+                                   max_in_flight=self.config['SIGNAL'].getint('MAX_IN_FLIGHT', fallback=4))
 
         if self.name == "telegram":
             if not self.config.has_section("TELEGRAM"):
                 raise ValueError("TELEGRAM is not configured")
             from covidbot.interfaces.telegram_interface import TelegramInterface
             return TelegramInterface(bot, api_key=self.config['TELEGRAM'].get('API_KEY'),
-                                     dev_chat_id=self.config['TELEGRAM'].getint("DEV_CHAT"))
+                                     dev_chat_id=self.config['TELEGRAM'].getint("DEV_CHAT"),
+                                     send_workers=self.config['TELEGRAM'].getint("SEND_WORKERS", fallback=8))
         if self.name == "feedback":
             if not self.config.has_section("TELEGRAM"):
                 raise ValueError("TELEGRAM is not configured")
@@ -291,6 +295,8 @@ def main():
     parser.add_argument('--all', help='Intended receivers, requires --platform', action='store_true')
     parser.add_argument('--specific', help='Intended receivers, requires --platform', metavar='USER',
                         action='store', nargs="+", type=str)
+    parser.add_argument('--import-gazetteer', help='Create the offline gazetteer from a GeoNames export',
+                        metavar='GEONAMES_FILE', action='store')
 
     # Just for testing
     parser.add_argument('--graphic-test', help='Generate graphic for testing', action='store_true')
@@ -305,7 +311,8 @@ def main():
     else:
         logging_level = logging.INFO
 
-    if not args.platform and not (args.check_updates or args.message_user or args.graphic_test):
+    if not args.platform and not (args.check_updates or args.message_user or args.graphic_test
+                                  or args.import_gazetteer):
         print("Exactly one platform has to be set, e.g. --platform telegram")
         exit(1)
 
@@ -346,12 +353,15 @@ def main():
             from covidbot.covid_data import CovidData, VaccinationGermanyUpdater, \
                 VaccinationGermanyImpfdashboardUpdater, RValueGermanyUpdater, RKIUpdater, ICUGermanyUpdater, \
                 RulesGermanyUpdater, ICUGermanyHistoryUpdater
+            graph_data_updated = False
             for updater in [RKIUpdater(conn), ICUGermanyHistoryUpdater(conn),
                             VaccinationGermanyImpfdashboardUpdater(conn), RulesGermanyUpdater(conn),
                             VaccinationGermanyUpdater(conn), RValueGermanyUpdater(conn), ICUGermanyUpdater(conn)]:
                 try:
                     if updater.update():
                         logging.warning(f"Got new data from {updater.__class__.__name__}")
+                        if isinstance(updater, (RKIUpdater, ICUGermanyUpdater)):
+                            graph_data_updated = True
                         with MessengerBotSetup("telegram", config, setup_logs=False, monitoring=False) as telegram:
                             asyncio.run(
                                 telegram.send_message_to_users(f"Got new data from {updater.__class__.__name__}",
@@ -365,6 +375,26 @@ def main():
                                                                    f"{updater.__class__.__name__}: {error}",
                                                                    [config["TELEGRAM"].get("DEV_CHAT")]))
 
+            from covidbot.covid_data.graphics_cache import GraphicsCache
+            cache_dir = config['GENERAL'].get('CACHE_DIR', 'graphics')
+            visualization = Visualization(conn, cache_dir,
+                                          render_workers=config['GENERAL'].getint('RENDER_WORKERS', fallback=2),
+                                          cache=GraphicsCache(cache_dir,
+                                                              max_bytes=config['GENERAL'].getint(
+                                                                  'CACHE_MAX_MB', fallback=500) * 1024 * 1024,
+                                                              max_age=timedelta(days=config['GENERAL'].getint(
+                                                                  'CACHE_MAX_AGE_DAYS', fallback=7))))
+            try:
+                # Render graphs before the reports are sent
+                if graph_data_updated:
+                    from covidbot.graph_warmup import GraphWarmup
+                    GraphWarmup(conn, CovidData(conn), visualization).run()
+                visualization.cleanup_cache()
+            except Exception as error:
+                logging.exception(f"Exception happened on graph warmup and cleanup: {error}", exc_info=error)
+            finally:
+                visualization.shutdown()
+
         # Forward Feedback
         try:
             with MessengerBotSetup("feedback", config, setup_logs=False, monitoring=False) as iface:
@@ -438,6 +468,12 @@ def main():
                     asyncio.run(telegram.send_message_to_users(f"Exception happened while running {args.platform} bot:"
                                                                f"{e}", [config["TELEGRAM"].get("DEV_CHAT")]))
                 raise e
+    elif args.import_gazetteer:
+        logging.basicConfig(format=LOGGING_FORMAT, level=logging_level)
+        from covidbot.location_service import GeoLookup, Gazetteer
+        number = Gazetteer.build(args.import_gazetteer, GeoLookup('resources/germany_rs.geojson'),
+                                 'resources/gazetteer.tsv')
+        print(f"Imported {number} place names into resources/gazetteer.tsv")
     elif args.graphic_test:
         vis = Visualization(get_connection(config), abspath("graphics/"), disable_cache=True)
         vis.icu_graph(0)
@@ -11,6 +11,7 @@ from covidbot.covid_data.models import District, DistrictData
 from covidbot.location_service import LocationService
 from covidbot.interfaces.messenger_interface import MessengerInterface
 from covidbot.metrics import BOT_COMMAND_COUNT
+from covidbot.report_cache import ReportCache
 from covidbot.user_hint_service import UserHintService
 from covidbot.user_manager import UserManager, BotUser
 from covidbot.settings import BotUserSettings
@@ -45,13 +46,21 @@ class Bot(object):
     covid_data: CovidData
     visualization: Visualization
     user_hints: UserHintService
+    report_cache: ReportCache
     has_location_feature: bool
     location_service: LocationService = LocationService('resources/germany_rs.geojson')
     command_formatter: Callable[[str], str]
     handler_list: List[Handler] = []
     chat_states: Dict[int, Tuple[ChatBotState, Optional[str]]] = {}
+    report_users: Dict[Union[int, str], BotUser]
     log = logging.getLogger(__name__)
 
+    # Reports that are sent by get_available_user_messages
+    REPORT_TYPES = [ReportType.CASES_GERMANY]
+    # Settings that change the content of a report
+    REPORT_SETTINGS = [BotUserSettings.REPORT_GRAPHICS, BotUserSettings.REPORT_INCLUDE_VACCINATION,
+                       BotUserSettings.REPORT_INCLUDE_ICU, BotUserSettings.REPORT_EXTENSIVE_GRAPHICS]
+
     def __init__(self, user_manager: UserManager, covid_data: CovidData, visualization: Visualization,
                  command_formatter: Callable[[str], str], has_location_feature: bool = False):
         self.user_manager = user_manager
@@ -60,6 +69,8 @@ class Bot(object):
         self.has_location_feature = has_location_feature
         self.command_formatter = command_formatter
         self.user_hints = UserHintService(self.command_formatter)
+        self.report_cache = ReportCache()
+        self.report_users = {}
         self.handler_list.append(Handler("start", self.startHandler, False))
         self.handler_list.append(Handler("hilfe", self.helpHandler, False))
         self.handler_list.append(Handler("info", self.infoHandler, False))
@@ -98,6 +109,15 @@ class Bot(object):
         user_id = self.user_manager.get_user_id(user_identification, create_if_not_exists=False)
         return self.user_manager.get_user_setting(user_id, setting)
 
+    def get_report_user_setting(self, platform_id: Union[int, str], setting: BotUserSettings) -> bool:
+        """
+        Returns a setting of a user that is currently receiving a report from :py:meth:`get_available_user_messages`,
+        from the settings that were loaded together with the user. Falls back to the database for other users.
+        """
+        if platform_id in self.report_users:
+            return self.report_users[platform_id].get_setting(setting)
+        return self.get_user_setting(platform_id, setting)
+
     def disable_user(self, user_identification: Union[int, str]):
         user_id = self.user_manager.get_user_id(user_identification)
         if user_id:
@@ -439,8 +459,10 @@ class Bot(object):
         if not type(location) == District:
             return location
 
-        graphics = [self.visualization.infections_graph(location.id),
-                    self.visualization.incidence_graph(location.id)]
+        # Render both graphs in parallel
+        graphics = [self.visualization.infections_graph_future(location.id),
+                    self.visualization.incidence_graph_future(location.id)]
+        graphics = [graph.result() for graph in graphics]
         current_data = self.covid_data.get_district_data(location.id)
         sources = [f'Infektionsdaten vom {current_data.date.strftime("%d.%m.%Y")}. '
                    f'Infektionsdaten und R-Wert vom Robert Koch-Institut (RKI), '
@@ -554,9 +576,9 @@ class Bot(object):
         if not user:
             return self._get_report([])
 
-        if self.user_manager.get_user_setting(user_id, BotUserSettings.BETA):
-            return self._get_new_report(user.subscriptions, user_id)
-        return self._get_report(user.subscriptions, user.id)
+        if user.get_setting(BotUserSettings.BETA):
+            return self._get_new_report(user.subscriptions, user.settings)
+        return self._get_report(user.subscriptions, user.settings)
 
     def directHandler(self, user_input: str, user_id: int) -> List[BotResponse]:
         location = self.parseLocationInput(user_input, set_feedback=user_id)
@@ -728,180 +750,103 @@ class Bot(object):
         return [BotResponse("Möchtest du den täglichen Bericht abbestellen und alle von dir bei uns gespeicherten Daten"
                             " löschen?", choices=choices)]
 
-    def _get_new_report(self, subscriptions: List[int], user_id: Optional[int] = None) -> List[BotResponse]:
+    def _get_new_report(self, subscriptions: List[int], settings: Optional[int] = None) -> List[BotResponse]:
+        return self._get_cached_report(True, subscriptions, self._get_report_settings(settings))
+
+    def _get_report(self, subscriptions: List[int], settings: Optional[int] = None) -> List[BotResponse]:
+        return self._get_cached_report(False, subscriptions, self._get_report_settings(settings))
+
+    def _get_report_settings(self, settings: Optional[int]) -> int:
+        """
+        Reduces the settings bitmask of a user to the settings that change the report
+        :param settings: Bitmask of the user settings, default settings if None
+        :return: Bitmask of the report settings
+        """
+        if settings is None:
+            settings = BotUserSettings.default_bitmask()
+
+        report_settings = 0
+        for setting in self.REPORT_SETTINGS:
+            report_settings |= settings & BotUserSettings.bit(setting)
+        return report_settings
+
+    def _get_cached_report(self, new_report: bool, subscriptions: List[int], settings: int) -> List[BotResponse]:
+        """
+        Returns the report for the given subscriptions and settings, which is rendered only once per data version and
+        day and shared between all users with the same configuration
+        :param new_report: Whether the report of the beta version should be generated
+        :param subscriptions: Subscribed district IDs
+        :param settings: Bitmask of the users report settings
+        :return: List of BotResponse
+        """
+        subscriptions = subscriptions or []
+        self.report_cache.set_version((self.covid_data.get_data_version(), date.today()))
+
+        # Order of the subscriptions is only relevant if the graph does not contain all of them
+        if len(subscriptions) <= 8:
+            subscription_key = tuple(sorted(subscriptions))
+        else:
+            subscription_key = tuple(subscriptions)
+
+        if new_report:
+            return self.report_cache.get_report((new_report, subscription_key, settings),
+                                                lambda: self._render_new_report(subscriptions, settings))
+        return self.report_cache.get_report((new_report, subscription_key, settings),
+                                            lambda: self._render_report(subscriptions, settings))
+
+    def _render_new_report(self, subscriptions: List[int], settings: int) -> List[BotResponse]:
         # Visualization
         graphs = []
-        if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_GRAPHICS):
+        if settings & BotUserSettings.bit(BotUserSettings.REPORT_GRAPHICS):
             graphs.append(self.visualization.infections_graph(0))
 
         country = self.covid_data.get_country_data()
-        message = "<b>Corona-Bericht vom {date}</b>\n\n"
-        message += "<b>🦠 Infektionszahlen</b>\n" \
-                   "Insgesamt wurden bundesweit {new_cases}{new_cases_trend} und " \
-                   "{new_deaths}{new_deaths_trend} gemeldet. Die 7-Tage-Inzidenz liegt bei {incidence}" \
-                   "{incidence_trend}."
-        if country.r_value:
-            message += " Der zuletzt gemeldete 7-Tage-R-Wert beträgt {r_value}{r_trend}." \
-                .format(r_value=format_float(country.r_value.r_value_7day),
-                        r_trend=format_data_trend(country.r_value.r_trend))
-        message += "\n\n"
-        message = message.format(date=self.covid_data.get_last_update().strftime("%d.%m.%Y"),
-                                 new_cases=format_noun(country.new_cases, FormattableNoun.INFECTIONS),
-                                 new_cases_trend=format_data_trend(country.cases_trend),
-                                 new_deaths=format_noun(country.new_deaths, FormattableNoun.DEATHS),
-                                 new_deaths_trend=format_data_trend(country.deaths_trend),
-                                 incidence=format_float(country.incidence),
-                                 incidence_trend=format_data_trend(country.incidence_trend))
+        message = self.report_cache.get_section("country", lambda: self._render_country_section(country))
         if subscriptions and len(subscriptions) > 0:
             # Split Bundeslaender from other
-            districts = list(map(lambda rs: self.covid_data.get_district_data(rs), subscriptions))
+            districts = list(self.covid_data.get_district_data_many(subscriptions).values())
             states = list(filter(lambda d: d.type == "Bundesland", districts))
             cities = list(filter(lambda d: d.type != "Bundesland" and d.type != "Staat", districts))
             districts = self.sort_districts(states) + self.sort_districts(cities)
             if len(districts) > 0:
                 for district in districts:
-                    message += "<b>{name}</b>: {incidence}{incidence_trend}" \
-                        .format(name=district.name,
-                                incidence=format_float(district.incidence),
-                                incidence_trend=format_data_trend(district.incidence_trend))
-
-                    if district.incidence_interval_since is not None:
-                        date_interval = district.date - district.incidence_interval_since
-                        if date_interval.days != 0:
-                            days = format_noun(date_interval.days, FormattableNoun.DAYS)
-                        else:
-                            days = "heute"
-
-                        if district.incidence < district.incidence_interval_threshold:
-                            word = "unter"
-                        else:
-                            word = "über"
-
-                        message += "\n• Seit {interval_length} {word} {interval}" \
-                            .format(interval_length=days, interval=district.incidence_interval_threshold, word=word)
-
-                    message += "\n• {new_cases}, {new_deaths}" \
-                        .format(new_cases=format_noun(district.new_cases, FormattableNoun.INFECTIONS),
-                                new_deaths=format_noun(district.new_deaths, FormattableNoun.DEATHS))
-                    if (district.new_cases and district.new_cases < 0) or (
-                            district.new_deaths and district.new_deaths < 0):
-                        message += "\n• <i>Eine negative Differenz zum Vortag ist idR. auf eine Korrektur der Daten " \
-                                   "durch das Gesundheitsamt zurückzuführen</i>"
-                    if district.icu_data:
-                        message += "\n• {percent_occupied}% ({beds_occupied}){occupied_trend} belegt, in {percent_covid}% ({beds_covid}){covid_trend} Covid19-Patient:innen, {clear_beds} frei" \
-                            .format(beds_occupied=format_noun(district.icu_data.occupied_beds, FormattableNoun.BEDS),
-                                    percent_occupied=format_float(district.icu_data.percent_occupied()),
-                                    occupied_trend=format_data_trend(district.icu_data.occupied_beds_trend),
-                                    beds_covid=format_noun(district.icu_data.occupied_covid, FormattableNoun.BEDS),
-                                    clear_beds=format_noun(district.icu_data.clear_beds, FormattableNoun.BEDS),
-                                    percent_covid=format_float(district.icu_data.percent_covid()),
-                                    covid_trend=format_data_trend(district.icu_data.occupied_covid_trend))
-
-                    if district.vaccinations:
-                        message += "\n• {no_doses} Neuimpfungen, {vacc_partial}% min. eine, {vacc_full}% beide Impfungen erhalten" \
-                            .format(no_doses=format_int(district.vaccinations.doses_diff),
-                                    vacc_partial=format_float(district.vaccinations.partial_rate * 100),
-                                    vacc_full=format_float(district.vaccinations.full_rate * 100),
-                                    )
-                    message += "\n\n"
-            if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_GRAPHICS):
-                # Generate multi-incidence graph for up to 8 districts
-                districts = subscriptions[-8:]
-                if 0 in subscriptions and 0 not in districts:
-                    districts[0] = 0
-                graphs.append(self.visualization.multi_incidence_graph(districts))
-
-        if country.vaccinations and self.user_manager.get_user_setting(user_id,
-                                                                       BotUserSettings.REPORT_INCLUDE_VACCINATION,
-                                                                       ):
-            message += "<b>💉 Impfdaten</b>\n" \
-                       "Am {date} wurden {doses} Dosen verimpft. So haben {vacc_partial} ({rate_partial}%) Personen in Deutschland mindestens eine Impfdosis " \
-                       "erhalten, {vacc_full} ({rate_full}%) Menschen sind bereits vollständig geimpft. " \
-                       "Bei dem Impftempo der letzten 7 Tage werden {vacc_speed} Dosen pro Tag verabreicht und in " \
-                       "{vacc_days_to_finish} Tagen wäre die gesamte Bevölkerung vollständig geschützt." \
-                       "\n\n" \
-                .format(rate_full=format_float(country.vaccinations.full_rate * 100),
-                        rate_partial=format_float(country.vaccinations.partial_rate * 100),
-                        vacc_partial=format_int(country.vaccinations.vaccinated_partial),
-                        vacc_full=format_int(country.vaccinations.vaccinated_full),
-                        date=country.vaccinations.date.strftime("%d.%m.%Y"),
-                        doses=format_int(country.vaccinations.doses_diff),
-                        vacc_speed=format_int(country.vaccinations.avg_speed),
-                        vacc_days_to_finish=format_int(country.vaccinations.avg_days_to_finish))
-            if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
+                    message += self.report_cache.get_section(("district", district.id),
+                                                             lambda: self._render_district_section(district))
+            if settings & BotUserSettings.bit(BotUserSettings.REPORT_GRAPHICS):
+                graphs.append(self.visualization.multi_incidence_graph(self.get_multi_incidence_districts(
+                    subscriptions)))
+
+        if country.vaccinations and settings & BotUserSettings.bit(BotUserSettings.REPORT_INCLUDE_VACCINATION):
+            message += self.report_cache.get_section(("vaccination", True),
+                                                     lambda: self._render_vaccination_section(country, True))
+            if settings & BotUserSettings.bit(BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
                 graphs.append(self.visualization.vaccination_graph(country.id))
                 graphs.append(self.visualization.vaccination_speed_graph(country.id))
 
-        if country.icu_data and self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_INCLUDE_ICU):
-            message += f"<b>🏥 Intensivbetten</b>\n" \
-                       f"{format_float(country.icu_data.percent_occupied())}% " \
-                       f"({format_noun(country.icu_data.occupied_beds, FormattableNoun.BEDS)})" \
-                       f"{format_data_trend(country.icu_data.occupied_beds_trend)} " \
-                       f"der Intensivbetten sind aktuell belegt. " \
-                       f"In {format_noun(country.icu_data.occupied_covid, FormattableNoun.BEDS)} " \
-                       f"({format_float(country.icu_data.percent_covid())}%)" \
-                       f"{format_data_trend(country.icu_data.occupied_covid_trend)} " \
-                       f" liegen Patient:innen" \
-                       f" mit COVID-19, davon müssen {format_noun(country.icu_data.covid_ventilated, FormattableNoun.PERSONS)}" \
-                       f" ({format_float(country.icu_data.percent_ventilated())}%) invasiv beatmet werden. " \
-                       f"Insgesamt gibt es {format_noun(country.icu_data.total_beds(), FormattableNoun.BEDS)}.\n\n"
-            if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
+        if country.icu_data and settings & BotUserSettings.bit(BotUserSettings.REPORT_INCLUDE_ICU):
+            message += self.report_cache.get_section("icu", lambda: self._render_icu_section(country))
+            if settings & BotUserSettings.bit(BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
                 graphs.append(self.visualization.icu_graph(country.id))
 
-        user_hint = self.user_hints.get_hint_of_today()
-        if user_hint:
-            message += f"{user_hint}\n\n"
-
-        message += '<i>Daten vom Robert Koch-Institut (RKI), Lizenz: dl-de/by-2-0, weitere Informationen findest Du' \
-                   ' im <a href="https://corona.rki.de/">Dashboard des RKI</a> und dem ' \
-                   '<a href="https://impfdashboard.de/">Impfdashboard</a>. ' \
-                   'Intensivbettendaten vom <a href="https://intensivregister.de">DIVI-Intensivregister</a>.</i>' \
-                   '\n\n' \
-                   '<i>Sende {info_command} um eine Erläuterung ' \
-                   'der Daten zu erhalten. Ein Service von <a href="https://d-64.org">D64 - Zentrum für Digitalen ' \
-                   'Fortschritt</a>.</i>'.format(info_command=self.command_formatter("Info"))
-
-        message += '\n\n🧒🏽👦🏻 Sharing is caring 👩🏾🧑🏼 <a href="https://covidbot.d-64.org">www.covidbot.d-64.org</a>'
-
-        message += "\n\n<b>Danke für das bisherige Feedback! Wir haben den Bericht jetzt auch konfigurierbar gemacht, " \
-                   "so kann man bspw. einstellen, ob man den Impfüberblick oder die Intensivbettenlage sehen möchte. " \
-                   f"Sende einfach {self.command_formatter('Einstellungen')} um einen Überblick über die Optionen zu " \
-                   f"erhalten. Wir würden uns sehr über Feedback " \
-                   "freuen, sende uns einfach eine Nachricht. Danke 🙏</b>"
+        message += self.report_cache.get_section(("footer", True), lambda: self._render_footer_section(True))
 
         reports = [BotResponse(message, graphs)]
         return reports
 
-    def _get_report(self, subscriptions: List[int], user_id: Optional[int] = None) -> List[BotResponse]:
+    def _render_report(self, subscriptions: List[int], settings: int) -> List[BotResponse]:
         # Visualization
         graphs = []
-        if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_GRAPHICS):
+        if settings & BotUserSettings.bit(BotUserSettings.REPORT_GRAPHICS):
             graphs.append(self.visualization.infections_graph(0))
 
         country = self.covid_data.get_country_data()
-        message = "<b>Corona-Bericht vom {date}</b>\n\n"
-        message += "<b>🦠 Infektionszahlen</b>\n" \
-                   "Insgesamt wurden bundesweit {new_cases}{new_cases_trend} und " \
-                   "{new_deaths}{new_deaths_trend} gemeldet. Die 7-Tage-Inzidenz liegt bei {incidence}" \
-                   "{incidence_trend}."
-        if country.r_value:
-            message += " Der zuletzt gemeldete 7-Tage-R-Wert beträgt {r_value}{r_trend}." \
-                .format(r_value=format_float(country.r_value.r_value_7day),
-                        r_trend=format_data_trend(country.r_value.r_trend))
-        message += "\n\n"
-        message = message.format(date=self.covid_data.get_last_update().strftime("%d.%m.%Y"),
-                                 new_cases=format_noun(country.new_cases, FormattableNoun.INFECTIONS),
-                                 new_cases_trend=format_data_trend(country.cases_trend),
-                                 new_deaths=format_noun(country.new_deaths, FormattableNoun.DEATHS),
-                                 new_deaths_trend=format_data_trend(country.deaths_trend),
-                                 incidence=format_float(country.incidence),
-                                 incidence_trend=format_data_trend(country.incidence_trend))
+        message = self.report_cache.get_section("country", lambda: self._render_country_section(country))
         if subscriptions and len(subscriptions) > 0:
             message += "Die 7-Tage-Inzidenz sowie die Neuinfektionen und Todesfälle seit gestern fallen für die von " \
                        "dir abonnierten Orte wie folgt aus:\n\n"
 
             # Split Bundeslaender from other
-            subscription_data = list(map(lambda rs: self.covid_data.get_district_data(rs), subscriptions))
+            subscription_data = list(self.covid_data.get_district_data_many(subscriptions).values())
             subscribed_bls = list(filter(lambda d: d.type == "Bundesland", subscription_data))
             subscribed_cities = list(filter(lambda d: d.type != "Bundesland" and d.type != "Staat", subscription_data))
             if len(subscribed_bls) > 0:
@@ -917,42 +862,138 @@ class Bot(object):
                            self.sort_districts(grouped_districts[key]))
                 message += "\n".join(data) + "\n\n"
 
-            if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_GRAPHICS):
-                # Generate multi-incidence graph for up to 8 districts
-                districts = subscriptions[-8:]
-                if 0 in subscriptions and 0 not in districts:
-                    districts[0] = 0
-                graphs.append(self.visualization.multi_incidence_graph(districts))
-
-        if country.vaccinations and self.user_manager.get_user_setting(user_id,
-                                                                       BotUserSettings.REPORT_INCLUDE_VACCINATION):
-            message += "<b>💉 Impfdaten</b>\n" \
-                       "Am {date} wurden {doses} Dosen verimpft. So haben {vacc_partial} ({rate_partial}%) Personen in Deutschland mindestens eine Impfdosis " \
-                       "erhalten, {vacc_full} ({rate_full}%) Menschen sind bereits vollständig geimpft.\n\n" \
+            if settings & BotUserSettings.bit(BotUserSettings.REPORT_GRAPHICS):
+                graphs.append(self.visualization.multi_incidence_graph(self.get_multi_incidence_districts(
+                    subscriptions)))
+
+        if country.vaccinations and settings & BotUserSettings.bit(BotUserSettings.REPORT_INCLUDE_VACCINATION):
+            message += self.report_cache.get_section(("vaccination", False),
+                                                     lambda: self._render_vaccination_section(country, False))
+            if settings & BotUserSettings.bit(BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
+                graphs.append(self.visualization.vaccination_graph(country.id))
+                graphs.append(self.visualization.vaccination_speed_graph(country.id))
+
+        if country.icu_data and settings & BotUserSettings.bit(BotUserSettings.REPORT_INCLUDE_ICU):
+            message += self.report_cache.get_section("icu", lambda: self._render_icu_section(country))
+
+        message += self.report_cache.get_section(("footer", False), lambda: self._render_footer_section(False))
+
+        reports = [BotResponse(message, graphs)]
+        return reports
+
+    def _render_country_section(self, country: DistrictData) -> str:
+        message = "<b>Corona-Bericht vom {date}</b>\n\n"
+        message += "<b>🦠 Infektionszahlen</b>\n" \
+                   "Insgesamt wurden bundesweit {new_cases}{new_cases_trend} und " \
+                   "{new_deaths}{new_deaths_trend} gemeldet. Die 7-Tage-Inzidenz liegt bei {incidence}" \
+                   "{incidence_trend}."
+        if country.r_value:
+            message += " Der zuletzt gemeldete 7-Tage-R-Wert beträgt {r_value}{r_trend}." \
+                .format(r_value=format_float(country.r_value.r_value_7day),
+                        r_trend=format_data_trend(country.r_value.r_trend))
+        message += "\n\n"
+        message = message.format(date=self.covid_data.get_last_update().strftime("%d.%m.%Y"),
+                                 new_cases=format_noun(country.new_cases, FormattableNoun.INFECTIONS),
+                                 new_cases_trend=format_data_trend(country.cases_trend),
+                                 new_deaths=format_noun(country.new_deaths, FormattableNoun.DEATHS),
+                                 new_deaths_trend=format_data_trend(country.deaths_trend),
+                                 incidence=format_float(country.incidence),
+                                 incidence_trend=format_data_trend(country.incidence_trend))
+        return message
+
+    @staticmethod
+    def _render_district_section(district: DistrictData) -> str:
+        message = "<b>{name}</b>: {incidence}{incidence_trend}" \
+            .format(name=district.name,
+                    incidence=format_float(district.incidence),
+                    incidence_trend=format_data_trend(district.incidence_trend))
+
+        if district.incidence_interval_since is not None:
+            date_interval = district.date - district.incidence_interval_since
+            if date_interval.days != 0:
+                days = format_noun(date_interval.days, FormattableNoun.DAYS)
+            else:
+                days = "heute"
+
+            if district.incidence < district.incidence_interval_threshold:
+                word = "unter"
+            else:
+                word = "über"
+
+            message += "\n• Seit {interval_length} {word} {interval}" \
+                .format(interval_length=days, interval=district.incidence_interval_threshold, word=word)
+
+        message += "\n• {new_cases}, {new_deaths}" \
+            .format(new_cases=format_noun(district.new_cases, FormattableNoun.INFECTIONS),
+                    new_deaths=format_noun(district.new_deaths, FormattableNoun.DEATHS))
+        if (district.new_cases and district.new_cases < 0) or (
+                district.new_deaths and district.new_deaths < 0):
+            message += "\n• <i>Eine negative Differenz zum Vortag ist idR. auf eine Korrektur der Daten " \
+                       "durch das Gesundheitsamt zurückzuführen</i>"
+        if district.icu_data:
+            message += "\n• {percent_occupied}% ({beds_occupied}){occupied_trend} belegt, in {percent_covid}% ({beds_covid}){covid_trend} Covid19-Patient:innen, {clear_beds} frei" \
+                .format(beds_occupied=format_noun(district.icu_data.occupied_beds, FormattableNoun.BEDS),
+                        percent_occupied=format_float(district.icu_data.percent_occupied()),
+                        occupied_trend=format_data_trend(district.icu_data.occupied_beds_trend),
+                        beds_covid=format_noun(district.icu_data.occupied_covid, FormattableNoun.BEDS),
+                        clear_beds=format_noun(district.icu_data.clear_beds, FormattableNoun.BEDS),
+                        percent_covid=format_float(district.icu_data.percent_covid()),
+                        covid_trend=format_data_trend(district.icu_data.occupied_covid_trend))
+
+        if district.vaccinations:
+            message += "\n• {no_doses} Neuimpfungen, {vacc_partial}% min. eine, {vacc_full}% beide Impfungen erhalten" \
+                .format(no_doses=format_int(district.vaccinations.doses_diff),
+                        vacc_partial=format_float(district.vaccinations.partial_rate * 100),
+                        vacc_full=format_float(district.vaccinations.full_rate * 100),
+                        )
+        message += "\n\n"
+        return message
+
+    @staticmethod
+    def _render_vaccination_section(country: DistrictData, new_report: bool) -> str:
+        if new_report:
+            return "<b>💉 Impfdaten</b>\n" \
+                   "Am {date} wurden {doses} Dosen verimpft. So haben {vacc_partial} ({rate_partial}%) Personen in Deutschland mindestens eine Impfdosis " \
+                   "erhalten, {vacc_full} ({rate_full}%) Menschen sind bereits vollständig geimpft. " \
+                   "Bei dem Impftempo der letzten 7 Tage werden {vacc_speed} Dosen pro Tag verabreicht und in " \
+                   "{vacc_days_to_finish} Tagen wäre die gesamte Bevölkerung vollständig geschützt." \
+                   "\n\n" \
                 .format(rate_full=format_float(country.vaccinations.full_rate * 100),
                         rate_partial=format_float(country.vaccinations.partial_rate * 100),
                         vacc_partial=format_int(country.vaccinations.vaccinated_partial),
                         vacc_full=format_int(country.vaccinations.vaccinated_full),
                         date=country.vaccinations.date.strftime("%d.%m.%Y"),
-                        doses=format_int(country.vaccinations.doses_diff))
-            if self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_EXTENSIVE_GRAPHICS):
-                graphs.append(self.visualization.vaccination_graph(country.id))
-                graphs.append(self.visualization.vaccination_speed_graph(country.id))
+                        doses=format_int(country.vaccinations.doses_diff),
+                        vacc_speed=format_int(country.vaccinations.avg_speed),
+                        vacc_days_to_finish=format_int(country.vaccinations.avg_days_to_finish))
 
-        if country.icu_data and self.user_manager.get_user_setting(user_id, BotUserSettings.REPORT_INCLUDE_ICU):
-            message += f"<b>🏥 Intensivbetten</b>\n" \
-                       f"{format_float(country.icu_data.percent_occupied())}% " \
-                       f"({format_noun(country.icu_data.occupied_beds, FormattableNoun.BEDS)})" \
-                       f"{format_data_trend(country.icu_data.occupied_beds_trend)} " \
-                       f"der Intensivbetten sind aktuell belegt. " \
-                       f"In {format_noun(country.icu_data.occupied_covid, FormattableNoun.BEDS)} " \
-                       f"({format_float(country.icu_data.percent_covid())}%)" \
-                       f"{format_data_trend(country.icu_data.occupied_covid_trend)} " \
-                       f" liegen Patient:innen" \
-                       f" mit COVID-19, davon müssen {format_noun(country.icu_data.covid_ventilated, FormattableNoun.PERSONS)}" \
-                       f" ({format_float(country.icu_data.percent_ventilated())}%) invasiv beatmet werden. " \
-                       f"Insgesamt gibt es {format_noun(country.icu_data.total_beds(), FormattableNoun.BEDS)}.\n\n"
+        return "<b>💉 Impfdaten</b>\n" \
+               "Am {date} wurden {doses} Dosen verimpft. So haben {vacc_partial} ({rate_partial}%) Personen in Deutschland mindestens eine Impfdosis " \
+               "erhalten, {vacc_full} ({rate_full}%) Menschen sind bereits vollständig geimpft.\n\n" \
+            .format(rate_full=format_float(country.vaccinations.full_rate * 100),
+                    rate_partial=format_float(country.vaccinations.partial_rate * 100),
+                    vacc_partial=format_int(country.vaccinations.vaccinated_partial),
+                    vacc_full=format_int(country.vaccinations.vaccinated_full),
+                    date=country.vaccinations.date.strftime("%d.%m.%Y"),
+                    doses=format_int(country.vaccinations.doses_diff))
 
+    @staticmethod
+    def _render_icu_section(country: DistrictData) -> str:
+        return f"<b>🏥 Intensivbetten</b>\n" \
+               f"{format_float(country.icu_data.percent_occupied())}% " \
+               f"({format_noun(country.icu_data.occupied_beds, FormattableNoun.BEDS)})" \
+               f"{format_data_trend(country.icu_data.occupied_beds_trend)} " \
+               f"der Intensivbetten sind aktuell belegt. " \
+               f"In {format_noun(country.icu_data.occupied_covid, FormattableNoun.BEDS)} " \
+               f"({format_float(country.icu_data.percent_covid())}%)" \
+               f"{format_data_trend(country.icu_data.occupied_covid_trend)} " \
+               f" liegen Patient:innen" \
+               f" mit COVID-19, davon müssen {format_noun(country.icu_data.covid_ventilated, FormattableNoun.PERSONS)}" \
+               f" ({format_float(country.icu_data.percent_ventilated())}%) invasiv beatmet werden. " \
+               f"Insgesamt gibt es {format_noun(country.icu_data.total_beds(), FormattableNoun.BEDS)}.\n\n"
+
+    def _render_footer_section(self, new_report: bool) -> str:
+        message = ""
         user_hint = self.user_hints.get_hint_of_today()
         if user_hint:
             message += f"{user_hint}\n\n"
@@ -968,8 +1009,13 @@ class Bot(object):
 
         message += '\n\n🧒🏽👦🏻 Sharing is caring 👩🏾🧑🏼 <a href="https://covidbot.d-64.org">www.covidbot.d-64.org</a>'
 
-        reports = [BotResponse(message, graphs)]
-        return reports
+        if new_report:
+            message += "\n\n<b>Danke für das bisherige Feedback! Wir haben den Bericht jetzt auch konfigurierbar gemacht, " \
+                       "so kann man bspw. einstellen, ob man den Impfüberblick oder die Intensivbettenlage sehen möchte. " \
+                       f"Sende einfach {self.command_formatter('Einstellungen')} um einen Überblick über die Optionen zu " \
+                       f"erhalten. Wir würden uns sehr über Feedback " \
+                       "freuen, sende uns einfach eine Nachricht. Danke 🙏</b>"
+        return message
 
     @staticmethod
     def format_district_data(district: DistrictData) -> str:
@@ -989,23 +1035,31 @@ class Bot(object):
         """
         users = []
         data_update = self.covid_data.get_last_update()
-        for user in self.user_manager.get_all_user(with_subscriptions=True):
-            if not user.activated or not user.subscriptions or user.created.date() == date.today():
-                continue
-
-            if ReportType.CASES_GERMANY in user.subscribed_reports:
-                last_update = self.user_manager.get_last_updates(user.id, ReportType.CASES_GERMANY)
-                if not last_update or last_update.date() < data_update:
-                    users.append((user, ReportType.CASES_GERMANY))
-
-        for user, report in users:
-            if report == ReportType.CASES_GERMANY:
-                if self.user_manager.get_user_setting(user.id, BotUserSettings.BETA):
-                    yield ReportType.CASES_GERMANY, user.platform_id, self._get_new_report(user.subscriptions, user.id)
+        if not data_update:
+            return
+
+        pending = self.user_manager.get_pending_reports(data_update, self.REPORT_TYPES)
+        if not pending:
+            return
+
+        for user in self.user_manager.get_all_user(with_subscriptions=True, filter_ids=list(pending.keys())):
+            for report in pending.get(user.id, []):
+                users.append((user, report))
+
+        self.report_users = {user.platform_id: user for user, _ in users}
+        try:
+            for user, report in users:
+                if report == ReportType.CASES_GERMANY:
+                    if user.get_setting(BotUserSettings.BETA):
+                        yield ReportType.CASES_GERMANY, user.platform_id, self._get_new_report(user.subscriptions,
+                                                                                               user.settings)
+                    else:
+                        yield ReportType.CASES_GERMANY, user.platform_id, self._get_report(user.subscriptions,
+                                                                                           user.settings)
                 else:
-                    yield ReportType.CASES_GERMANY, user.platform_id, self._get_report(user.subscriptions, user.id)
-            else:
-                self.log.error(f"Unknown report type for user {user.id}: {report}")
+                    self.log.error(f"Unknown report type for user {user.id}: {report}")
+        finally:
+            self.report_users = {}
 
     def confirm_message_send(self, report_type: ReportType, user_id: Union[str, int]):
         user_id = self.user_manager.get_user_id(user_id)
@@ -1019,15 +1073,9 @@ class Bot(object):
         :return: True if messages are available
         """
         data_update = self.covid_data.get_last_update()
-        for user in self.user_manager.get_all_user(with_subscriptions=True):
-            if not user.activated or not user.subscriptions or user.created.date() == date.today():
-                continue
-
-            if ReportType.CASES_GERMANY in user.subscribed_reports:
-                last_update = self.user_manager.get_last_updates(user.id, ReportType.CASES_GERMANY)
-                if not last_update or last_update.date() < data_update:
-                    return True
-        return False
+        if not data_update:
+            return False
+        return self.user_manager.has_pending_reports(data_update, self.REPORT_TYPES)
 
     def parseLocationInput(self, location_query: str, set_feedback=None, help_command="Befehl") -> Union[
         List[BotResponse], District]:
@@ -1096,6 +1144,16 @@ class Bot(object):
             message = "Mit deinem Suchbegriff wurden mehr als 15 Orte gefunden, bitte versuche spezifischer zu sein."
             return BotResponse(message), None
 
+    @staticmethod
+    def get_multi_incidence_districts(subscriptions: List[int]) -> List[int]:
+        """
+        Returns the districts shown in the multi-incidence graph of a report, which are up to 8 districts
+        """
+        districts = subscriptions[-8:]
+        if 0 in subscriptions and 0 not in districts:
+            districts[0] = 0
+        return districts
+
     @staticmethod
     def sort_districts(districts: List[DistrictData]) -> List[DistrictData]:
         districts.sort(key=lambda d: d.name)
@@ -0,0 +1,43 @@
+from typing import Dict, List, Optional, Tuple
+
+from covidbot.covid_data.models import DistrictData
+from covidbot.metrics import DISTRICT_DATA_CACHE_HITS, DISTRICT_DATA_CACHE_MISSES
+
+
+class DistrictDataCache:
+    """
+    In-process cache for :py:class:`DistrictData`, keyed by district and data version. As only the current data
+    version is ever requested, all entries are dropped as soon as the version changes. Cached objects are shared
+    between callers and must not be modified.
+    """
+    version: Optional[int]
+    entries: Dict[int, DistrictData]
+
+    def __init__(self):
+        self.version = None
+        self.entries = {}
+
+    def set_version(self, version: int) -> None:
+        if version != self.version:
+            self.entries = {}
+            self.version = version
+
+    def get_many(self, district_ids: List[int]) -> Tuple[Dict[int, DistrictData], List[int]]:
+        """
+        Looks up several districts in the cache
+        :param district_ids: IDs of the districts
+        :return: Tuple of the cached DistrictData by ID and the list of IDs that are not cached
+        """
+        hits, misses = {}, []
+        for district_id in district_ids:
+            if district_id in self.entries:
+                hits[district_id] = self.entries[district_id]
+            else:
+                misses.append(district_id)
+
+        DISTRICT_DATA_CACHE_HITS.inc(len(hits))
+        DISTRICT_DATA_CACHE_MISSES.inc(len(misses))
+        return hits, misses
+
+    def put_many(self, data: Dict[int, DistrictData]) -> None:
+        self.entries.update(data)
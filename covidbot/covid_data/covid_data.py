@@ -1,58 +1,71 @@
 import logging
 import math
+import time
 from datetime import date, timedelta
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
 from mysql.connector import MySQLConnection
 
+from covidbot.covid_data.cache import DistrictDataCache
+from covidbot.covid_data.district_index import DistrictIndex
 from covidbot.covid_data.models import TrendValue, District, VaccinationData, RValueData, DistrictData, ICUData, \
     RuleData
 from covidbot.metrics import LOCATION_DB_LOOKUP
 
 
 class CovidData(object):
+    # Thresholds for the incidence intervals, depending whether the incidence is below or above 100
+    INCIDENCE_THRESHOLDS_LOW = [25, 50, 100]
+    INCIDENCE_THRESHOLDS_HIGH = [200, 165, 150, 100]
+    # Seconds until the district index is checked for new data again
+    DISTRICT_INDEX_CHECK_INTERVAL = 60
+
     connection: MySQLConnection
+    cache: DistrictDataCache
+    district_index: Optional[DistrictIndex]
+    district_index_version: Optional[int]
+    district_index_checked: float
     log = logging.getLogger(__name__)
 
     def __init__(self, connection: MySQLConnection) -> None:
         self.connection = connection
+        self.cache = DistrictDataCache()
+        self.district_index = None
+        self.district_index_version = None
+        self.district_index_checked = 0.0
         CovidDatabaseCreator(self.connection)
+        # Build the index at startup, so the first user query does not have to wait for it
+        self.get_district_index()
 
     @LOCATION_DB_LOOKUP.time()
     def search_district_by_name(self, search_str: str) -> List[District]:
-        search_str = search_str.lower().strip()
-        query_str = '%' + search_str.replace(" ", "%") + '%'
-        results = []
-        with self.connection.cursor(dictionary=True) as cursor:
-            if search_str.isdigit():
-                cursor.execute('SELECT rs, county_name FROM counties WHERE rs = %s',
-                               [int(search_str)])
-            else:
-                cursor.execute('SELECT rs, county_name FROM counties WHERE LOWER(county_name) LIKE %s '
-                               'OR concat(LOWER(type), LOWER(county_name)) LIKE %s',
-                               [query_str, query_str])
+        return self.get_district_index().search(search_str)
 
-            exact_matches = []
-            for row in cursor.fetchall():
-                if row['county_name'].lower() == search_str:
-                    return [District(row['county_name'], row['rs'])]
-
-                if len(search_str) < len(row['county_name']) and row['county_name'][
-                                                                 :len(search_str) + 1].lower() == search_str + " ":
-                    exact_matches.append(District(row['county_name'], row['rs']))
+    def get_district_index(self) -> DistrictIndex:
+        """
+        Returns the in-memory index of the district names. It is built on startup and rebuilt if the data version
+        changed, e.g. because an updater changed the counties. The version is checked at most every
+        DISTRICT_INDEX_CHECK_INTERVAL seconds.
+        """
+        now = time.monotonic()
+        if self.district_index and now - self.district_index_checked < self.DISTRICT_INDEX_CHECK_INTERVAL:
+            return self.district_index
 
-                results.append(District(row['county_name'], row['rs']))
+        self.district_index_checked = now
+        version = self.get_data_version()
+        if self.district_index and version == self.district_index_version:
+            return self.district_index
 
-            if not search_str.isdigit():
-                cursor.execute('SELECT district_id, c.county_name FROM county_alt_names '
-                               'LEFT JOIN counties c on c.rs = county_alt_names.district_id '
-                               'WHERE LOWER(alt_name) LIKE %s', [query_str])
-                for row in cursor.fetchall():
-                    results.append(District(row['county_name'], row['district_id']))
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute('SELECT rs, county_name, type FROM counties')
+            districts = [(row['rs'], row['county_name'], row['type']) for row in cursor.fetchall()]
+            cursor.execute('SELECT district_id, alt_name FROM county_alt_names')
+            alt_names = [(row['district_id'], row['alt_name']) for row in cursor.fetchall()]
 
-            if len(exact_matches) == 1:
-                return exact_matches
-        return results
+        self.district_index = DistrictIndex(districts, alt_names)
+        self.district_index_version = version
+        self.log.debug(f"Built district index with {len(districts)} districts")
+        return self.district_index
 
     def get_district(self, district_id: int) -> District:
         with self.connection.cursor(dictionary=True) as cursor:
@@ -67,10 +80,7 @@ class CovidData(object):
             for row in cursor.fetchall():
                 children.append(row['rs'])
         if children:
-            children_data = []
-            for child in children:
-                children_data.append((self.get_district_data(child)))
-            return children_data
+            return list(self.get_district_data_many(children).values())
 
     def get_district_data(self, district_id: int) \
             -> Optional[DistrictData]:
@@ -79,141 +89,204 @@ class CovidData(object):
         :param district_id: ID of the district
         :return: DistrictData
         """
+        return self.get_district_data_many([district_id]).get(int(district_id))
+
+    def get_district_data_many(self, district_ids: List[int]) -> Dict[int, DistrictData]:
+        """
+        Fetches the Covid19 data for several districts at once. The number of queries does not depend on the number
+        of requested districts.
+        :param district_ids: IDs of the districts
+        :return: DistrictData by district ID, in the order of district_ids. Districts without data are omitted.
+        """
+        district_ids = list(dict.fromkeys(map(int, district_ids)))
+        if not district_ids:
+            return {}
+
+        self.cache.set_version(self.get_data_version())
+        results, misses = self.cache.get_many(district_ids)
+        if misses:
+            fetched = self._fetch_district_data_many(misses)
+            self.cache.put_many(fetched)
+            results.update(fetched)
+
+        return {district_id: results[district_id] for district_id in district_ids if district_id in results}
+
+    def _fetch_district_data_many(self, district_ids: List[int]) -> Dict[int, DistrictData]:
+        placeholders = ', '.join(['%s'] * len(district_ids))
+        results: Dict[int, DistrictData] = {}
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT * FROM covid_data_calculated WHERE rs=%s ORDER BY date DESC LIMIT 1',
-                           [district_id])
+            # Current data and the rows of yesterday and last week for the trend
+            cursor.execute(f'SELECT d.*, c.county_name, c.type, c.parent, latest.max_date '
+                           f'FROM covid_data_calculated d '
+                           f'JOIN (SELECT rs, MAX(date) as max_date FROM covid_data_calculated WHERE rs IN ({placeholders}) '
+                           f'GROUP BY rs) latest ON latest.rs = d.rs '
+                           f'AND d.date IN (latest.max_date, SUBDATE(latest.max_date, 1), SUBDATE(latest.max_date, 7)) '
+                           f'LEFT JOIN counties c ON c.rs = d.rs',
+                           district_ids)
+            current, comparisons = {}, {}
+            for record in cursor.fetchall():
+                if record['date'] == record['max_date']:
+                    current[record['rs']] = record
+                else:
+                    comparisons.setdefault(record['rs'], []).append(record)
+
+            for district_id in district_ids:
+                record = current.get(district_id)
+                if not record:
+                    continue
+                results[district_id] = DistrictData(name=record['county_name'], id=district_id,
+                                                    incidence=record['incidence'], parent=record['parent'],
+                                                    type=record['type'], total_cases=record['total_cases'],
+                                                    total_deaths=record['total_deaths'],
+                                                    new_cases=record['new_cases'], new_deaths=record['new_deaths'],
+                                                    date=record['date'], last_update=record['last_update'])
+            if not results:
+                return results
+
+            district_ids = list(results.keys())
+            placeholders = ', '.join(['%s'] * len(district_ids))
 
-            record = cursor.fetchone()
-            if not record:
-                return None
+            # Check if vaccination data is available
+            latest_vaccinations = f'(SELECT district_id, MAX(date) as max_date FROM covid_vaccinations ' \
+                                  f'WHERE district_id IN ({placeholders}) GROUP BY district_id) latest'
+            cursor.execute(f'SELECT v.district_id, vaccinated_full, vaccinated_partial, rate_full, rate_partial, '
+                           f'date, doses_diff, last_update FROM covid_vaccinations v '
+                           f'JOIN {latest_vaccinations} ON latest.district_id = v.district_id '
+                           f'AND v.date = latest.max_date', district_ids)
+            for vaccination_record in cursor.fetchall():
+                results[vaccination_record['district_id']].vaccinations = VaccinationData(
+                    vaccination_record['vaccinated_full'],
+                    vaccination_record['vaccinated_partial'],
+                    vaccination_record['rate_full'],
+                    vaccination_record['rate_partial'],
+                    vaccination_record['date'],
+                    doses_diff=vaccination_record['doses_diff'],
+                    last_update=vaccination_record['last_update'])
+
+            cursor.execute(f'SELECT v.district_id, AVG(doses_diff) as avg_7day, c.population FROM covid_vaccinations v '
+                           f'JOIN {latest_vaccinations} ON latest.district_id = v.district_id '
+                           f'LEFT JOIN counties c on c.rs = v.district_id '
+                           f'WHERE v.date > SUBDATE(latest.max_date, 7) GROUP BY v.district_id', district_ids)
+            for record in cursor.fetchall():
+                vaccination_data = results[record['district_id']].vaccinations
+                if not vaccination_data or record['avg_7day'] is None:
+                    continue
 
-            result = DistrictData(name=record['county_name'], id=district_id, incidence=record['incidence'],
-                                  parent=record['parent'], type=record['type'],
-                                  total_cases=record['total_cases'], total_deaths=record['total_deaths'],
-                                  new_cases=record['new_cases'], new_deaths=record['new_deaths'],
-                                  date=record['date'], last_update=record['last_update'])
+                vaccination_data.avg_speed = int(record['avg_7day'])
+                population_to_be_vaccinated = 2 * record['population'] - (
+                        vaccination_data.vaccinated_full + vaccination_data.vaccinated_partial)
+                if vaccination_data.avg_speed > 0:
+                    vaccination_data.avg_days_to_finish = math.ceil(
+                        population_to_be_vaccinated / vaccination_data.avg_speed)
 
-            # Check if vaccination data is available
-            cursor.execute('SELECT MAX(date) as last_update FROM covid_vaccinations WHERE district_id=%s',
-                           [district_id])
-            vacc_date = cursor.fetchone()
-            if vacc_date:
-                last_update = vacc_date['last_update']
-                cursor.execute('SELECT vaccinated_full, vaccinated_partial, rate_full, rate_partial, '
-                               'date, doses_diff, last_update '
-                               'FROM covid_vaccinations WHERE district_id=%s and date<=%s '
-                               'ORDER BY date DESC LIMIT 1',
-                               [district_id, last_update])
-                vaccination_record = cursor.fetchone()
-                if vaccination_record:
-                    vaccination_data = VaccinationData(vaccination_record['vaccinated_full'],
-                                                       vaccination_record['vaccinated_partial'],
-                                                       vaccination_record['rate_full'],
-                                                       vaccination_record['rate_partial'],
-                                                       vaccination_record['date'],
-                                                       doses_diff=vaccination_record['doses_diff'],
-                                                       last_update=vaccination_record['last_update'])
-
-                    cursor.execute(
-                        'SELECT AVG(doses_diff) as avg_7day, population FROM covid_vaccinations LEFT JOIN counties c on c.rs = covid_vaccinations.district_id WHERE district_id=%s AND date > SUBDATE(%s, 7) GROUP BY district_id',
-                        [district_id, last_update])
-                    record = cursor.fetchone()
-                    if record:
-                        vaccination_data.avg_speed = int(record['avg_7day'])
-                        population_to_be_vaccinated = 2 * record['population'] - (
-                                vaccination_data.vaccinated_full + vaccination_data.vaccinated_partial)
-                        if vaccination_data.avg_speed > 0:
-                            vaccination_data.avg_days_to_finish = math.ceil(
-                                population_to_be_vaccinated / vaccination_data.avg_speed)
-
-                    result.vaccinations = vaccination_data
             # Check if ICU data is available
-            cursor.execute('SELECT date, clear, occupied, occupied_covid, covid_ventilated, updated FROM icu_beds '
-                           'WHERE district_id=%s ORDER BY date DESC LIMIT 1', [district_id])
-            row = cursor.fetchone()
-            if row:
-                result.icu_data = ICUData(date=row['date'], clear_beds=row['clear'], occupied_beds=row['occupied'],
-                                          occupied_covid=row['occupied_covid'],
-                                          covid_ventilated=row['covid_ventilated'], last_update=row['updated'])
-
-                cursor.execute('SELECT date, clear, occupied, occupied_covid, covid_ventilated, updated FROM icu_beds '
-                               'WHERE district_id=%s AND date=SUBDATE(%s, 7) LIMIT 1',
-                               [district_id, result.icu_data.date])
-                row_lastweek = cursor.fetchone()
-                if row_lastweek:
-                    icu_yesterday = ICUData(date=row_lastweek['date'], clear_beds=row_lastweek['clear'],
-                                            occupied_beds=row_lastweek['occupied'],
-                                            occupied_covid=row_lastweek['occupied_covid'],
-                                            covid_ventilated=row_lastweek['covid_ventilated'],
-                                            last_update=row['updated'])
-                    result.icu_data = self.fill_trend_icu(result.icu_data, icu_yesterday)
-
-            # Check if R-Value is available
-            if district_id == 0:
-                cursor.execute('SELECT r_date, `7day_r_value` FROM covid_r_value WHERE district_id=%s '
-                               'ORDER BY r_date DESC LIMIT 1', [district_id])
-                data = cursor.fetchone()
-                if data:
+            cursor.execute(f'SELECT i.district_id, date, clear, occupied, occupied_covid, covid_ventilated, updated, '
+                           f'latest.max_date FROM icu_beds i '
+                           f'JOIN (SELECT district_id, MAX(date) as max_date FROM icu_beds '
+                           f'WHERE district_id IN ({placeholders}) GROUP BY district_id) latest '
+                           f'ON latest.district_id = i.district_id '
+                           f'AND i.date IN (latest.max_date, SUBDATE(latest.max_date, 7)) '
+                           f'ORDER BY i.date DESC', district_ids)
+            for row in cursor.fetchall():
+                result = results[row['district_id']]
+                if row['date'] == row['max_date']:
+                    result.icu_data = ICUData(date=row['date'], clear_beds=row['clear'], occupied_beds=row['occupied'],
+                                              occupied_covid=row['occupied_covid'],
+                                              covid_ventilated=row['covid_ventilated'], last_update=row['updated'])
+                elif result.icu_data:
+                    icu_lastweek = ICUData(date=row['date'], clear_beds=row['clear'],
+                                           occupied_beds=row['occupied'],
+                                           occupied_covid=row['occupied_covid'],
+                                           covid_ventilated=row['covid_ventilated'],
+                                           last_update=result.icu_data.last_update)
+                    result.icu_data = self.fill_trend_icu(result.icu_data, icu_lastweek)
+
+            # Check if R-Value is available, it is just provided for Germany
+            r_values_yesterday = {}
+            if 0 in results:
+                cursor.execute('SELECT r.district_id, r_date, `7day_r_value`, latest.max_date FROM covid_r_value r '
+                               'JOIN (SELECT district_id, MAX(r_date) as max_date FROM covid_r_value '
+                               'WHERE district_id=%s GROUP BY district_id) latest '
+                               'ON latest.district_id = r.district_id '
+                               'AND r.r_date IN (latest.max_date, SUBDATE(latest.max_date, 1))', [0])
+                for data in cursor.fetchall():
                     r_data = RValueData(data['r_date'], data['7day_r_value'])
-                    result.r_value = r_data
+                    if data['r_date'] == data['max_date']:
+                        results[data['district_id']].r_value = r_data
+                    else:
+                        r_values_yesterday[data['district_id']] = r_data
 
             # Check if Rules are available
-            cursor.execute('SELECT text, link, updated FROM district_rules WHERE district_id=%s', [district_id])
-            data = cursor.fetchone()
-            if data:
-                result.rules = RuleData(data['updated'], data['text'], data['link'])
+            cursor.execute(f'SELECT district_id, text, link, updated FROM district_rules '
+                           f'WHERE district_id IN ({placeholders})', district_ids)
+            for data in cursor.fetchall():
+                results[data['district_id']].rules = RuleData(data['updated'], data['text'], data['link'])
 
             # Add Trend in comparison to yesterday and last week
-            cursor.execute(
-                'SELECT * FROM covid_data_calculated WHERE rs=%s AND (date=SUBDATE(Date(%s), 7) OR date=SUBDATE(Date(%s), 1)) LIMIT 2',
-                [district_id, result.date, result.date])
-            last_week, yesterday = None, None
-            for record in cursor.fetchall():
-                comparison_data = DistrictData(name=record['county_name'], id=district_id,
-                                               incidence=record['incidence'],
-                                               type=record['type'], total_cases=record['total_cases'],
-                                               total_deaths=record['total_deaths'], new_cases=record['new_cases'],
-                                               new_deaths=record['new_deaths'], date=record['date'])
-                if result.date - comparison_data.date == timedelta(days=1):
-                    yesterday = comparison_data
-                    if result.r_value:
-                        cursor.execute('SELECT `7day_r_value`, r_date FROM covid_r_value WHERE district_id=%s '
-                                       'AND r_date=SUBDATE(%s, 1) LIMIT 1', [district_id, result.r_value.date])
-                        row = cursor.fetchone()
-                        if row:
-                            yesterday.r_value = RValueData(row['r_date'], row['7day_r_value'])
-                else:
-                    last_week = comparison_data
-
-            if not last_week and yesterday:
-                last_week = yesterday
-
-            if last_week:
-                result = self.fill_trend(result, last_week, yesterday)
+            for district_id, result in results.items():
+                last_week, yesterday = None, None
+                for record in comparisons.get(district_id, []):
+                    comparison_data = DistrictData(name=record['county_name'], id=district_id,
+                                                   incidence=record['incidence'],
+                                                   type=record['type'], total_cases=record['total_cases'],
+                                                   total_deaths=record['total_deaths'],
+                                                   new_cases=record['new_cases'],
+                                                   new_deaths=record['new_deaths'], date=record['date'])
+                    if result.date - comparison_data.date == timedelta(days=1):
+                        yesterday = comparison_data
+                        if result.r_value and district_id in r_values_yesterday:
+                            yesterday.r_value = r_values_yesterday[district_id]
+                    elif result.date - comparison_data.date == timedelta(days=7):
+                        last_week = comparison_data
+
+                if not last_week and yesterday:
+                    last_week = yesterday
+
+                if last_week:
+                    results[district_id] = self.fill_trend(result, last_week, yesterday)
 
             # Check, how long incidence is in certain interval
-            if result.incidence < 100:
-                threshold_values = [25, 50, 100]
-                threshold = 0
-                while result.incidence > threshold_values[threshold] and len(threshold_values) > threshold:
-                    threshold += 1
-                operator = ">"
-                result.incidence_interval_threshold = threshold_values[threshold]
-            else:
-                threshold_values = [200, 165, 150, 100]
-                threshold = 0
-                while result.incidence < threshold_values[threshold] and len(threshold_values) > threshold:
-                    threshold += 1
-                operator = "<="
-                result.incidence_interval_threshold = threshold_values[threshold]
+            conditions, arguments, since_above = [], [], {}
+            for district_id, result in results.items():
+                if result.incidence is None:
+                    continue
+
+                result.incidence_interval_threshold, since_above[district_id] = \
+                    self.get_incidence_interval(result.incidence)
+                conditions.append('(rs=%s AND threshold=%s)')
+                arguments += [district_id, result.incidence_interval_threshold]
+
+            if conditions:
+                cursor.execute(f'SELECT rs, last_above, last_not_above FROM incidence_intervals '
+                               f'WHERE {" OR ".join(conditions)}', arguments)
+                for row in cursor.fetchall():
+                    if since_above[row['rs']]:
+                        results[row['rs']].incidence_interval_since = row['last_above']
+                    else:
+                        results[row['rs']].incidence_interval_since = row['last_not_above']
 
-            cursor.execute(f'SELECT date FROM covid_data_calculated WHERE rs=%s AND incidence {operator} %s '
-                           f'ORDER BY date DESC LIMIT 1', [district_id, result.incidence_interval_threshold])
-            rows = cursor.fetchall()
-            if rows:
-                result.incidence_interval_since = rows[0]['date']
+        return results
 
-            return result
+    @staticmethod
+    def get_incidence_interval(incidence: float) -> Tuple[int, bool]:
+        """
+        Returns the incidence threshold that is relevant for the given incidence, together with the side of the
+        threshold the interval started on
+        :param incidence: Current incidence
+        :return: Tuple of threshold and whether the interval starts at the last day above the threshold
+        """
+        if incidence < 100:
+            threshold_values = CovidData.INCIDENCE_THRESHOLDS_LOW
+            threshold = 0
+            while threshold < len(threshold_values) - 1 and incidence > threshold_values[threshold]:
+                threshold += 1
+            return threshold_values[threshold], True
+
+        threshold_values = CovidData.INCIDENCE_THRESHOLDS_HIGH
+        threshold = 0
+        while threshold < len(threshold_values) - 1 and incidence < threshold_values[threshold]:
+            threshold += 1
+        return threshold_values[threshold], False
 
     def get_country_data(self) -> DistrictData:
         return self.get_district_data(0)
@@ -287,6 +360,17 @@ class CovidData(object):
 
         return today
 
+    def get_data_version(self) -> int:
+        """
+        Returns a number that changes whenever an updater committed new data
+        """
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute('SELECT SUM(version) as version FROM data_updates')
+            result = cursor.fetchone()
+            if result and result['version']:
+                return int(result['version'])
+            return 0
+
     def get_last_update(self) -> Optional[date]:
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute('SELECT MAX(date) as "last_updated" FROM covid_data')
@@ -338,25 +422,37 @@ class CovidDatabaseCreator:
                            'district_id INTEGER, text TEXT CHARACTER SET utf8 COLLATE utf8_general_ci, link VARCHAR(255), updated DATETIME,'
                            'FOREIGN KEY(district_id) REFERENCES counties(rs), UNIQUE(district_id))')
 
-            # Check if view exists
-            cursor.execute("SHOW FULL TABLES WHERE TABLE_TYPE LIKE '%VIEW%';")
-            exists = False
-            for row in cursor.fetchall():
-                if row[0] == "covid_data_calculated":
-                    exists = True
-
-            if not exists:
-                log.info("View covid_data_calculated does not exist, creating it!")
-                cursor.execute('CREATE VIEW covid_data_calculated AS '
-                               'SELECT c.rs, c.county_name, c.type, c.parent, covid_data.date, '
-                               'covid_data.total_cases, covid_data.total_cases - y.total_cases as new_cases, '
-                               'covid_data.total_deaths, covid_data.total_deaths - y.total_deaths as new_deaths, '
-                               'covid_data.incidence, covid_data.last_update '
-                               'FROM covid_data '
-                               'LEFT JOIN covid_data y on y.rs = covid_data.rs AND '
-                               'y.date = subdate(covid_data.date, 1) '
-                               'LEFT JOIN counties c on c.rs = covid_data.rs '
-                               'ORDER BY covid_data.date DESC')
+            # Data versions, incremented by the updaters on new data
+            cursor.execute('CREATE TABLE IF NOT EXISTS data_updates (source VARCHAR(100) PRIMARY KEY, '
+                           'version INTEGER NOT NULL DEFAULT 0, updated DATETIME DEFAULT NOW())')
+
+            # Progress of history imports, so they can be resumed
+            cursor.execute('CREATE TABLE IF NOT EXISTS updater_checkpoints (name VARCHAR(100) PRIMARY KEY, '
+                           'checkpoint DATE NOT NULL, updated DATETIME DEFAULT NOW())')
+
+            # Last day above and not above each incidence threshold
+            cursor.execute("SHOW TABLES LIKE 'incidence_intervals'")
+            if not cursor.fetchone():
+                cursor.execute('CREATE TABLE incidence_intervals (rs INTEGER, threshold INTEGER, '
+                               'last_above DATE NULL DEFAULT NULL, last_not_above DATE NULL DEFAULT NULL, '
+                               'PRIMARY KEY(rs, threshold), FOREIGN KEY(rs) REFERENCES counties(rs))')
+                self.update_incidence_intervals(cursor)
+
+            # Calculated infection data, former VIEW covid_data_calculated
+            cursor.execute("SHOW FULL TABLES LIKE 'covid_data_calculated'")
+            row = cursor.fetchone()
+            if row and 'VIEW' in row[1]:
+                log.info("Replacing view covid_data_calculated by a table")
+                cursor.execute('DROP VIEW covid_data_calculated')
+                row = None
+
+            if not row:
+                log.info("Table covid_data_calculated does not exist, creating it!")
+                cursor.execute('CREATE TABLE covid_data_calculated (rs INTEGER, date DATE, '
+                               'total_cases INT, new_cases INT, total_deaths INT, new_deaths INT, incidence FLOAT, '
+                               'last_update DATETIME, PRIMARY KEY(rs, date), INDEX(date), '
+                               'FOREIGN KEY(rs) REFERENCES counties(rs))')
+                self.update_calculated_data(cursor)
 
             # Insert if not exists
             cursor.execute("INSERT IGNORE INTO counties (rs, county_name, type, parent) "
@@ -367,3 +463,74 @@ class CovidDatabaseCreator:
                            "VALUES (5, 'NRW'), (8, 'BaWü'), (7, 'RLP')")
             connection.commit()
             log.debug("Committed Tables")
+
+    @staticmethod
+    def update_derived_data(cursor, from_date: Optional[date] = None, to_date: Optional[date] = None) -> None:
+        """
+        Updates all tables that are derived from covid_data, has to be called after covid_data changed
+        :param cursor: Cursor of the connection to use, changes are not committed
+        :param from_date: First day that has changed in covid_data, everything if None
+        :param to_date: Last day that has changed in covid_data, from_date if None
+        """
+        CovidDatabaseCreator.update_calculated_data(cursor, from_date, to_date)
+        CovidDatabaseCreator.update_incidence_intervals(cursor, from_date, to_date)
+
+    @staticmethod
+    def update_calculated_data(cursor, from_date: Optional[date] = None, to_date: Optional[date] = None) -> None:
+        """
+        Recalculates covid_data_calculated from covid_data. As the new cases of a day depend on the day before,
+        the day after to_date is recalculated as well.
+        :param cursor: Cursor of the connection to use, changes are not committed
+        :param from_date: First day that has changed in covid_data, everything if None
+        :param to_date: Last day that has changed in covid_data, from_date if None
+        """
+        query = ('INSERT INTO covid_data_calculated (rs, date, total_cases, new_cases, total_deaths, new_deaths, '
+                 'incidence, last_update) '
+                 'SELECT d.rs, d.date, d.total_cases, d.total_cases - y.total_cases, '
+                 'd.total_deaths, d.total_deaths - y.total_deaths, d.incidence, d.last_update '
+                 'FROM covid_data d '
+                 'LEFT JOIN covid_data y ON y.rs = d.rs AND y.date = SUBDATE(d.date, 1) ')
+        args = []
+        if from_date:
+            if not to_date:
+                to_date = from_date
+            query += 'WHERE d.date BETWEEN %s AND ADDDATE(%s, 1) '
+            args = [from_date, to_date]
+
+        query += ('ON DUPLICATE KEY UPDATE total_cases=VALUES(total_cases), new_cases=VALUES(new_cases), '
+                  'total_deaths=VALUES(total_deaths), new_deaths=VALUES(new_deaths), incidence=VALUES(incidence), '
+                  'last_update=VALUES(last_update)')
+        cursor.execute(query, args)
+
+    @staticmethod
+    def update_incidence_intervals(cursor, from_date: Optional[date] = None, to_date: Optional[date] = None) -> None:
+        """
+        Updates the last days each district was above and not above the incidence thresholds. If a range is given, only
+        newer days can be taken over, corrections of older incidences require a full update.
+        :param cursor: Cursor of the connection to use, changes are not committed
+        :param from_date: First day that has changed in covid_data, everything if None
+        :param to_date: Last day that has changed in covid_data, from_date if None
+        """
+        thresholds = sorted(set(CovidData.INCIDENCE_THRESHOLDS_LOW + CovidData.INCIDENCE_THRESHOLDS_HIGH))
+        threshold_table = ' UNION ALL '.join(['SELECT %s as threshold'] * len(thresholds))
+        query = ('INSERT INTO incidence_intervals (rs, threshold, last_above, last_not_above) '
+                 'SELECT d.rs, t.threshold, MAX(IF(d.incidence > t.threshold, d.date, NULL)), '
+                 'MAX(IF(d.incidence <= t.threshold, d.date, NULL)) '
+                 f'FROM covid_data d JOIN ({threshold_table}) t '
+                 'WHERE d.incidence IS NOT NULL ')
+        args = list(thresholds)
+        if from_date:
+            if not to_date:
+                to_date = from_date
+            query += 'AND d.date BETWEEN %s AND %s '
+            args += [from_date, to_date]
+            query += ('GROUP BY d.rs, t.threshold '
+                      'ON DUPLICATE KEY UPDATE '
+                      'last_above=GREATEST(COALESCE(last_above, VALUES(last_above)), '
+                      'COALESCE(VALUES(last_above), last_above)), '
+                      'last_not_above=GREATEST(COALESCE(last_not_above, VALUES(last_not_above)), '
+                      'COALESCE(VALUES(last_not_above), last_not_above))')
+        else:
+            query += ('GROUP BY d.rs, t.threshold '
+                      'ON DUPLICATE KEY UPDATE last_above=VALUES(last_above), last_not_above=VALUES(last_not_above)')
+        cursor.execute(query, args)
@@ -0,0 +1,220 @@
+import unicodedata
+from typing import Dict, List, Optional, Set, Tuple
+
+from covidbot.covid_data.models import District
+
+
+class NameTrie:
+    """
+    Prefix tree over normalized names, each node holds the IDs of the names ending there
+    """
+    children: Dict[str, 'NameTrie']
+    ids: List[int]
+
+    def __init__(self):
+        self.children = {}
+        self.ids = []
+
+    def insert(self, name: str, name_id: int) -> None:
+        node = self
+        for char in name:
+            node = node.children.setdefault(char, NameTrie())
+        node.ids.append(name_id)
+
+    def _find_node(self, prefix: str) -> Optional['NameTrie']:
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def find(self, name: str) -> List[int]:
+        node = self._find_node(name)
+        if node:
+            return node.ids
+        return []
+
+    def find_prefix(self, prefix: str) -> List[int]:
+        node = self._find_node(prefix)
+        result = []
+        stack = [node] if node else []
+        while stack:
+            node = stack.pop()
+            result.extend(node.ids)
+            stack.extend(node.children.values())
+        return sorted(result)
+
+
+class DistrictIndex:
+    """
+    In-memory index over the district names and their alternative names. A query is matched like the former
+    ``LIKE '%word%word%'`` database query, using a prefix tree for exact matches and a trigram index to find the
+    candidates. Like the *_unicode_ci collation of the database, matching ignores case and accents. If nothing matches, names within a small edit distance are returned, so typos are tolerated.
+    """
+    names: List[str]
+    ids: List[int]
+    searchable: List[str]
+    trie: NameTrie
+    trigrams: Dict[str, Set[int]]
+    alt_names: List[Tuple[str, int]]
+    fuzzy_names: List[Tuple[str, int]]
+    fuzzy_trigrams: Dict[str, Set[int]]
+    by_id: Dict[int, int]
+
+    def __init__(self, districts: List[Tuple[int, str, Optional[str]]], alt_names: List[Tuple[int, str]]):
+        """
+        :param districts: List of (rs, county_name, type)
+        :param alt_names: List of (rs, alt_name)
+        """
+        self.names, self.ids, self.searchable = [], [], []
+        self.trie = NameTrie()
+        self.trigrams = {}
+        self.by_id = {}
+        for district_id, name, district_type in sorted(districts):
+            index = len(self.names)
+            self.names.append(name)
+            self.ids.append(district_id)
+            self.by_id[district_id] = index
+
+            # Like concat(LOWER(type), LOWER(county_name)), which contains the name itself
+            searchable = self.normalize(name)
+            if district_type:
+                searchable = self.normalize(district_type) + searchable
+            self.searchable.append(searchable)
+            self.trie.insert(self.normalize(name), index)
+            for trigram in self.get_trigrams(searchable):
+                self.trigrams.setdefault(trigram, set()).add(index)
+
+        self.alt_names = []
+        for district_id, alt_name in alt_names:
+            if district_id in self.by_id:
+                self.alt_names.append((alt_name, self.by_id[district_id]))
+
+        # Names without additions like (Landkreis), with transliterated umlauts for typo tolerant search
+        self.fuzzy_names = []
+        self.fuzzy_trigrams = {}
+        for index, name in enumerate(self.names):
+            for variant in {self.fold(name), self.fold(name.split(" (")[0])}:
+                self.fuzzy_names.append((variant, index))
+        for alt_name, index in self.alt_names:
+            self.fuzzy_names.append((self.fold(alt_name), index))
+        self.alt_names = [(self.normalize(alt_name), index) for alt_name, index in self.alt_names]
+        for fuzzy_id, (name, _) in enumerate(self.fuzzy_names):
+            for trigram in self.get_trigrams(f" {name} "):
+                self.fuzzy_trigrams.setdefault(trigram, set()).add(fuzzy_id)
+
+    @staticmethod
+    def get_trigrams(text: str) -> Set[str]:
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Lower case text without accents, e.g. München and Munchen are equal, as in the *_unicode_ci collation
+        """
+        text = unicodedata.normalize("NFKD", text.lower().replace("ß", "ss"))
+        return "".join(char for char in text if not unicodedata.combining(char))
+
+    @staticmethod
+    def fold(text: str) -> str:
+        text = " ".join(text.lower().split())
+        for char, replacement in [("ä", "ae"), ("ö", "oe"), ("ü", "ue"), ("ß", "ss")]:
+            text = text.replace(char, replacement)
+        return text
+
+    @staticmethod
+    def matches(text: str, words: List[str]) -> bool:
+        position = 0
+        for word in words:
+            position = text.find(word, position)
+            if position == -1:
+                return False
+            position += len(word)
+        return True
+
+    @staticmethod
+    def edit_distance(a: str, b: str, limit: int) -> int:
+        """
+        Levenshtein distance of a and b, returns limit + 1 as soon as the distance exceeds limit
+        """
+        if abs(len(a) - len(b)) > limit:
+            return limit + 1
+
+        previous = list(range(len(b) + 1))
+        for i, char_a in enumerate(a, 1):
+            current = [i]
+            for j, char_b in enumerate(b, 1):
+                current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+            if min(current) > limit:
+                return limit + 1
+            previous = current
+        return previous[-1]
+
+    def _district(self, index: int) -> District:
+        return District(self.names[index], self.ids[index])
+
+    def search(self, search_str: str) -> List[District]:
+        query = search_str.strip()
+        search_str = self.normalize(query)
+        if search_str.isdigit():
+            index = self.by_id.get(int(search_str))
+            if index is None:
+                return []
+            return [self._district(index)]
+
+        exact = self.trie.find(search_str)
+        if exact:
+            return [self._district(exact[0])]
+
+        words = search_str.split()
+        candidates: Optional[Set[int]] = None
+        for word in words:
+            if len(word) < 3:
+                continue
+            for trigram in self.get_trigrams(word):
+                postings = self.trigrams.get(trigram, set())
+                candidates = postings if candidates is None else candidates & postings
+        if candidates is None:
+            candidates = set(range(len(self.names)))
+
+        results = [self._district(index) for index in sorted(candidates)
+                   if self.matches(self.searchable[index], words)]
+        result_ids = {district.id for district in results}
+        for alt_name, index in self.alt_names:
+            if self.ids[index] not in result_ids and self.matches(alt_name, words):
+                results.append(self._district(index))
+                result_ids.add(self.ids[index])
+
+        # Prefer districts whose name starts with the query, e.g. Essen over Hessen
+        exact_matches = self.trie.find_prefix(search_str + " ")
+        if len(exact_matches) == 1:
+            return [self._district(exact_matches[0])]
+
+        if results:
+            return results
+        return self.search_fuzzy(query)
+
+    def search_fuzzy(self, search_str: str) -> List[District]:
+        """
+        Finds districts whose name differs by at most one edit per five characters from the query
+        """
+        query = self.fold(search_str)
+        # Short queries like greetings would match arbitrary districts
+        if len(query) < 6:
+            return []
+        limit = max(1, len(query) // 5)
+
+        candidates = set()
+        for trigram in self.get_trigrams(f" {query} "):
+            candidates |= self.fuzzy_trigrams.get(trigram, set())
+
+        distances: Dict[int, int] = {}
+        for fuzzy_id in candidates:
+            name, index = self.fuzzy_names[fuzzy_id]
+            distance = self.edit_distance(query, name, limit)
+            if distance <= limit and distance < distances.get(index, limit + 1):
+                distances[index] = distance
+
+        ranked = sorted(distances.keys(), key=lambda i: (distances[i], self.names[i]))
+        return [self._district(index) for index in ranked]
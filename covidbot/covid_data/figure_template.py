@@ -0,0 +1,122 @@
+import datetime
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import matplotlib.image
+from matplotlib.axes import Axes
+from matplotlib.figure import Figure
+from matplotlib.offsetbox import OffsetImage, AnnotationBbox
+from matplotlib.text import Text, Annotation
+from numpy import ndarray
+
+
+class FigureTemplate:
+    """
+    Figure with the parts all graphs share: footer with source, link and logo, title and styling. It is built once and
+    reused for every graph of the same variant, only the data axes are cleared and the texts replaced. A template must
+    be saved before it is prepared for the next graph, so each thread gets its own templates, see :py:meth:`get`.
+    """
+    LOGO_PATH = 'resources/d64-logo.png'
+
+    _logo: Optional[ndarray] = None
+    _templates = threading.local()
+
+    figure: Figure
+    axes: Axes
+    title: Text
+    date_annotation: Optional[Annotation]
+
+    def __init__(self, quadratic: bool, with_date: bool, logo: ndarray):
+        """
+        :param quadratic: 8x8 instead of 8x5 inches
+        :param with_date: Whether the footer contains date and source
+        :param logo: Image data of the logo
+        """
+        figsize = (8, 5)
+        if quadratic:
+            figsize = (8, 8)
+
+        fig = Figure(figsize=figsize, dpi=200)
+        gs = fig.add_gridspec(15, 3)
+
+        self.date_annotation = None
+        if with_date:
+            # Second subplot just for Source and current date
+            ax2 = fig.add_subplot(gs[14, 0])
+            ax2.axis('off')
+            self.date_annotation = ax2.annotate("", color="#6e6e6e", xy=(0, -4.5), xycoords='axes fraction',
+                                                horizontalalignment='left', verticalalignment='bottom')
+
+        # Third subplot for Link
+        ax3 = fig.add_subplot(gs[14:, 1])
+        ax3.axis('off')
+
+        ax3.annotate("Tägliche Updates:\n"
+                     "https://covidbot.d-64.org",
+                     color="#6e6e6e",
+                     xy=(0, -4.5), xycoords='axes fraction',
+                     horizontalalignment='left',
+                     verticalalignment='bottom')
+
+        # 4th subplot for Logo
+        ax4 = fig.add_subplot(gs[14:, 2])
+        ax4.axis('off')
+
+        # Annotate the 2nd position with D64 logo
+        imagebox = OffsetImage(logo, zoom=0.3)
+        imagebox.image.axes = ax4
+
+        ab = AnnotationBbox(imagebox, xy=(0, 0), frameon=False, xybox=(1, -2.5), xycoords='axes fraction',
+                            box_alignment=(1, 1))
+
+        ax4.add_artist(ab)
+
+        self.axes = fig.add_subplot(gs[:14, :])
+        self.title = fig.suptitle("", fontweight="bold")
+        fig.patch.set_facecolor("#eeeeee")
+        fig.subplots_adjust(bottom=0.2)
+        self.figure = fig
+
+    @classmethod
+    def load_logo(cls) -> ndarray:
+        if cls._logo is None:
+            cls._logo = matplotlib.image.imread(os.path.abspath(cls.LOGO_PATH), format='png')
+        return cls._logo
+
+    @classmethod
+    def get(cls, quadratic: bool, with_date: bool) -> 'FigureTemplate':
+        """
+        Returns the template of the calling thread for a variant, which is created on first use
+        """
+        if not hasattr(cls._templates, 'cache'):
+            cls._templates.cache = {}
+        cache: Dict[Tuple[bool, bool], FigureTemplate] = cls._templates.cache
+
+        key = (quadratic, with_date)
+        if key not in cache:
+            cache[key] = FigureTemplate(quadratic, with_date, cls.load_logo())
+        return cache[key]
+
+    def prepare(self, current_date: Optional[datetime.date], title: str, y_label: str,
+                source: str) -> Tuple[Figure, Axes]:
+        """
+        Clears the data of the previous graph and sets the texts of the new one
+        :return: Figure and the Axes to draw the data on
+        """
+        ax1 = self.axes
+        ax1.clear()
+
+        # Set title and labels
+        self.title.set_text(title)
+        if self.date_annotation:
+            self.date_annotation.set_text("Stand: {date}\nQuelle: {source}"
+                                          .format(date=current_date.strftime("%d.%m.%Y"), source=source))
+        ax1.set_ylabel(y_label)
+
+        # Styling
+        for direction in ["left", "right", "bottom", "top"]:
+            ax1.spines[direction].set_visible(False)
+        ax1.grid(axis="y", zorder=0)
+        ax1.patch.set_facecolor("#eeeeee")
+        return self.figure, ax1
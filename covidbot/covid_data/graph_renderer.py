@@ -0,0 +1,84 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Callable, Dict, Optional
+
+from covidbot.metrics import CREATED_GRAPHS, DEDUPLICATED_GRAPHS
+
+
+def render_to_file(render: Callable[..., None], filepath: str, *args) -> str:
+    """
+    Calls render with a temporary filename and moves the result to filepath, so other processes never see a partially
+    written graph
+    :return: filepath
+    """
+    tmp_filepath = f"{filepath}.{os.getpid()}.tmp"
+    try:
+        render(tmp_filepath, *args)
+        os.replace(tmp_filepath, filepath)
+    finally:
+        if os.path.exists(tmp_filepath):
+            os.remove(tmp_filepath)
+    return filepath
+
+
+class GraphRenderer:
+    """
+    Renders graphs in a pool of worker processes, so they are drawn in parallel and do not block the GIL of the bot.
+    Render functions have to be picklable, e.g. module level functions or static methods, and are called with the
+    target filepath followed by the data to plot. Requests for a graph that is currently rendered get the same
+    future. With max_workers=0 graphs are rendered in the calling thread.
+    """
+    executor: Optional[ProcessPoolExecutor]
+    in_flight: Dict[str, Future]
+    lock: threading.Lock
+    log = logging.getLogger(__name__)
+
+    def __init__(self, max_workers: int = 0):
+        self.executor = None
+        if max_workers > 0:
+            # Forking a process with running threads, e.g. from the Telegram dispatcher, is not safe
+            self.executor = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+        self.in_flight = {}
+        self.lock = threading.Lock()
+
+    def submit(self, graph_type: str, filepath: str, render: Callable[..., None], *args) -> Future:
+        """
+        Schedules rendering of a graph
+        :param graph_type: Type of the graph, used as metrics label
+        :param filepath: Target path of the graph
+        :param render: Function that draws the graph to the filepath passed as first argument
+        :param args: Further arguments for render
+        :return: Future resolving to filepath
+        """
+        with self.lock:
+            future = self.in_flight.get(filepath)
+            if future:
+                DEDUPLICATED_GRAPHS.labels(type=graph_type).inc()
+                return future
+
+            CREATED_GRAPHS.labels(type=graph_type).inc()
+            if self.executor:
+                future = self.executor.submit(render_to_file, render, filepath, *args)
+            else:
+                future = Future()
+                future.set_running_or_notify_cancel()
+            self.in_flight[filepath] = future
+
+        future.add_done_callback(lambda f: self._done(filepath))
+        if not self.executor:
+            try:
+                future.set_result(render_to_file(render, filepath, *args))
+            except Exception as e:
+                future.set_exception(e)
+        return future
+
+    def _done(self, filepath: str) -> None:
+        with self.lock:
+            self.in_flight.pop(filepath, None)
+
+    def shutdown(self) -> None:
+        if self.executor:
+            self.executor.shutdown()
@@ -0,0 +1,92 @@
+import logging
+import os
+import time
+from datetime import timedelta
+from typing import List, Tuple
+
+from covidbot.metrics import GRAPHICS_CACHE_SIZE, GRAPHICS_CACHE_FILES, GRAPHICS_CACHE_EVICTIONS
+
+
+class GraphicsCache:
+    """
+    Keeps the graphics directory bounded. Files older than max_age are deleted, and if the directory is still larger
+    than max_bytes, the least recently used files are deleted. As filesystems are often mounted with relatime, cache
+    hits update the access time explicitly via :py:meth:`touch`.
+    """
+    directory: str
+    max_bytes: int
+    max_age: timedelta
+    min_age: timedelta
+    log = logging.getLogger(__name__)
+
+    def __init__(self, directory: str, max_bytes: int = 500 * 1024 * 1024, max_age: timedelta = timedelta(days=7),
+                 min_age: timedelta = timedelta(hours=1)):
+        """
+        :param directory: Graphics directory
+        :param max_bytes: Maximum size of all files in the directory
+        :param max_age: Files last modified before are deleted
+        :param min_age: Files accessed within this time are never deleted, as they might be about to be sent
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.min_age = min_age
+
+    @staticmethod
+    def touch(filepath: str) -> None:
+        """
+        Marks a file as used, keeping its modification time
+        """
+        try:
+            os.utime(filepath, (time.time(), os.stat(filepath).st_mtime))
+        except OSError as e:
+            GraphicsCache.log.warning(f"Could not update access time of {filepath}: {e}")
+
+    def cleanup(self) -> int:
+        """
+        Deletes files according to max_age and max_bytes
+        :return: Number of deleted files
+        """
+        now = time.time()
+        files: List[Tuple[float, int, str]] = []
+        total_bytes = 0
+        deleted = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime < now - self.max_age.total_seconds() \
+                        and stat.st_atime < now - self.min_age.total_seconds():
+                    if self._delete(entry.path, "age"):
+                        deleted += 1
+                        continue
+                files.append((stat.st_atime, stat.st_size, entry.path))
+                total_bytes += stat.st_size
+
+        if total_bytes > self.max_bytes:
+            # Least recently used first
+            files.sort()
+            remaining = []
+            for i, (atime, size, path) in enumerate(files):
+                if total_bytes <= self.max_bytes or atime > now - self.min_age.total_seconds():
+                    remaining = files[i:]
+                    break
+                if self._delete(path, "size"):
+                    deleted += 1
+                    total_bytes -= size
+            files = remaining
+
+        GRAPHICS_CACHE_SIZE.set(total_bytes)
+        GRAPHICS_CACHE_FILES.set(len(files))
+        self.log.info(f"Deleted {deleted} graphics, {len(files)} files with {total_bytes} bytes left")
+        return deleted
+
+    def _delete(self, path: str, reason: str) -> bool:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            # Removed by a concurrent cleanup
+            return False
+        GRAPHICS_CACHE_EVICTIONS.labels(reason=reason).inc()
+        return True
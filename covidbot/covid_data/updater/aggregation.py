@@ -0,0 +1,123 @@
+import logging
+from datetime import date
+from typing import Dict, List, Optional
+
+
+class HierarchyAggregator:
+    """
+    Calculates the values of parent regions, e.g. states and Germany, from their children in counties. The parent tree
+    is walked bottom-up once, so each level is calculated from the complete level below, independent of the depth of
+    the tree. Only the given date range is aggregated, which allows to backfill history as well.
+    """
+    cursor: object
+    levels: List[List[int]]
+    log = logging.getLogger(__name__)
+
+    def __init__(self, cursor):
+        """
+        :param cursor: Cursor of the connection to use, changes are not committed
+        """
+        self.cursor = cursor
+        self.cursor.execute('SELECT rs, parent FROM counties')
+        self.levels = self.get_levels({row[0]: row[1] for row in self.cursor.fetchall()})
+
+    @staticmethod
+    def get_levels(parents: Dict[int, Optional[int]]) -> List[List[int]]:
+        """
+        Groups all regions that have children by their depth in the tree
+        :param parents: Region ID to the ID of its parent, None for roots
+        :return: Lists of region IDs, deepest level first
+        """
+        depths: Dict[int, int] = {}
+
+        def depth(region_id: int) -> int:
+            # Walk up until a region with known depth or a root is found
+            path = []
+            current = region_id
+            while current not in depths:
+                if current in path:
+                    raise ValueError(f"Region {current} is its own ancestor")
+                if parents.get(current) is None:
+                    depths[current] = 0
+                    break
+                path.append(current)
+                current = parents[current]
+
+            for child in reversed(path):
+                depths[child] = depths[parents[child]] + 1
+            return depths[region_id]
+
+        levels: Dict[int, List[int]] = {}
+        for region_id in sorted({parent for parent in parents.values() if parent is not None}):
+            levels.setdefault(depth(region_id), []).append(region_id)
+        return [levels[d] for d in sorted(levels.keys(), reverse=True)]
+
+    def aggregate(self, from_date: date, to_date: Optional[date] = None) -> None:
+        """
+        Updates population, cases, deaths and missing incidences of all parent regions
+        :param from_date: First day to aggregate
+        :param to_date: Last day to aggregate, from_date if None
+        """
+        if not to_date:
+            to_date = from_date
+
+        # Incidences are weighted by the population, so all levels need it first
+        for level in self.levels:
+            self.update_population(level)
+
+        for level in self.levels:
+            self.update_cases(level, from_date, to_date)
+            self.update_incidence(level, from_date, to_date)
+        self.log.debug(f"Aggregated {len(self.levels)} levels from {from_date} to {to_date}")
+
+    def update_population(self, parent_ids: List[int]) -> None:
+        self.cursor.execute('UPDATE counties, (SELECT parent as id, SUM(population) as pop FROM counties '
+                            f'WHERE parent IN ({self.placeholders(parent_ids)}) GROUP BY parent) as pop_sum '
+                            'SET population=pop_sum.pop WHERE rs=pop_sum.id', parent_ids)
+
+    def update_cases(self, parent_ids: List[int], from_date: date, to_date: date) -> None:
+        self.cursor.execute('INSERT INTO covid_data (rs, date, total_cases, total_deaths) '
+                            'SELECT new.parent, new_date, new_cases, new_deaths FROM '
+                            '(SELECT c.parent as parent, d.date as new_date, SUM(d.total_cases) as new_cases, '
+                            'SUM(d.total_deaths) as new_deaths FROM covid_data d '
+                            'JOIN counties c on d.rs = c.rs '
+                            f'WHERE c.parent IN ({self.placeholders(parent_ids)}) AND d.date BETWEEN %s AND %s '
+                            'GROUP BY c.parent, d.date) as new '
+                            'ON DUPLICATE KEY UPDATE total_cases=COALESCE(new.new_cases, covid_data.total_cases), '
+                            'total_deaths=COALESCE(new.new_deaths, covid_data.total_deaths)',
+                            parent_ids + [from_date, to_date])
+
+    def update_incidence(self, parent_ids: List[int], from_date: date, to_date: date) -> None:
+        self.cursor.execute('UPDATE covid_data, '
+                            '(SELECT c.parent as rs, d.date, SUM(c.population * d.incidence) / SUM(c.population) '
+                            'as incidence FROM covid_data as d '
+                            'JOIN counties c on c.rs = d.rs '
+                            f'WHERE c.parent IN ({self.placeholders(parent_ids)}) AND d.date BETWEEN %s AND %s '
+                            'GROUP BY d.date, c.parent) as incidence '
+                            'SET covid_data.incidence = incidence.incidence '
+                            'WHERE covid_data.incidence IS NULL AND covid_data.date = incidence.date '
+                            'AND covid_data.rs = incidence.rs', parent_ids + [from_date, to_date])
+
+    def aggregate_icu_beds(self, from_date: date, to_date: Optional[date] = None) -> None:
+        """
+        Adds the ICU beds of parent regions that are not known yet. Germany is only calculated if all states are known.
+        :param from_date: First day to aggregate
+        :param to_date: Last day to aggregate, from_date if None
+        """
+        if not to_date:
+            to_date = from_date
+
+        for level in self.levels:
+            self.cursor.execute(
+                'INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid, covid_ventilated, '
+                'updated) SELECT c.parent, date, SUM(clear), SUM(occupied), SUM(occupied_covid), '
+                'SUM(covid_ventilated), updated FROM icu_beds '
+                'INNER JOIN counties c on c.rs = icu_beds.district_id '
+                f'WHERE c.parent IN ({self.placeholders(level)}) AND date BETWEEN %s AND %s '
+                'GROUP BY c.parent, date '
+                'HAVING COUNT(c.parent) = (SELECT COUNT(*) FROM counties WHERE parent=c.parent) OR c.parent > 0',
+                level + [from_date, to_date])
+
+    @staticmethod
+    def placeholders(values: List) -> str:
+        return ', '.join(['%s'] * len(values))
@@ -1,12 +1,15 @@
 import csv
 import logging
 from datetime import datetime, date
-from typing import Optional, Dict
+from typing import Optional, Dict, List, Tuple, Callable, Any
 
 import ujson as json
 
+from covidbot.covid_data.covid_data import CovidDatabaseCreator
+from covidbot.covid_data.updater.aggregation import HierarchyAggregator
 from covidbot.covid_data.updater.updater import Updater
-from covidbot.covid_data.updater.utils import clean_district_name
+from covidbot.covid_data.updater.utils import clean_district_name, StageTimer
+from covidbot.metrics import UPDATER_IMPORTED_ROWS, UPDATER_PROGRESS
 
 
 class RKIUpdater(Updater):
@@ -38,96 +41,137 @@ class RKIUpdater(Updater):
         return False
 
     def add_data(self, json_data: Dict) -> None:
-        covid_data = []
-        rs_data = []
-        added_bl = set()
-        last_update = self.get_last_update()
-        now = datetime.now().date()
-        new_updated = None
-        for feature in json_data:
-            row = feature['attributes']
-            new_updated = datetime.strptime(row['last_update'], "%d.%m.%Y, %H:%M Uhr").date()
-            if last_update and new_updated <= last_update or now < new_updated:
-                # Do not take data from future, important for testing
-                continue
-
-            # Gather Bundesland data
-            if row['BL_ID'] not in added_bl:
-                covid_data.append(
-                    (int(row['BL_ID']), new_updated, None, float(row['cases7_bl_per_100k']),
-                     None))
-                rs_data.append((int(row['BL_ID']), row['BL'], 'Bundesland', None, 0))
-                added_bl.add(row['BL_ID'])
+        """
+        Adds a new day of RKI data. Districts and the aggregated values of states and Germany are bulk loaded into a
+        staging table first, checked for plausibility and then moved to covid_data within the same transaction.
+        :param json_data: Features of the RKI API
+        """
+        timer = StageTimer(self.__class__.__name__)
+        with timer.stage("parse"):
+            covid_data, rs_data = self.parse_features(json_data, self.get_last_update(), date.today())
+
+        if not covid_data:
+            self.log.debug("No new data to insert")
+            return
 
-            covid_data.append((int(row['RS']), new_updated, int(row['cases']), float(row['cases7_per_100k']),
-                               int(row['deaths'])))
-            rs_data.append((int(row['RS']), clean_district_name(row['county']) + " (" + row['BEZ'] + ")",
-                            row['BEZ'], int(row['EWZ']), int(row['BL_ID'])))
-
-        self.log.debug("Insert new data into counties and covid_data")
-        with self.connection.cursor(dictionary=True) as cursor:
-            cursor.executemany('INSERT INTO counties (rs, county_name, type, population, parent) '
-                               'VALUES (%s, %s, %s, %s, %s) '
-                               'ON DUPLICATE KEY UPDATE population=VALUES(population)',
-                               rs_data)
-            cursor.executemany('''INSERT INTO covid_data (rs, date, total_cases, incidence, total_deaths)
-             VALUES (%s, %s, %s, %s, %s) ON DUPLICATE KEY UPDATE rs=rs''', covid_data)
-        self.calculate_aggregated_values(new_updated)
-
-        # Check for Plausibility, as Dataset has been wrong sometimes
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute('SELECT new_cases, new_deaths FROM covid_data_calculated '
-                           'WHERE rs=%s ORDER BY date DESC LIMIT 1', [self.get_district_id("Deutschland")])
-            germany = cursor.fetchone()
-            if germany['new_cases'] and (germany['new_cases'] <= 0 or germany['new_cases'] >= 100000) \
-                    or germany['new_deaths'] and germany['new_deaths'] <= 0:
+            with timer.stage("counties"):
+                cursor.executemany('INSERT INTO counties (rs, county_name, type, population, parent) '
+                                   'VALUES (%s, %s, %s, %s, %s) '
+                                   'ON DUPLICATE KEY UPDATE population=VALUES(population)',
+                                   rs_data)
+
+            with timer.stage("staging"):
+                # Temporary tables are private to the connection and do not commit the transaction
+                cursor.execute('CREATE TEMPORARY TABLE IF NOT EXISTS covid_data_staging (rs INTEGER, date DATE, '
+                               'total_cases INT, incidence FLOAT, total_deaths INT, PRIMARY KEY(rs, date))')
+                cursor.execute('DELETE FROM covid_data_staging')
+                cursor.execute('INSERT INTO covid_data_staging (rs, date, total_cases, incidence, total_deaths) '
+                               'VALUES ' + ', '.join(['(%s, %s, %s, %s, %s)'] * len(covid_data)),
+                               [value for row in covid_data for value in row])
+
+            # Check for Plausibility, as Dataset has been wrong sometimes
+            with timer.stage("validate"):
+                cursor.execute('SELECT s.total_cases - y.total_cases as new_cases, '
+                               's.total_deaths - y.total_deaths as new_deaths FROM covid_data_staging s '
+                               'LEFT JOIN covid_data y ON y.rs = s.rs AND y.date = SUBDATE(s.date, 1) '
+                               'WHERE s.rs=0 ORDER BY s.date DESC LIMIT 1')
+                germany = cursor.fetchone()
+            if germany and (germany['new_cases'] and (germany['new_cases'] <= 0 or germany['new_cases'] >= 100000)
+                            or germany['new_deaths'] and germany['new_deaths'] <= 0):
                 self.log.error("Data is looking weird! Rolling back data update!")
                 self.connection.rollback()
                 raise ValueError(
                     f"COVID19 {germany['new_cases']} new cases and {germany['new_deaths']} deaths are not plausible. Aborting!")
-            else:
+
+            with timer.stage("insert"):
+                cursor.execute('INSERT INTO covid_data (rs, date, total_cases, incidence, total_deaths) '
+                               'SELECT rs, date, total_cases, incidence, total_deaths FROM covid_data_staging '
+                               'ON DUPLICATE KEY UPDATE rs=covid_data.rs')
+
+            with timer.stage("derived"):
+                dates = [row[1] for row in covid_data]
+                CovidDatabaseCreator.update_derived_data(cursor, min(dates), max(dates))
+
+            with timer.stage("commit"):
+                self.increment_data_version()
                 self.connection.commit()
-        self.log.debug("Finished inserting new data")
+        timer.log(self.log)
+
+    @staticmethod
+    def parse_features(json_data: Dict, last_update: Optional[date], today: date) -> Tuple[List[Tuple], List[Tuple]]:
+        """
+        Parses the districts of the RKI API and calculates the values of the states and Germany
+        :param json_data: Features of the RKI API
+        :param last_update: Date of the newest data we already have, older features are skipped
+        :param today: Features from the future are skipped, important for testing
+        :return: Rows for covid_data (rs, date, total_cases, incidence, total_deaths) and for counties
+        (rs, county_name, type, population, parent), parents before their children
+        """
+        covid_data = []
+        districts = []
+        states: Dict[int, str] = {}
+        # (state, date) to cases, deaths and incidence
+        state_data: Dict[Tuple[int, date], List] = {}
+        for feature in json_data:
+            row = feature['attributes']
+            updated = datetime.strptime(row['last_update'], "%d.%m.%Y, %H:%M Uhr").date()
+            if last_update and updated <= last_update or today < updated:
+                continue
+
+            state_id = int(row['BL_ID'])
+            states[state_id] = row['BL']
+            state = state_data.setdefault((state_id, updated), [0, 0, float(row['cases7_bl_per_100k'])])
+            state[0] += int(row['cases'])
+            state[1] += int(row['deaths'])
 
-    def calculate_aggregated_values(self, new_updated: date):
+            covid_data.append((int(row['RS']), updated, int(row['cases']), float(row['cases7_per_100k']),
+                               int(row['deaths'])))
+            districts.append((int(row['RS']), clean_district_name(row['county']) + " (" + row['BEZ'] + ")",
+                              row['BEZ'], int(row['EWZ']), state_id))
+
+        population: Dict[int, int] = {}
+        for district in {d[0]: d for d in districts}.values():
+            population[district[4]] = population.get(district[4], 0) + district[3]
+
+        # Germany, population weighted incidence of the states
+        germany_data: Dict[date, List] = {}
+        for (state_id, updated), (cases, deaths, incidence) in state_data.items():
+            covid_data.append((state_id, updated, cases, incidence, deaths))
+            germany = germany_data.setdefault(updated, [0, 0, 0.0])
+            germany[0] += cases
+            germany[1] += deaths
+            germany[2] += incidence * population[state_id]
+
+        germany_population = sum(population.values())
+        for updated, (cases, deaths, weighted_incidence) in germany_data.items():
+            incidence = None
+            if germany_population:
+                incidence = weighted_incidence / germany_population
+            covid_data.append((0, updated, cases, incidence, deaths))
+
+        rs_data = [(0, 'Deutschland', 'Staat', germany_population, None)]
+        rs_data += [(state_id, name, 'Bundesland', population[state_id], 0) for state_id, name in states.items()]
+        rs_data += districts
+        return covid_data, rs_data
+
+    def calculate_aggregated_values(self, from_date: date, to_date: Optional[date] = None) -> None:
+        """
+        Calculates the values of all parent regions and the derived data for a date range
+        :param from_date: First day to aggregate
+        :param to_date: Last day to aggregate, from_date if None
+        """
         self.log.debug("Calculating aggregated values")
-        with self.connection.cursor(dictionary=True) as cursor:
-            # Calculate all parents, must be executed for every depth
-            for i in range(2):
-                # Calculate Covid Data
-                cursor.execute('''INSERT INTO covid_data (rs, date, total_cases, total_deaths)
-                                    SELECT new.parent, new_date, new_cases, new_deaths
-                                    FROM
-                                    (SELECT c.parent as parent, date as new_date, SUM(total_cases) as new_cases,
-                                     SUM(total_deaths) as new_deaths FROM covid_data_calculated 
-                                     LEFT JOIN counties c on covid_data_calculated.rs = c.rs
-                                     WHERE c.parent IS NOT NULL AND date = DATE(%s)
-                                     GROUP BY c.parent, date)
-                                    as new
-                                  ON DUPLICATE KEY UPDATE 
-                                  date=new.new_date, total_cases=new.new_cases, total_deaths=new.new_deaths''',
-                               [new_updated])
-                # Calculate Population
-                cursor.execute(
-                    'UPDATE counties, (SELECT ncounties.rs as id, SUM(counties.population) as pop FROM counties\n'
-                    '    LEFT JOIN counties ncounties ON ncounties.rs = counties.parent\n'
-                    'WHERE counties.parent IS NOT NULL GROUP BY counties.parent) as pop_sum\n'
-                    'SET population=pop_sum.pop WHERE rs=pop_sum.id')
-                # Calculate Incidence
-                cursor.execute('UPDATE covid_data, '
-                               '(SELECT c.parent as rs, d.date, SUM(c.population * d.incidence) / SUM(c.population) '
-                               'as incidence FROM covid_data as d '
-                               'LEFT JOIN counties c on c.rs = d.rs '
-                               'WHERE c.parent IS NOT NULL '
-                               'GROUP BY date, c.parent) as incidence '
-                               'SET covid_data.incidence = incidence.incidence '
-                               'WHERE covid_data.incidence IS NULL AND covid_data.date = incidence.date '
-                               'AND covid_data.rs = incidence.rs')
+        with self.connection.cursor() as cursor:
+            HierarchyAggregator(cursor).aggregate(from_date, to_date)
+            CovidDatabaseCreator.update_derived_data(cursor, from_date, to_date)
 
 
 class RKIHistoryUpdater(RKIUpdater):
     CASES_URL = "https://raw.githubusercontent.com/jgehrcke/covid-19-germany-gae/master/cases-rki-by-ags.csv"
     INCIDENCE_URL = "https://raw.githubusercontent.com/jgehrcke/covid-19-germany-gae/master/more-data/7di-rki-by-ags.csv"
+    # Rows written per transaction, always contains whole days
+    CHUNK_SIZE = 10000
 
     def get_last_update(self) -> Optional[datetime]:
         with self.connection.cursor() as cursor:
@@ -150,81 +194,120 @@ class RKIHistoryUpdater(RKIUpdater):
         return updated
 
     def update_cases(self) -> bool:
-        cases = self.get_resource(self.CASES_URL)
+        sum_cases: Dict[int, int] = {}
 
-        cases_csv = csv.DictReader(cases.splitlines())
+        def parse_cases(column: str, value: str) -> Optional[Tuple[int, int]]:
+            if column[:3] == "sum":
+                return None
 
-        sum_cases = {}
-        new_cases = False
-        with self.connection.cursor() as cursor:
-            for row in cases_csv:
-                updated = None
-                for field in cases_csv.fieldnames:
-                    if field[:3] == "sum":
-                        continue
-                    elif field[:4] == "time":
-                        updated = row[field]
-                        updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
-                        cursor.execute(
-                            'SELECT * FROM covid_data WHERE date=%s AND rs > 1000 AND total_cases IS NOT NULL',
-                            [updated])
-                        records = cursor.fetchall()
-                        if records:
-                            return new_cases
-                        print(f"Data from {updated}")
-                        continue
-
-                    district_id = field
-                    if district_id == '11000':
-                        district_id = '11'
-                    cases_num = int(row[field])
-                    if not sum_cases.get(district_id):
-                        sum_cases[district_id] = 0
-
-                    sum_cases[district_id] += cases_num
-                    cursor.execute(
-                        'INSERT INTO covid_data (rs, date, total_cases) VALUE (%s, %s, %s) ON DUPLICATE KEY UPDATE covid_data.total_cases=%s',
-                        [int(district_id), updated, sum_cases[district_id], sum_cases[district_id]])
-                    new_cases = True
-                self.connection.commit()
+            district_id = column
+            if district_id == '11000':
+                district_id = '11'
+            district_id = int(district_id)
+            sum_cases[district_id] = sum_cases.get(district_id, 0) + int(value)
+            return district_id, sum_cases[district_id]
 
-        return new_cases
+        return self.import_history(self.CASES_URL, "total_cases", parse_cases)
 
     def update_incidences(self) -> bool:
-        incidences = self.get_resource(self.INCIDENCE_URL)
-        incidences_csv = csv.DictReader(incidences.splitlines())
+        def parse_incidence(column: str, value: str) -> Optional[Tuple[int, float]]:
+            if column[:3] == "sum":
+                return None
+
+            district_id = column[:-4]
+            if district_id == '11000':
+                district_id = '11'
+
+            if district_id == 'germany':
+                district_id = '0'
+            return int(district_id), float(value)
+
+        return self.import_history(self.INCIDENCE_URL, "incidence", parse_incidence)
+
+    def import_history(self, url: str, field: str, parse: Callable[[str, str], Optional[Tuple[int, Any]]]) -> bool:
+        """
+        Streams a CSV file with one row per day and one column per district into covid_data. The import starts with
+        the oldest day and stops at the first day we already have data for. Rows are written in chunks of whole days,
+        each chunk is committed together with a checkpoint, so an interrupted import continues after the last chunk.
+        :param url: URL of the CSV file
+        :param field: Column of covid_data to import
+        :param parse: Called for each cell of every row, even of already imported days, with column name and value.
+        Returns district id and value to write, None to skip the column.
+        :return: Whether new data was written
+        """
+        lines = self.get_resource_lines(url)
+        if lines is None:
+            return False
 
+        reader = csv.reader(lines)
+        header = next(reader)
+        time_column = [i for i, column in enumerate(header) if column[:4] == "time"][0]
+        checkpoint_name = f"{self.__class__.__name__}-{field}"
+        checkpoint = self.get_checkpoint(checkpoint_name)
+        if checkpoint:
+            self.log.info(f"Resuming import of {field} after {checkpoint}")
+
+        timer = StageTimer(self.__class__.__name__)
         new_data = False
         with self.connection.cursor() as cursor:
-            for row in incidences_csv:
-                updated = None
-                for field in incidences_csv.fieldnames:
-                    if field[:3] == "sum":
-                        continue
-                    elif field[:4] == "time":
-                        updated = row[field]
-                        updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
-                        cursor.execute(
-                            'SELECT * FROM covid_data WHERE date=%s AND rs > 1000 AND incidence IS NOT NULL',
-                            [updated])
-                        records = cursor.fetchall()
-                        if records:
-                            return new_data
-                        continue
-
-                    district_id = field[:-4]
-                    if district_id == '11000':
-                        district_id = '11'
-
-                    if district_id == 'germany':
-                        district_id = '0'
-
-                    incidence = float(row[field])
-
-                    cursor.execute(
-                        'INSERT INTO covid_data (rs, date, incidence) VALUE (%s, %s, %s) ON DUPLICATE KEY UPDATE covid_data.incidence=%s',
-                        [int(district_id), updated, incidence, incidence])
+            with timer.stage("existing"):
+                cursor.execute(f'SELECT DISTINCT date FROM covid_data WHERE rs > 1000 AND {field} IS NOT NULL')
+                existing_dates = {row[0] for row in cursor.fetchall()}
+                aggregator = HierarchyAggregator(cursor)
+
+            rows = []
+            chunk_start = None
+            updated = None
+            for values in reader:
+                if not values:
+                    continue
+
+                with timer.stage("parse"):
+                    updated = values[time_column]
+                    updated = date(int(updated[:4]), int(updated[5:7]), int(updated[8:10]))
+                    if not checkpoint or checkpoint < updated:
+                        if updated in existing_dates:
+                            break
+                        if not chunk_start:
+                            chunk_start = updated
+
+                    for i, column in enumerate(header):
+                        if i == time_column:
+                            continue
+                        parsed = parse(column, values[i])
+                        if parsed and chunk_start:
+                            rows.append((parsed[0], updated, parsed[1]))
+
+                if len(rows) >= self.CHUNK_SIZE:
+                    self.write_history_chunk(cursor, aggregator, timer, checkpoint_name, field, rows, chunk_start,
+                                             updated)
+                    rows = []
+                    chunk_start = None
                     new_data = True
-                self.connection.commit()
 
+            if rows:
+                # The day we stopped at was not added to the chunk
+                last_day = max(row[1] for row in rows)
+                self.write_history_chunk(cursor, aggregator, timer, checkpoint_name, field, rows, chunk_start,
+                                         last_day)
+                new_data = True
+        timer.log(self.log)
         return new_data
+
+    def write_history_chunk(self, cursor, aggregator: HierarchyAggregator, timer: StageTimer, checkpoint_name: str,
+                            field: str, rows: List[Tuple[int, date, Any]], from_date: date, to_date: date) -> None:
+        with timer.stage("upsert"):
+            cursor.executemany(f'INSERT INTO covid_data (rs, date, {field}) VALUES (%s, %s, %s) '
+                               f'ON DUPLICATE KEY UPDATE {field}=VALUES({field})', rows)
+        with timer.stage("aggregate"):
+            aggregator.aggregate(from_date, to_date)
+            CovidDatabaseCreator.update_derived_data(cursor, from_date, to_date)
+        with timer.stage("commit"):
+            self.set_checkpoint(checkpoint_name, to_date)
+            self.increment_data_version()
+            self.connection.commit()
+
+        UPDATER_IMPORTED_ROWS.labels(updater=self.__class__.__name__).inc(len(rows))
+        UPDATER_PROGRESS.labels(updater=self.__class__.__name__).set(
+            datetime.combine(to_date, datetime.min.time()).timestamp())
+        self.log.debug(f"Imported {field} from {from_date} to {to_date}")
@@ -1,10 +1,18 @@
 import csv
 import logging
+import os
 import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from datetime import datetime, timedelta, date
-from typing import Optional
+from typing import Optional, Dict, List
 
+import requests
+
+from covidbot.covid_data.updater.aggregation import HierarchyAggregator
 from covidbot.covid_data.updater.updater import Updater
+from covidbot.covid_data.updater.utils import StageTimer
+from covidbot.metrics import UPDATER_IMPORTED_ROWS, UPDATER_PROGRESS
 
 
 class ICUGermanyUpdater(Updater):
@@ -52,6 +60,8 @@ class ICUGermanyUpdater(Updater):
                         "INNER JOIN counties c on c.rs = icu_beds.district_id "
                         "GROUP BY c.parent, date "
                         "HAVING (COUNT(c.parent) = (SELECT COUNT(*) FROM counties WHERE parent=c.parent) OR c.parent > 0) AND parent IS NOT NULL")
+            if results:
+                self.increment_data_version()
             self.connection.commit()
             if last_update != self.get_last_update():
                 return True
@@ -60,6 +70,12 @@ class ICUGermanyUpdater(Updater):
 
 class ICUGermanyHistoryUpdater(Updater):
     log = logging.getLogger(__name__)
+    ARCHIVE_URL = 'https://www.divi.de/divi-intensivregister-tagesreport-archiv-csv?start=0&limit=500'
+    # Downloaded archive files are kept here, so a re-run does not have to download them again
+    ARCHIVE_DIR = 'resources/divi-archive'
+    MAX_DOWNLOADS = 4
+    # Seconds to wait for the server, so a stalled download does not block the import
+    DOWNLOAD_TIMEOUT = 60
 
     def get_last_update(self) -> Optional[datetime]:
         with self.connection.cursor() as cursor:
@@ -72,81 +88,147 @@ class ICUGermanyHistoryUpdater(Updater):
         if self.get_last_update().date() == date(2020, 4, 24):
             return False
 
-        new_data = False
-
-        csv_list = self.get_resource(
-            'https://www.divi.de/divi-intensivregister-tagesreport-archiv-csv?start=0&limit=500')
-        urls = []
-
-        for url in re.finditer(
-                '/divi-intensivregister-tagesreport-archiv-csv/viewdocument/\d{4}/divi-intensivregister-(202[01])-(\d\d)-(\d\d)[-\d]*',
-                csv_list):
-            urls.append(
-                ('https://www.divi.de' + url.group(0), date(int(url.group(1)), int(url.group(2)), int(url.group(3)))))
-
-        for url, data_date in urls:
-            with self.connection.cursor(dictionary=True) as cursor:
-                cursor.execute('SELECT * FROM icu_beds WHERE date=%s', [data_date])
-                data = cursor.fetchall()
-                if data:
-                    continue
-
-                response = self.get_resource(url)
-                if response:
-                    self.log.debug("Got historic ICU Data from DIVI")
-                    divi_data = response.splitlines()
-                    reader = csv.DictReader(divi_data)
-                    results = []
-
-                    key_district_id = "gemeindeschluessel"
-                    if key_district_id not in reader.fieldnames:
-                        key_district_id = "kreis"
-
-                    key_covid_ventilated = "faelle_covid_aktuell_invasiv_beatmet"
-                    if key_covid_ventilated not in reader.fieldnames:
-                        key_covid_ventilated = "faelle_covid_aktuell_beatmet"
-
-                    if key_covid_ventilated not in reader.fieldnames:
-                        key_covid_ventilated = None
-
-                    key_covid = "faelle_covid_aktuell"
-                    if key_covid not in reader.fieldnames:
-                        key_covid = None
-
-                    for row in reader:
-                        # Berlin is here AGS = 11000
-                        if row[key_district_id] == '11000':
-                            row[key_district_id] = '11'
-
-                        if key_covid_ventilated:
-                            num_ventilated = row[key_covid_ventilated]
-                        else:
-                            num_ventilated = None
-
-                        if key_covid:
-                            num_covid = row[key_covid]
-                        else:
-                            num_covid = None
-
-                        row_contents = [row[key_district_id], data_date, row['betten_frei'], row['betten_belegt'],
-                                        num_covid, num_ventilated, data_date]
-                        results.append(row_contents)
-
-                    cursor.executemany(
-                        "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid,"
-                        " covid_ventilated, updated) VALUES (%s, %s, %s, %s, %s, %s, %s)", results)
-
-                    # Calculate aggregated values for states
-                    for i in range(2):
-                        cursor.execute(
-                            "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid, covid_ventilated, updated) "
-                            "SELECT c.parent, date, SUM(clear), SUM(occupied), SUM(occupied_covid), "
-                            "SUM(covid_ventilated), updated FROM icu_beds "
-                            "INNER JOIN counties c on c.rs = icu_beds.district_id "
-                            "GROUP BY c.parent, date "
-                            "HAVING (COUNT(c.parent) = (SELECT COUNT(*) FROM counties WHERE parent=c.parent) OR c.parent > 0) AND parent IS NOT NULL")
-                    self.connection.commit()
-                    new_data = True
-                else:
-                    self.log.warning(f"Not available: {url}")
-        return new_data
+        timer = StageTimer(self.__class__.__name__)
+        with timer.stage("scrape"):
+            csv_list = self.get_resource(self.ARCHIVE_URL)
+            with self.connection.cursor() as cursor:
+                cursor.execute('SELECT DISTINCT date FROM icu_beds')
+                existing_dates = {row[0] for row in cursor.fetchall()}
+
+            # All archives of each missing day in order of the list, later ones are used if the first is not available
+            urls: Dict[date, List[str]] = {}
+            for url in re.finditer(
+                    '/divi-intensivregister-tagesreport-archiv-csv/viewdocument/\d{4}/divi-intensivregister-(202[01])-(\d\d)-(\d\d)[-\d]*',
+                    csv_list):
+                data_date = date(int(url.group(1)), int(url.group(2)), int(url.group(3)))
+                if data_date not in existing_dates:
+                    urls.setdefault(data_date, []).append('https://www.divi.de' + url.group(0))
+
+        if not urls:
+            return False
+
+        os.makedirs(self.ARCHIVE_DIR, exist_ok=True)
+        imported_dates = []
+        with self.connection.cursor() as cursor:
+            # Downloads run in parallel, the database is only used from this thread
+            with ThreadPoolExecutor(max_workers=self.MAX_DOWNLOADS) as executor:
+                # Future to the day and the index of the URL it downloads
+                futures = {executor.submit(self.fetch_archive, day_urls[0]): (data_date, 0)
+                           for data_date, day_urls in urls.items()}
+                while futures:
+                    done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        data_date, index = futures.pop(future)
+                        url = urls[data_date][index]
+                        results = None
+                        try:
+                            response = future.result()
+                            if not response:
+                                self.log.warning(f"Not available: {url}")
+                            else:
+                                with timer.stage("parse"):
+                                    results = self.parse_archive(response, data_date)
+                        except (requests.RequestException, OSError) as e:
+                            self.log.warning(f"Could not download {url}: {e}")
+                        except (KeyError, ValueError, csv.Error) as e:
+                            self.log.warning(f"Could not parse {url}: {e!r}")
+
+                        if results is None:
+                            # Try the next archive of this day
+                            if index + 1 < len(urls[data_date]):
+                                futures[executor.submit(self.fetch_archive, urls[data_date][index + 1])] = \
+                                    (data_date, index + 1)
+                            else:
+                                self.log.warning(f"No archive available for {data_date}")
+                            continue
+
+                        with timer.stage("insert"):
+                            cursor.executemany(
+                                "INSERT IGNORE INTO icu_beds (district_id, date, clear, occupied, occupied_covid,"
+                                " covid_ventilated, updated) VALUES (%s, %s, %s, %s, %s, %s, %s)", results)
+                        imported_dates.append(data_date)
+                        UPDATER_IMPORTED_ROWS.labels(updater=self.__class__.__name__).inc(len(results))
+                        self.log.debug(f"Got historic ICU Data from DIVI for {data_date}")
+
+            if not imported_dates:
+                return False
+
+            with timer.stage("aggregate"):
+                HierarchyAggregator(cursor).aggregate_icu_beds(min(imported_dates), max(imported_dates))
+
+            with timer.stage("commit"):
+                self.increment_data_version()
+                self.connection.commit()
+
+        UPDATER_PROGRESS.labels(updater=self.__class__.__name__).set(
+            datetime.combine(max(imported_dates), datetime.min.time()).timestamp())
+        timer.log(self.log)
+        return True
+
+    def fetch_archive(self, url: str) -> Optional[str]:
+        """
+        Returns an archive file from the disk cache or downloads it. Called by the download threads, so it must not
+        use the database connection.
+        :param url: URL of the archive file
+        :return: Content of the CSV file, None if not available
+        """
+        filename = os.path.join(self.ARCHIVE_DIR, url.rsplit('/', 1)[-1] + ".csv")
+        if os.path.isfile(filename):
+            with open(filename, "r", encoding="utf-8") as f:
+                return f.read()
+
+        response = requests.get(url, timeout=self.DOWNLOAD_TIMEOUT)
+        if response.status_code != 200:
+            return None
+
+        # Write to a temporary file first, so an interrupted run does not leave a partial file behind
+        tmp_filename = f"{filename}.{threading.get_ident()}.tmp"
+        with open(tmp_filename, "w", encoding="utf-8") as f:
+            f.write(response.text)
+        os.replace(tmp_filename, filename)
+        return response.text
+
+    @staticmethod
+    def parse_archive(response: str, data_date: date) -> List[List]:
+        """
+        Parses an archive file of DIVI, which changed its format over time
+        :param response: Content of the CSV file
+        :param data_date: Day of the archive file
+        :return: Rows for icu_beds (district_id, date, clear, occupied, occupied_covid, covid_ventilated, updated)
+        """
+        reader = csv.DictReader(response.splitlines())
+        results = []
+
+        key_district_id = "gemeindeschluessel"
+        if key_district_id not in reader.fieldnames:
+            key_district_id = "kreis"
+
+        key_covid_ventilated = "faelle_covid_aktuell_invasiv_beatmet"
+        if key_covid_ventilated not in reader.fieldnames:
+            key_covid_ventilated = "faelle_covid_aktuell_beatmet"
+
+        if key_covid_ventilated not in reader.fieldnames:
+            key_covid_ventilated = None
+
+        key_covid = "faelle_covid_aktuell"
+        if key_covid not in reader.fieldnames:
+            key_covid = None
+
+        for row in reader:
+            # Berlin is here AGS = 11000
+            if row[key_district_id] == '11000':
+                row[key_district_id] = '11'
+
+            if key_covid_ventilated:
+                num_ventilated = row[key_covid_ventilated]
+            else:
+                num_ventilated = None
+
+            if key_covid:
+                num_covid = row[key_covid]
+            else:
+                num_covid = None
+
+            results.append([row[key_district_id], data_date, row['betten_frei'], row['betten_belegt'], num_covid,
+                            num_ventilated, data_date])
+        return results
@@ -52,5 +52,7 @@ class RulesGermanyUpdater(Updater):
                         cursor.execute("INSERT INTO district_rules (district_id, text, link, updated) "
                                        "VALUES (%s, %s, %s, %s)", [district_id, text, link, updated])
                     new_data = True
+            if new_data:
+                self.increment_data_version()
             self.connection.commit()
         return new_data
@@ -72,5 +72,7 @@ class RValueGermanyUpdater(Updater):
                     new_data = True
                     cursor.execute("INSERT INTO covid_r_value (district_id, r_date, `7day_r_value`, updated) "
                                    "VALUES (%s, %s, %s, %s)", [district_id, r_date, r_value, datetime.now()])
+            if new_data:
+                self.increment_data_version()
             self.connection.commit()
         return new_data
@@ -1,8 +1,8 @@
 import logging
 import random
 from abc import ABC, abstractmethod
-from datetime import datetime
-from typing import Optional
+from datetime import datetime, date
+from typing import Optional, Iterator
 
 import requests
 from mysql.connector import MySQLConnection
@@ -24,6 +24,23 @@ class Updater(ABC):
         if random.uniform(0.0, 1.0) > chance:
             return None
 
+        response = self.request_resource(url)
+        if response:
+            return response.text
+
+    def get_resource_lines(self, url: str) -> Optional[Iterator[str]]:
+        """
+        Streams a text resource line by line, so large files do not have to be kept in memory
+        :param url: URL of the resource
+        :return: Iterator over the lines, None if the resource was not modified
+        """
+        response = self.request_resource(url, stream=True)
+        if response:
+            if not response.encoding:
+                response.encoding = 'utf-8'
+            return response.iter_lines(decode_unicode=True)
+
+    def request_resource(self, url: str, stream: bool = False) -> Optional[requests.Response]:
         header = {}  # {"User-Agent": "CovidBot (https://github.com/eknoes/covid-bot | https://covidbot.d-64.org)"}
         last_update = self.get_last_update()
         if last_update:
@@ -35,10 +52,10 @@ class Updater(ABC):
             header["If-Modified-Since"] = day + ", " + last_update.strftime(f'%d {month} %Y %H:%M:%S GMT')
 
         self.log.debug(f"Requesting url {url}")
-        response = requests.get(url, headers=header)
+        response = requests.get(url, headers=header, stream=stream)
 
         if response.status_code == 200:
-            return response.text
+            return response
         elif response.status_code == 304:
             self.log.info("No new data available")
         else:
@@ -52,6 +69,37 @@ class Updater(ABC):
     def get_last_update(self) -> Optional[datetime]:
         pass
 
+    def increment_data_version(self) -> None:
+        """
+        Marks that this updater added new data, which invalidates cached data. Has to be called before the data is
+        committed, so both become visible at the same time.
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO data_updates (source, version, updated) VALUES (%s, 1, NOW()) '
+                           'ON DUPLICATE KEY UPDATE version=version+1, updated=NOW()', [self.__class__.__name__])
+
+    def get_checkpoint(self, name: str) -> Optional[date]:
+        """
+        Returns the last day an interrupted import has completely written
+        :param name: Name of the import
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('SELECT checkpoint FROM updater_checkpoints WHERE name=%s', [name])
+            row = cursor.fetchone()
+            if row:
+                return row[0]
+
+    def set_checkpoint(self, name: str, checkpoint: date) -> None:
+        """
+        Stores the last day an import has completely written. Has to be called before the data is committed, so an
+        import can be resumed consistently.
+        :param name: Name of the import
+        :param checkpoint: Last completely written day
+        """
+        with self.connection.cursor() as cursor:
+            cursor.execute('INSERT INTO updater_checkpoints (name, checkpoint, updated) VALUES (%s, %s, NOW()) '
+                           'ON DUPLICATE KEY UPDATE checkpoint=VALUES(checkpoint), updated=NOW()', [name, checkpoint])
+
     def get_district_id(self, district_name: str) -> Optional[int]:
         with self.connection.cursor() as cursor:
             cursor.execute('SELECT rs, county_name FROM counties WHERE county_name LIKE %s',
@@ -1,7 +1,44 @@
-from typing import Optional
+import logging
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict
+
+from covidbot.metrics import UPDATER_STAGE_TIME
 
 
 def clean_district_name(county_name: str) -> Optional[str]:
     if county_name is not None and county_name.count(" ") > 0:
         return " ".join(county_name.split(" ")[1:])
     return county_name
+
+
+class StageTimer:
+    """
+    Measures how long the stages of an update take, e.g. parsing, loading and aggregation. Durations are exported as
+    metric and can be logged at the end of an update.
+    """
+    updater: str
+    durations: Dict[str, float]
+
+    def __init__(self, updater: str):
+        """
+        :param updater: Name of the updater, used as metrics label
+        """
+        self.updater = updater
+        self.durations = {}
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            self.durations[name] = self.durations.get(name, 0) + duration
+            UPDATER_STAGE_TIME.labels(updater=self.updater, stage=name).observe(duration)
+
+    def report(self) -> str:
+        return ", ".join(f"{name}: {duration:.3f}s" for name, duration in self.durations.items())
+
+    def log(self, logger: logging.Logger) -> None:
+        logger.info(f"{self.updater} took {sum(self.durations.values()):.3f}s ({self.report()})")
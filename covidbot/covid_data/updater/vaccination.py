@@ -74,6 +74,8 @@ class VaccinationGermanyUpdater(Updater):
                                    [district_id, updated, row['Impfungen_kumulativ'],
                                     row['Zweitimpfungen_kumulativ'], rate_partial, rate_full,
                                     row['Differenz_zum_Vortag']])
+            if new_data:
+                self.increment_data_version()
             self.connection.commit()
         return new_data
 
@@ -134,5 +136,7 @@ class VaccinationGermanyImpfdashboardUpdater(Updater):
                                    [district_id, updated, row['personen_erst_kumulativ'],
                                     row['personen_voll_kumulativ'], rate_partial, rate_full,
                                     row['dosen_differenz_zum_vortag']])
+            if new_data:
+                self.increment_data_version()
             self.connection.commit()
         return new_data
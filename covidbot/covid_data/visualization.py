@@ -2,21 +2,21 @@ import datetime
 import logging
 import math
 import os
-from functools import reduce
-from typing import Optional, Tuple, List
+from concurrent.futures import Future
+from typing import Optional, Tuple, List, Callable, Dict
 
 import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import matplotlib.ticker
-from matplotlib import gridspec
+import numpy as np
 from matplotlib.axes import Axes
-from matplotlib.cbook import get_sample_data
 from matplotlib.figure import Figure
-from matplotlib.offsetbox import OffsetImage, AnnotationBbox
 from mysql.connector import MySQLConnection
 
 from covidbot import utils
-from covidbot.metrics import CACHED_GRAPHS, CREATED_GRAPHS
+from covidbot.covid_data.figure_template import FigureTemplate
+from covidbot.covid_data.graph_renderer import GraphRenderer
+from covidbot.covid_data.graphics_cache import GraphicsCache
+from covidbot.metrics import CACHED_GRAPHS
 from covidbot.utils import format_int
 
 
@@ -25,8 +25,11 @@ class Visualization:
     graphics_dir: str
     log = logging.getLogger(__name__)
     disable_cache: bool
+    renderer: GraphRenderer
+    cache: GraphicsCache
 
-    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False) -> None:
+    def __init__(self, connection: MySQLConnection, directory: str, disable_cache: bool = False,
+                 render_workers: int = 0, cache: Optional[GraphicsCache] = None) -> None:
         self.connection = connection
         if not os.path.exists(directory):
             os.makedirs(directory)
@@ -35,97 +38,78 @@ class Visualization:
 
         self.graphics_dir = directory
         self.disable_cache = disable_cache
+        self.renderer = GraphRenderer(render_workers)
+        self.cache = cache or GraphicsCache(directory)
+
+    def shutdown(self) -> None:
+        self.renderer.shutdown()
+
+    def cleanup_cache(self) -> int:
+        """
+        Deletes old and least recently used graphics
+        :return: Number of deleted files
+        """
+        return self.cache.cleanup()
+
+    def _get_cached(self, graph_type: str, filepath: str) -> Optional[Future]:
+        # Do not draw new graphic if its cached
+        if not self.disable_cache and os.path.isfile(filepath):
+            CACHED_GRAPHS.labels(type=graph_type).inc()
+            self.cache.touch(filepath)
+            future = Future()
+            future.set_result(filepath)
+            return future
+        return None
+
+    def _render(self, graph_type: str, filepath: str, render: Callable[..., None], *args) -> Future:
+        future = self._get_cached(graph_type, filepath)
+        if future:
+            return future
+        return self.renderer.submit(graph_type, filepath, render, *args)
 
     @staticmethod
     def setup_plot(current_date: Optional[datetime.date], title: str, y_label: str,
                    source: str = "Robert-Koch-Institut", quadratic: bool = False) -> Tuple[Figure, Axes]:
-        figsize = (8, 5)
-        if quadratic:
-            figsize = (8, 8)
-
-        fig = plt.figure(figsize=figsize, dpi=200)
-        gs = gridspec.GridSpec(15, 3)
-
-        if current_date:
-            # Second subplot just for Source and current date
-            ax2 = fig.add_subplot(gs[14, 0])
-            plt.axis('off')
-            ax2.annotate("Stand: {date}\nQuelle: {source}"
-                         .format(date=current_date.strftime("%d.%m.%Y"), source=source),
-                         color="#6e6e6e",
-                         xy=(0, -4.5), xycoords='axes fraction',
-                         horizontalalignment='left',
-                         verticalalignment='bottom')
-
-        # Third subplot for Link
-        ax3 = fig.add_subplot(gs[14:, 1])
-        plt.axis('off')
-
-        ax3.annotate("Tägliche Updates:\n"
-                     "https://covidbot.d-64.org",
-                     color="#6e6e6e",
-                     xy=(0, -4.5), xycoords='axes fraction',
-                     horizontalalignment='left',
-                     verticalalignment='bottom')
-
-        # 4th subplot for Logo
-        ax4 = fig.add_subplot(gs[14:, 2])
-        plt.axis('off')
-
-        # Annotate the 2nd position with D64 logo
-        with get_sample_data(os.path.abspath('resources/d64-logo.png')) as logo:
-            arr_img = plt.imread(logo, format='png')
-
-        imagebox = OffsetImage(arr_img, zoom=0.3)
-        imagebox.image.axes = ax4
-
-        ab = AnnotationBbox(imagebox, xy=(0, 0), frameon=False, xybox=(1, -2.5), xycoords='axes fraction',
-                            box_alignment=(1, 1))
-
-        ax4.add_artist(ab)
-
-        ax1 = fig.add_subplot(gs[:14, :])
-
-        # Set title and labels
-        fig.suptitle(title, fontweight="bold")
-        plt.ylabel(y_label)
-
-        # Styling
-        for direction in ["left", "right", "bottom", "top"]:
-            ax1.spines[direction].set_visible(False)
-        plt.grid(axis="y", zorder=0)
-        fig.patch.set_facecolor("#eeeeee")
-        ax1.patch.set_facecolor("#eeeeee")
-        fig.subplots_adjust(bottom=0.2)
-
-        return fig, ax1
+        """
+        Returns a figure with footer and styling, which is reused for the next graph of the same variant. Save the
+        figure before calling setup_plot again.
+        """
+        template = FigureTemplate.get(quadratic, current_date is not None)
+        return template.prepare(current_date, title, y_label, source)
 
     @staticmethod
-    def teardown_plt(figure: Figure):
-        figure.clf()
-        plt.close(figure)
+    def set_date_ticks(ax1: Axes, x_data: List[datetime.date]) -> None:
+        ax1.set_xticks(x_data)
+        for label in ax1.get_xticklabels():
+            label.set_rotation(30)
+            label.set_horizontalalignment('right')
 
     def infections_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
+        return self.infections_graph_future(district_id, duration, quadratic).result()
+
+    def infections_graph_future(self, district_id: int, duration: int = 49, quadratic=False) -> Future:
         district_name, current_date, x_data, y_data = self._get_covid_data("new_cases", district_id, duration)
 
         filepath = os.path.abspath(
             os.path.join(self.graphics_dir, f"infections-{current_date.isoformat()}-{district_id}.jpg"))
+        return self._render('infections', filepath, Visualization._draw_bar_graph, f"Neuinfektionen {district_name}",
+                            "Neuinfektionen", current_date, x_data, y_data, quadratic, False)
 
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='infections').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='infections').inc()
-
-        fig, ax1 = self.setup_plot(current_date, f"Neuinfektionen {district_name}", "Neuinfektionen",
-                                   quadratic=quadratic)
+    @staticmethod
+    def _draw_bar_graph(filepath: str, title: str, y_label: str, current_date: datetime.date,
+                        x_data: List[datetime.date], y_data: List[int], quadratic: bool, label_latest: bool) -> None:
+        fig, ax1 = Visualization.setup_plot(current_date, title, y_label, quadratic=quadratic)
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        Visualization.set_date_ticks(ax1, x_data)
 
         # Add a label every 7 days
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
+        bars = ax1.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
         props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
-        for i in range(0, len(bars), 7):
+        if label_latest:
+            labeled = range(len(bars) - 1, 0, -7)
+        else:
+            labeled = range(0, len(bars), 7)
+        for i in labeled:
             rect = bars[i]
             height = rect.get_height()
             ax1.annotate(format_int(int(height)),
@@ -134,14 +118,15 @@ class Visualization:
                          arrowprops=dict(arrowstyle="-", facecolor='black'),
                          horizontalalignment='center', verticalalignment='top', bbox=props)
 
-        self.set_weekday_formatter(ax1, current_date.weekday())
+        Visualization.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        fig.savefig(filepath, format='JPEG')
 
     def vaccination_speed_graph(self, district_id: int, duration: int = 49, quadratic=False) -> str:
+        return self.vaccination_speed_graph_future(district_id, duration, quadratic).result()
+
+    def vaccination_speed_graph_future(self, district_id: int, duration: int = 49, quadratic=False) -> Future:
         with self.connection.cursor(dictionary=True) as cursor:
             oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
             cursor.execute('SELECT c.county_name as name, date, doses_diff FROM covid_vaccinations '
@@ -160,86 +145,65 @@ class Visualization:
 
         filepath = os.path.abspath(
             os.path.join(self.graphics_dir, f"vaccination-speed-{current_date.isoformat()}-{district_id}.jpg"))
-
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='vaccination-speed').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='vaccination-speed').inc()
-
-        fig, ax1 = self.setup_plot(current_date, f"Impfungen {district_name}", "Verimpfte Dosen",
-                                   quadratic=quadratic)
-        # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
-
-        # Add a label every 7 days
-        bars = plt.bar(x_data, y_data, color="#1fa2de", width=0.8, zorder=3)
-        props = dict(boxstyle='round', facecolor='#ffffff', alpha=0.7, edgecolor='#ffffff')
-        for i in range(len(bars) - 1, 0, -7):
-            rect = bars[i]
-            height = rect.get_height()
-            ax1.annotate(format_int(int(height)),
-                         xy=(rect.get_x() + rect.get_width() / 2., height),
-                         xytext=(0, 30), textcoords='offset points',
-                         arrowprops=dict(arrowstyle="-", facecolor='black'),
-                         horizontalalignment='center', verticalalignment='top', bbox=props)
-
-        self.set_weekday_formatter(ax1, current_date.weekday())
-
-        # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        return self._render('vaccination-speed', filepath, Visualization._draw_bar_graph,
+                            f"Impfungen {district_name}", "Verimpfte Dosen", current_date, x_data, y_data, quadratic,
+                            True)
 
     def bot_user_graph(self) -> str:
+        return self.bot_user_graph_future().result()
+
+    def bot_user_graph_future(self) -> Future:
         now = datetime.datetime.now()
         quarter = math.floor(now.hour / 4)
         filepath = os.path.abspath(
             os.path.join(self.graphics_dir, f"botuser-{now.strftime(f'%Y-%m-%d-{quarter}')}.jpg"))
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='botuser').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='botuser').inc()
+        future = self._get_cached('botuser', filepath)
+        if future:
+            # Cached, so the data is not needed
+            return future
 
         with self.connection.cursor(dictionary=True) as cursor:
-            cursor.execute("SELECT COUNT(b.user_id) as count, bot_date FROM "
-                           "(SELECT DISTINCT date(created) as bot_date FROM bot_user) as dates "
-                           "LEFT JOIN bot_user b ON date(b.created) <= bot_date GROUP BY bot_date ORDER BY bot_date")
+            # New users per day, the cumulative sum is calculated below in a single pass
+            cursor.execute("SELECT date(created) as bot_date, COUNT(user_id) as count FROM bot_user "
+                           "WHERE created IS NOT NULL GROUP BY bot_date ORDER BY bot_date")
+            rows = cursor.fetchall()
 
-            y_data = []
-            x_data = []
-            today = datetime.date.today()
-            current = None
-            for row in cursor.fetchall():
-                if not current:
-                    # noinspection PyUnusedLocal
-                    current = row['bot_date']
-                else:
-                    while row['bot_date'] != current + datetime.timedelta(days=1):
-                        current += datetime.timedelta(days=1)
-                        y_data.append(y_data[-1])
-                        x_data.append(current)
-                current = row['bot_date']
-                y_data.append(row['count'])
-                x_data.append(row['bot_date'])
-
-            while x_data[-1] != today:
-                y_data.append(y_data[-1])
-                x_data.append(x_data[-1] + datetime.timedelta(days=1))
-
-            fig, ax1 = self.setup_plot(None, f"Nutzer:innen des Covidbots (über Messenger)", "Anzahl")
-            # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
-            ax1.fill_between(x_data, y_data, color="#1fa2de", zorder=3)
-
-            self.set_weekday_formatter(ax1, now.weekday())
-
-            # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+        y_data = []
+        x_data = []
+        today = datetime.date.today()
+        total = 0
+        for row in rows:
+            if x_data:
+                # Fill days without new users
+                while row['bot_date'] != x_data[-1] + datetime.timedelta(days=1):
+                    x_data.append(x_data[-1] + datetime.timedelta(days=1))
+                    y_data.append(total)
+            total += row['count']
+            y_data.append(total)
+            x_data.append(row['bot_date'])
+
+        while x_data and x_data[-1] < today:
+            y_data.append(total)
+            x_data.append(x_data[-1] + datetime.timedelta(days=1))
+
+        return self._render('botuser', filepath, Visualization._draw_bot_user_graph, x_data, y_data, now.weekday())
+
+    @staticmethod
+    def _draw_bot_user_graph(filepath: str, x_data: List[datetime.date], y_data: List[int], weekday: int) -> None:
+        fig, ax1 = Visualization.setup_plot(None, f"Nutzer:innen des Covidbots (über Messenger)", "Anzahl")
+        # Plot data
+        Visualization.set_date_ticks(ax1, x_data)
+        ax1.fill_between(x_data, y_data, color="#1fa2de", zorder=3)
+
+        Visualization.set_weekday_formatter(ax1, weekday)
+
+        # Save to file
+        fig.savefig(filepath, format='JPEG')
 
     def vaccination_graph(self, district_id: int) -> str:
+        return self.vaccination_graph_future(district_id).result()
+
+    def vaccination_graph_future(self, district_id: int) -> Future:
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute(
                 "SELECT vaccinated_partial, vaccinated_full, date FROM covid_vaccinations WHERE district_id=%s ORDER BY date",
@@ -269,48 +233,68 @@ class Visualization:
             filepath = os.path.abspath(
                 os.path.join(self.graphics_dir, f"vaccinations-{x_data[-1].isoformat()}-{district_id}.jpg"))
 
-            # Do not draw new graphic if its cached
-            if not self.disable_cache and os.path.isfile(filepath):
-                CACHED_GRAPHS.labels(type='vaccinations').inc()
-                return filepath
-            CREATED_GRAPHS.labels(type='vaccinations').inc()
-
             cursor.execute("SELECT county_name FROM counties WHERE rs=%s", [district_id])
             district_name = cursor.fetchone()['county_name']
 
-            if district_id == 0:
-                source = "impfdashboard.de"
-            else:
-                source = "Robert-Koch-Institut"
-            fig, ax1 = self.setup_plot(x_data[-1], f"Impfungen {district_name}", "Anzahl Impfungen", source=source)
-            # Plot data
-            plt.xticks(x_data, rotation='30', ha='right')
-            ax1.fill_between(x_data, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
-
-            i = 0
-            while y_data_full[i] == 0:
-                i += 1
-
-            ax1.fill_between(x_data[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Impfungen")
-            ax1.legend(loc="upper left")
-
-            # One tick every 7 days for easier comparison
-            formatter = mdates.DateFormatter("%a, %d.%m.")
-            ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=x_data[-1].weekday()))
-            ax1.xaxis.set_major_formatter(formatter)
-            ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
-
-            # Save to file
-            plt.savefig(filepath, format='JPEG')
-            self.teardown_plt(fig)
-            return filepath
+        if district_id == 0:
+            source = "impfdashboard.de"
+        else:
+            source = "Robert-Koch-Institut"
+        return self._render('vaccinations', filepath, Visualization._draw_vaccination_graph, district_name, source,
+                            x_data, y_data_partial, y_data_full)
+
+    @staticmethod
+    def _draw_vaccination_graph(filepath: str, district_name: str, source: str, x_data: List[datetime.date],
+                                y_data_partial: List[int], y_data_full: List[int]) -> None:
+        fig, ax1 = Visualization.setup_plot(x_data[-1], f"Impfungen {district_name}", "Anzahl Impfungen",
+                                            source=source)
+        # Plot data
+        Visualization.set_date_ticks(ax1, x_data)
+        ax1.fill_between(x_data, y_data_partial, color="#1fa2de", zorder=3, label="Erstimpfungen")
+
+        i = 0
+        while y_data_full[i] == 0:
+            i += 1
+
+        ax1.fill_between(x_data[i:], y_data_full[i:], color="#384955", zorder=3, label="Vollständige Impfungen")
+        ax1.legend(loc="upper left")
+
+        # One tick every 7 days for easier comparison
+        formatter = mdates.DateFormatter("%a, %d.%m.")
+        ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=x_data[-1].weekday()))
+        ax1.xaxis.set_major_formatter(formatter)
+        ax1.yaxis.set_major_formatter(Visualization.tick_formatter_german_numbers)
+
+        # Save to file
+        fig.savefig(filepath, format='JPEG')
 
     def multi_incidence_graph(self, district_ids: List[int], duration: int = 49) -> Optional[str]:
+        future = self.multi_incidence_graph_future(district_ids, duration)
+        if future:
+            return future.result()
+
+    def multi_incidence_graph_future(self, district_ids: List[int], duration: int = 49) -> Optional[Future]:
         if not district_ids:
             return None
 
-        data = []
-        district_ids.sort()
+        district_ids = sorted(set(district_ids))
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute(f"SELECT MAX(date) as date FROM covid_data_calculated "
+                           f"WHERE rs IN ({', '.join(['%s'] * len(district_ids))})", district_ids)
+            current_date = cursor.fetchone()['date']
+
+        if not current_date:
+            return None
+
+        identifier = "_".join(map(str, district_ids))
+        filepath = os.path.abspath(
+            os.path.join(self.graphics_dir, f"multi-incidence-{current_date.isoformat()}-{identifier}.jpg"))
+        future = self._get_cached('incidence', filepath)
+        if future:
+            return future
+
+        district_names, current_date, x_data, y_data = self._get_covid_data_many("incidence", district_ids,
+                                                                                  duration)
 
         # Source: https://matplotlib.org/stable/gallery/lines_bars_and_markers/linestyles.html
         line_styles = [
@@ -318,80 +302,69 @@ class Visualization:
 
         line_colors = ['#393991', '#916047', '#6D6DDF', '#45291B', '#539140']
 
-        i = 0
-        for district in district_ids:
-            district_name, current_date, x_data, y_data = self._get_covid_data("incidence", district, duration)
-            data.append({'name': district_name, 'x': x_data, 'y': y_data, 'date': current_date,
+        data = []
+        for i, district_id in enumerate(district_ids):
+            data.append({'name': district_names.get(district_id), 'x': x_data, 'y': y_data[i],
                          'linestyle': line_styles[i % len(line_styles)],
                          'linecolor': line_colors[i % len(line_colors)]})
-            i += 1
-
-        current_date = data[0].get('date')
-        identifier = reduce(lambda x, y: x + y, map(str, district_ids))
 
-        filepath = os.path.abspath(
-            os.path.join(self.graphics_dir, f"multi-incidence-{current_date.isoformat()}-{identifier}.jpg"))
-
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='incidence').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='incidence').inc()
+        return self.renderer.submit('incidence', filepath, Visualization._draw_multi_incidence_graph, current_date, data)
 
-        fig, ax1 = self.setup_plot(current_date, f"7-Tage-Inzidenzen", "7-Tage-Inzidenz")
+    @staticmethod
+    def _draw_multi_incidence_graph(filepath: str, current_date: datetime.date, data: List[dict]) -> None:
+        fig, ax1 = Visualization.setup_plot(current_date, f"7-Tage-Inzidenzen", "7-Tage-Inzidenz")
 
         x_data = data[0].get('x')
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        Visualization.set_date_ticks(ax1, x_data)
 
         # Sort for legend, highest at first
         data.sort(key=lambda element: element.get('y')[-1], reverse=True)
         for d in data:
-            plt.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
+            ax1.plot(d.get('x'), d.get('y'), linestyle=d.get('linestyle'), color=d.get('linecolor'), zorder=3,
                      linewidth=1, label=d.get('name'))
 
         # Add legend
-        plt.legend()
+        ax1.legend()
 
         ax1.set_ylim(bottom=0)
 
         # Add a label every 7 days
-        self.set_weekday_formatter(ax1, current_date.weekday())
+        Visualization.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        # plt.show()
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        fig.savefig(filepath, format='JPEG')
 
     def incidence_graph(self, district_id: int, duration: int = 49) -> str:
+        return self.incidence_graph_future(district_id, duration).result()
+
+    def incidence_graph_future(self, district_id: int, duration: int = 49) -> Future:
         district_name, current_date, x_data, y_data = self._get_covid_data("incidence", district_id, duration)
         filepath = os.path.abspath(
             os.path.join(self.graphics_dir, f"incidence-{current_date.isoformat()}-{district_id}.jpg"))
+        return self._render('incidence', filepath, Visualization._draw_incidence_graph, district_name, current_date,
+                            x_data, y_data)
 
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='incidence').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='incidence').inc()
-
-        fig, ax1 = self.setup_plot(current_date, f"7-Tage-Inzidenz {district_name}", "7-Tage-Inzidenz")
+    @staticmethod
+    def _draw_incidence_graph(filepath: str, district_name: str, current_date: datetime.date,
+                              x_data: List[datetime.date], y_data: List[float]) -> None:
+        fig, ax1 = Visualization.setup_plot(current_date, f"7-Tage-Inzidenz {district_name}", "7-Tage-Inzidenz")
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
+        Visualization.set_date_ticks(ax1, x_data)
 
         # Add a label every 7 days
-        plt.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
+        ax1.plot(x_data, y_data, color="#1fa2de", zorder=3, linewidth=3)
         ax1.set_ylim(bottom=0)
-        self.set_weekday_formatter(ax1, current_date.weekday())
+        Visualization.set_weekday_formatter(ax1, current_date.weekday())
 
         # Save to file
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        fig.savefig(filepath, format='JPEG')
 
     def icu_graph(self, district_id: int) -> Optional[str]:
+        return self.icu_graph_future(district_id).result()
+
+    def icu_graph_future(self, district_id: int) -> Future:
         current_date = None
-        colors = ['#911425', '#DE354B', '#1fa2de', '']
         y_data = {'covid-ventilated': [],
                   'covid-not-ventilated': [],
                   'no-covid': [],
@@ -420,34 +393,31 @@ class Visualization:
 
         filepath = os.path.abspath(
             os.path.join(self.graphics_dir, f"icu-{current_date.isoformat()}-{district_id}.jpg"))
+        return self._render('icu', filepath, Visualization._draw_icu_graph, district_name, current_date, x_data,
+                            list(y_data.values()))
 
-        # Do not draw new graphic if its cached
-        if not self.disable_cache and os.path.isfile(filepath):
-            CACHED_GRAPHS.labels(type='icu').inc()
-            return filepath
-        CREATED_GRAPHS.labels(type='icu').inc()
-
-        fig, ax1 = self.setup_plot(current_date, f"Auslastung der Intensivstationen ({district_name})", "Auslastung",
-                                   source="DIVI-Intensivregister")
+    @staticmethod
+    def _draw_icu_graph(filepath: str, district_name: str, current_date: datetime.date, x_data: List[datetime.date],
+                        y_data: List[List[float]]) -> None:
+        colors = ['#911425', '#DE354B', '#1fa2de', '']
+        fig, ax1 = Visualization.setup_plot(current_date, f"Auslastung der Intensivstationen ({district_name})",
+                                            "Auslastung", source="DIVI-Intensivregister")
 
         # Plot data
-        plt.xticks(x_data, rotation='30', ha='right')
-        ax1.stackplot(x_data, y_data.values(), colors=colors,
+        Visualization.set_date_ticks(ax1, x_data)
+        ax1.stackplot(x_data, y_data, colors=colors,
                       labels=['Covid (beatmet)', 'Covid (ohne Beatmung)', 'Andere'], zorder=0)
         # Add legend
-        plt.legend(loc='upper left')
+        ax1.legend(loc='upper left')
 
         ax1.set_ylim(bottom=0, top=100)
 
         # Add a label every 7 days
-        self.set_monthly_formatter(ax1)
+        Visualization.set_monthly_formatter(ax1)
         ax1.yaxis.set_major_formatter(matplotlib.ticker.PercentFormatter())
 
         # Save to file
-        # plt.show()
-        plt.savefig(filepath, format='JPEG')
-        self.teardown_plt(fig)
-        return filepath
+        fig.savefig(filepath, format='JPEG')
 
     def _get_covid_data(self, field: str, district_id: int, duration: int) -> Tuple[
         str, datetime.date, List[datetime.date], List[int]]:
@@ -457,7 +427,8 @@ class Visualization:
         with self.connection.cursor(dictionary=True) as cursor:
             oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
             cursor.execute(
-                f"SELECT {field}, county_name, date FROM covid_data_calculated WHERE rs=%s AND date >= %s ORDER BY date",
+                f"SELECT d.{field}, c.county_name, d.date FROM covid_data_calculated d "
+                f"LEFT JOIN counties c ON c.rs = d.rs WHERE d.rs=%s AND d.date >= %s ORDER BY d.date",
                 [district_id, oldest_date])
 
             y_data = []
@@ -486,19 +457,58 @@ class Visualization:
                     y_data.append(0)
         return district_name, current_date, x_data, y_data
 
-    def set_weekday_formatter(self, ax1, weekday):
+    def _get_covid_data_many(self, field: str, district_ids: List[int], duration: int) -> Tuple[
+        Dict[int, str], Optional[datetime.date], List[datetime.date], np.ndarray]:
+        """
+        Fetches the time series of several districts with a single query
+        :param field: Column of covid_data_calculated
+        :param district_ids: IDs of the districts
+        :param duration: Number of days
+        :return: Names of the districts, latest date, shared date axis and an array with one row per district in
+        order of district_ids. Days without data are 0.
+        """
+        oldest_date = datetime.date.today() - datetime.timedelta(days=duration)
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute(
+                f"SELECT d.rs, d.{field}, c.county_name, d.date FROM covid_data_calculated d "
+                f"LEFT JOIN counties c ON c.rs = d.rs "
+                f"WHERE d.rs IN ({', '.join(['%s'] * len(district_ids))}) AND d.date >= %s ORDER BY d.date",
+                district_ids + [oldest_date])
+            rows = cursor.fetchall()
+
+        district_names = {}
+        if not rows:
+            return district_names, None, [], np.zeros((len(district_ids), 0))
+
+        first_date = rows[0]['date']
+        current_date = rows[-1]['date']
+        x_data = [first_date + datetime.timedelta(days=i) for i in range((current_date - first_date).days + 1)]
+        y_data = np.zeros((len(district_ids), len(x_data)))
+        district_index = {district_id: i for i, district_id in enumerate(district_ids)}
+        for row in rows:
+            district_names[row['rs']] = row['county_name']
+            if row[field]:
+                y_data[district_index[row['rs']], (row['date'] - first_date).days] = row[field]
+
+        if len(rows) < len(district_ids) * len(x_data):
+            self.log.warning(f"We do not have data for every requested day of {district_ids}")
+        return district_names, current_date, x_data, y_data
+
+    @staticmethod
+    def set_weekday_formatter(ax1, weekday):
         # One tick every 7 days for easier comparison
         formatter = mdates.DateFormatter("%a, %d.%m.")
         ax1.xaxis.set_major_locator(mdates.WeekdayLocator(byweekday=weekday))
         ax1.xaxis.set_major_formatter(formatter)
-        ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+        ax1.yaxis.set_major_formatter(Visualization.tick_formatter_german_numbers)
 
-    def set_monthly_formatter(self, ax1):
+    @staticmethod
+    def set_monthly_formatter(ax1):
         # One tick every 7 days for easier comparison
         formatter = mdates.DateFormatter("%m/%y")
         ax1.xaxis.set_major_locator(mdates.MonthLocator())
         ax1.xaxis.set_major_formatter(formatter)
-        ax1.yaxis.set_major_formatter(self.tick_formatter_german_numbers)
+        ax1.yaxis.set_major_formatter(Visualization.tick_formatter_german_numbers)
 
     # noinspection PyUnusedLocal
     @staticmethod
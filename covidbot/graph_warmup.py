@@ -0,0 +1,89 @@
+import logging
+from concurrent.futures import Future, wait
+from typing import Callable, Dict, List, Set, Tuple
+
+from mysql.connector import MySQLConnection
+
+from covidbot.bot import Bot
+from covidbot.covid_data import CovidData, Visualization
+from covidbot.metrics import GRAPH_WARMUP_TIME
+
+
+class GraphWarmup:
+    """
+    Renders the graphs needed for reports and district requests right after new data arrived, so the first report
+    run does not have to wait for them. Graphs are rendered in parallel by the process pool of
+    :py:class:`Visualization`.
+    """
+    connection: MySQLConnection
+    data: CovidData
+    viz: Visualization
+    log = logging.getLogger(__name__)
+
+    def __init__(self, connection: MySQLConnection, data: CovidData, visualization: Visualization):
+        self.connection = connection
+        self.data = data
+        self.viz = visualization
+
+    def get_subscriptions(self) -> Dict[int, List[int]]:
+        """
+        Returns the subscriptions of all activated users on all platforms, in the same order as
+        :py:meth:`UserManager.get_all_user`
+        :return: Dict of user_id to the list of subscribed district ids
+        """
+        subscriptions = {}
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute('SELECT s.user_id, s.rs FROM subscriptions s '
+                           'JOIN bot_user b ON b.user_id = s.user_id WHERE b.activated=1 '
+                           'ORDER BY s.user_id, s.added, s.rs')
+            for row in cursor.fetchall():
+                subscriptions.setdefault(row['user_id'], []).append(row['rs'])
+        return subscriptions
+
+    @GRAPH_WARMUP_TIME.time()
+    def run(self) -> int:
+        """
+        Renders all graphs that are not cached yet
+        :return: Number of graphs that were rendered or found in the cache
+        """
+        subscriptions = self.get_subscriptions()
+        district_ids: Set[int] = {0}
+        combinations: Set[Tuple[int, ...]] = set()
+        for user_subscriptions in subscriptions.values():
+            district_ids.update(user_subscriptions)
+            combinations.add(tuple(sorted(Bot.get_multi_incidence_districts(user_subscriptions))))
+
+        jobs: List[Tuple[str, Callable[[], Future]]] = [
+            ("vaccinations-0", lambda: self.viz.vaccination_graph_future(0)),
+            ("vaccination-speed-0", lambda: self.viz.vaccination_speed_graph_future(0))
+        ]
+        district_data = self.data.get_district_data_many(list(district_ids))
+        for district_id, data in district_data.items():
+            jobs.append((f"infections-{district_id}", lambda d=district_id: self.viz.infections_graph_future(d)))
+            jobs.append((f"incidence-{district_id}", lambda d=district_id: self.viz.incidence_graph_future(d)))
+            if data.icu_data:
+                jobs.append((f"icu-{district_id}", lambda d=district_id: self.viz.icu_graph_future(d)))
+
+        for combination in combinations:
+            jobs.append((f"multi-incidence-{combination}",
+                         lambda c=combination: self.viz.multi_incidence_graph_future(list(c))))
+
+        # Submit all jobs first, so they are rendered in parallel
+        futures: Dict[Future, str] = {}
+        for name, job in jobs:
+            try:
+                future = job()
+                if future is not None:
+                    futures[future] = name
+            except Exception as e:
+                self.log.warning(f"Could not prepare graph {name}: {e}")
+
+        done, _ = wait(futures.keys())
+        rendered = 0
+        for future in done:
+            if future.exception():
+                self.log.warning(f"Could not render graph {futures[future]}: {future.exception()}")
+            else:
+                rendered += 1
+        self.log.info(f"Warmed up {rendered} of {len(futures)} graphs for {len(subscriptions)} users")
+        return rendered
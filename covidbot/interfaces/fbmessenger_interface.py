@@ -3,7 +3,7 @@ import logging
 import os
 import signal
 import traceback
-from typing import List, Union
+from typing import List, Union, Optional
 
 import prometheus_async
 from fbmessenger import Messenger
@@ -69,10 +69,11 @@ class FBMessengerInterface(MessengerInterface):
             # Just exit on exception
             os.kill(os.getpid(), signal.SIGINT)
 
-    async def send_bot_response(self, user: str, response: BotResponse):
+    async def send_bot_response(self, user: str, response: BotResponse, disable_unicode: Optional[bool] = None):
         if response.message:
             images = response.images
-            disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
+            if disable_unicode is None:
+                disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
             messages = split_message(adapt_text(str(response), just_strip=disable_unicode), max_chars=2000)
             for i in range(0, len(messages)):
                 buttons = None
@@ -91,8 +92,9 @@ class FBMessengerInterface(MessengerInterface):
 
         for report, userid, message in unconfirmed_reports:
             try:
+                disable_unicode = not self.bot.get_report_user_setting(userid, BotUserSettings.FORMATTING)
                 for elem in message:
-                    await self.send_bot_response(userid, elem)
+                    await self.send_bot_response(userid, elem, disable_unicode)
                 self.bot.confirm_message_send(report, userid)
                 self.log.warning(f"Sent report to {userid}")
             except MessengerError as e:
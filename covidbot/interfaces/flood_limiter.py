@@ -0,0 +1,110 @@
+import threading
+import time
+from typing import Dict, Union
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket. Tokens are reserved in advance, so concurrent callers are served in order and each
+    one only has to sleep for its own slot.
+    """
+    rate: float
+    capacity: float
+    tokens: float
+    updated: float
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: Tokens added per second
+        :param capacity: Maximum number of tokens, i.e. the allowed burst
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Takes tokens from the bucket
+        :param tokens: Number of tokens
+        :return: Seconds the caller has to wait until the tokens are available
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= tokens
+            if self.tokens >= 0:
+                return 0
+            return -self.tokens / self.rate
+
+    def acquire(self, tokens: float = 1) -> None:
+        """
+        Blocks until the tokens are available
+        :param tokens: Number of tokens
+        """
+        wait = self.reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+    def is_idle(self) -> bool:
+        """
+        :return: True if the bucket would be full again, so it can be replaced by a new one
+        """
+        return self.tokens + (time.monotonic() - self.updated) * self.rate >= self.capacity
+
+
+class TelegramFloodLimiter:
+    """
+    Limits the messages sent to Telegram to the global limit of 30 messages per second, one message per second and
+    chat with short bursts, and 20 messages per minute for groups,
+    see https://core.telegram.org/bots/faq#my-bot-is-hitting-limits-how-do-i-avoid-this
+    """
+    GLOBAL_RATE = 30
+    GLOBAL_BURST = 5
+    CHAT_RATE = 1
+    CHAT_BURST = 3
+    GROUP_RATE = 20 / 60
+    GROUP_BURST = 3
+    # Buckets of idle chats are dropped when there are more than this number of buckets
+    MAX_IDLE_CHATS = 1000
+
+    global_bucket: TokenBucket
+    chat_buckets: Dict[int, TokenBucket]
+
+    def __init__(self, global_rate: float = GLOBAL_RATE):
+        self.global_bucket = TokenBucket(global_rate, self.GLOBAL_BURST)
+        self.chat_buckets = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, chat_id: Union[int, str], messages: int = 1) -> None:
+        """
+        Blocks until messages may be sent to chat_id
+        :param chat_id: Telegram Chat ID, group chats have negative IDs
+        :param messages: Number of messages that will be sent
+        """
+        self.get_chat_bucket(int(chat_id)).acquire(messages)
+        self.global_bucket.acquire(messages)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Stops all sending for some time, e.g. if Telegram responded with RetryAfter
+        """
+        self.global_bucket.reserve(seconds * self.global_bucket.rate)
+
+    def get_chat_bucket(self, chat_id: int) -> TokenBucket:
+        with self.lock:
+            bucket = self.chat_buckets.get(chat_id)
+            if bucket:
+                return bucket
+
+            if len(self.chat_buckets) > self.MAX_IDLE_CHATS:
+                self.chat_buckets = {k: v for k, v in self.chat_buckets.items() if not v.is_idle()}
+
+            if chat_id < 0:
+                bucket = TokenBucket(self.GROUP_RATE, self.GROUP_BURST)
+            else:
+                bucket = TokenBucket(self.CHAT_RATE, self.CHAT_BURST)
+            self.chat_buckets[chat_id] = bucket
+            return bucket
@@ -34,6 +34,7 @@ class MastodonInterface(SingleCommandInterface):
         self.user_manager.set_social_network_user_number(number)
 
     def upload_media(self, filename: str) -> str:
+        # Media IDs can't be reused here: Mastodon only attaches media that does not belong to a status yet
         upload_resp = self.mastodon.media_post(filename, mime_type="image/jpeg")
         if not upload_resp:
             raise ValueError(f"Could not upload media to Mastodon. API response {upload_resp.status_code}: "
@@ -0,0 +1,103 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, Optional, Tuple
+
+from covidbot.metrics import MEDIA_ID_CACHE_HITS, MEDIA_ID_CACHE_MISSES
+
+
+class MediaIdStore:
+    """
+    Persistent mapping of uploaded files to the ID the platform assigned to them, so each file has to be uploaded
+    only once. It is stored in a SQLite file shared between the bot processes. Entries are keyed by path and content
+    hash, so a regenerated graph with the same filename is uploaded again. Platforms that delete uploads after some
+    time can pass a TTL.
+    """
+    filename: str
+    platform: str
+    connection: Optional[sqlite3.Connection]
+    lock: threading.Lock
+    hashes: Dict[str, Tuple[int, int, str]]
+
+    def __init__(self, filename: str, platform: str):
+        """
+        :param filename: Path to the SQLite file
+        :param platform: Name of the platform the IDs belong to
+        """
+        self.filename = filename
+        self.platform = platform
+        self.connection = None
+        self.lock = threading.Lock()
+        self.hashes = {}
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if not self.connection:
+            self.connection = sqlite3.connect(self.filename, check_same_thread=False, timeout=10)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS media_ids (platform TEXT, path TEXT, hash TEXT, '
+                                    'media_id TEXT, created REAL, expires REAL, PRIMARY KEY(platform, path, hash))')
+            self.connection.commit()
+        return self.connection
+
+    def file_hash(self, path: str) -> str:
+        """
+        Returns the SHA-1 of a file, which is only recomputed if the file was modified
+        :param path: Path to the file
+        :return: Hex digest of the content
+        """
+        stat = os.stat(path)
+        with self.lock:
+            cached = self.hashes.get(path)
+        if cached and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+            return cached[2]
+
+        # Hash outside of the lock, so other threads are not blocked by reading the file
+        digest = hashlib.sha1()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                digest.update(chunk)
+        file_hash = digest.hexdigest()
+        with self.lock:
+            self.hashes[path] = (stat.st_mtime_ns, stat.st_size, file_hash)
+        return file_hash
+
+    def get(self, path: str) -> Optional[str]:
+        """
+        Returns the media ID of an already uploaded file
+        :param path: Path to the file
+        :return: Media ID, None if the file in its current version was not uploaded yet
+        """
+        path = os.path.abspath(path)
+        file_hash = self.file_hash(path)
+        with self.lock:
+            row = self._get_connection().execute('SELECT media_id FROM media_ids WHERE platform=? AND path=? '
+                                                 'AND hash=? AND (expires IS NULL OR expires > ?)',
+                                                 [self.platform, path, file_hash, time.time()]).fetchone()
+        if row:
+            MEDIA_ID_CACHE_HITS.labels(platform=self.platform).inc()
+            return row[0]
+
+        MEDIA_ID_CACHE_MISSES.labels(platform=self.platform).inc()
+        return None
+
+    def put(self, path: str, media_id: str, ttl: Optional[timedelta] = None) -> None:
+        """
+        Stores the media ID of an uploaded file, replacing the IDs of older versions of that file
+        :param path: Path to the file
+        :param media_id: ID assigned by the platform
+        :param ttl: Time until the platform deletes the upload, None if it is kept
+        """
+        path = os.path.abspath(path)
+        file_hash = self.file_hash(path)
+        now = time.time()
+        expires = None
+        if ttl is not None:
+            expires = now + ttl.total_seconds()
+        with self.lock:
+            connection = self._get_connection()
+            connection.execute('DELETE FROM media_ids WHERE platform=? AND path=?', [self.platform, path])
+            connection.execute('INSERT INTO media_ids (platform, path, hash, media_id, created, expires) '
+                               'VALUES (?, ?, ?, ?, ?, ?)', [self.platform, path, file_hash, media_id, now, expires])
+            connection.commit()
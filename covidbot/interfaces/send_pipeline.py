@@ -0,0 +1,175 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+from covidbot.metrics import SEND_PIPELINE_RATE, SEND_PIPELINE_THROUGHPUT
+
+
+class RateLimited(Exception):
+    """
+    Raised by a send if the platform asks us to slow down, e.g. on HTTP 429. Other failures, like a user that blocked
+    the bot, do not say anything about the send rate.
+    """
+    pass
+
+
+class AIMDRateLimiter:
+    """
+    Adaptive rate limiter: the rate is increased additively with each successful message and decreased
+    multiplicatively each time the platform limits us, like TCP congestion control.
+    """
+    rate: float
+    min_rate: float
+    max_rate: float
+    increase: float
+    decrease: float
+    next_slot: float
+    log = logging.getLogger(__name__)
+
+    def __init__(self, rate: float = 1.0, min_rate: float = 0.1, max_rate: float = 20.0, increase: float = 0.05,
+                 decrease: float = 0.5):
+        """
+        :param rate: Initial rate in messages per second
+        :param min_rate: Lower bound of the rate
+        :param max_rate: Upper bound of the rate
+        :param increase: Added to the rate for each successful message
+        :param decrease: Factor the rate is multiplied with on a failure
+        """
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.next_slot = 0.0
+
+    async def wait(self) -> None:
+        """
+        Waits until the next message may be sent according to the current rate
+        """
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_slot)
+        self.next_slot = slot + 1 / self.rate
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+    def on_success(self) -> None:
+        self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_failure(self) -> None:
+        self.rate = max(self.min_rate, self.rate * self.decrease)
+        self.log.warning(f"Rate limited, reduced rate to {self.rate:.2f} messages/s")
+        # Slots handed out with the old rate should not be used anymore
+        self.next_slot = asyncio.get_running_loop().time() + 1 / self.rate
+
+
+class SendPipeline:
+    """
+    Sends messages concurrently with a bounded number of in-flight sends, paced by an :class:`AIMDRateLimiter`. Sends
+    return whether they were successful and raise :class:`RateLimited` if the rate has to be lowered.
+
+    Usage::
+
+        async with SendPipeline("signal", max_in_flight=4) as pipeline:
+            for user in users:
+                await pipeline.submit(lambda user=user: send(user))
+    """
+    platform: str
+    limiter: AIMDRateLimiter
+    sent: int
+    failed: int
+    consecutive_failures: int
+    max_failures: int
+    error: Optional[BaseException]
+    log = logging.getLogger(__name__)
+
+    def __init__(self, platform: str, max_in_flight: int = 4, limiter: Optional[AIMDRateLimiter] = None,
+                 max_failures: int = 0):
+        """
+        :param platform: Name of the platform, used as metrics label
+        :param max_in_flight: Maximum number of concurrent sends
+        :param limiter: Rate limiter, a new one is created if None
+        :param max_failures: The pipeline is stopped after more failed sends in a row, 0 to never stop
+        """
+        self.platform = platform
+        self.limiter = limiter or AIMDRateLimiter()
+        self.max_failures = max_failures
+        self.sent = 0
+        self.failed = 0
+        self.consecutive_failures = 0
+        self.error = None
+        self._in_flight = asyncio.Semaphore(max_in_flight)
+        self._tasks = set()
+        self._started = None
+
+    async def __aenter__(self) -> 'SendPipeline':
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb) -> None:
+        await self.join()
+
+    async def submit(self, send: Callable[[], Awaitable[bool]]) -> None:
+        """
+        Schedules a send, waits while max_in_flight sends are already running
+        :param send: Coroutine function returning whether sending was successful
+        :raises: The exception raised by a previous send, which also stops the pipeline
+        """
+        if self.error:
+            raise self.error
+
+        if self._started is None:
+            self._started = asyncio.get_running_loop().time()
+        await self._in_flight.acquire()
+        await self.limiter.wait()
+        # A send that finished while we were waiting might have stopped the pipeline
+        if self.error:
+            self._in_flight.release()
+            raise self.error
+
+        task = asyncio.ensure_future(self._run(send))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, send: Callable[[], Awaitable[bool]]) -> None:
+        rate_limited = False
+        try:
+            success = await send()
+        except RateLimited as e:
+            self.log.warning(f"Platform {self.platform} asked us to slow down: {e}")
+            rate_limited = True
+            success = False
+        except Exception as e:
+            self.error = e
+            success = False
+        finally:
+            self._in_flight.release()
+
+        # All sends run on the event loop and there is no await until the end of this method, so the counters and
+        # the limiter are never updated concurrently
+        if success:
+            self.sent += 1
+            self.consecutive_failures = 0
+            self.limiter.on_success()
+        else:
+            self.failed += 1
+            self.consecutive_failures += 1
+            if rate_limited:
+                self.limiter.on_failure()
+            if self.max_failures and self.consecutive_failures > self.max_failures and not self.error:
+                self.error = Exception(f"Can't send messages on {self.platform}, "
+                                       f"{self.consecutive_failures} sends failed in a row")
+
+        SEND_PIPELINE_RATE.labels(platform=self.platform).set(self.limiter.rate)
+        elapsed = asyncio.get_running_loop().time() - self._started
+        if elapsed > 0:
+            SEND_PIPELINE_THROUGHPUT.labels(platform=self.platform).set(self.sent / elapsed)
+
+    async def join(self) -> None:
+        """
+        Waits until all scheduled sends are finished
+        :raises: The exception raised by a send
+        """
+        if self._tasks:
+            await asyncio.gather(*self._tasks)
+        self.log.info(f"Sent {self.sent} messages, {self.failed} failed")
+        if self.error:
+            raise self.error
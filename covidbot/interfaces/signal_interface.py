@@ -1,12 +1,9 @@
 import asyncio
 import logging
 import os
-import random
 import re
 import signal
-import time
 import traceback
-from math import ceil
 from typing import Dict, List, Optional
 
 import prometheus_async.aio
@@ -14,6 +11,7 @@ import semaphore
 from semaphore import ChatContext
 
 from covidbot.interfaces.messenger_interface import MessengerInterface
+from covidbot.interfaces.send_pipeline import SendPipeline, AIMDRateLimiter, RateLimited
 from covidbot.metrics import RECV_MESSAGE_COUNT, SENT_IMAGES_COUNT, SENT_MESSAGE_COUNT, BOT_RESPONSE_TIME, \
     FAILED_MESSAGE_COUNT
 from covidbot.bot import Bot
@@ -29,14 +27,25 @@ class SignalInterface(MessengerInterface):
     profile_name: Optional[str] = None  # = "Covid Update"
     profile_picture: Optional[str] = None  # = os.path.abspath("resources/logo.png")
     dev_chat: str = None
+    max_in_flight: int
+    send_limiter: AIMDRateLimiter
+    user_failures: Dict[str, int]
     bot: Bot
     log = logging.getLogger(__name__)
 
-    def __init__(self, bot: Bot, phone_number: str, socket: str, dev_chat: str):
+    # signald does not tell us why sending failed, so a first failure is treated as rate limiting. If sending to a user
+    # fails again after backing off, the user is disabled.
+    MAX_USER_FAILURES = 2
+
+    def __init__(self, bot: Bot, phone_number: str, socket: str, dev_chat: str, max_in_flight: int = 4):
         self.bot = bot
         self.phone_number = phone_number
         self.socket = socket
         self.dev_chat = dev_chat
+        self.max_in_flight = max_in_flight
+        # Shared by all runs, so the rate learned in one run is kept for the next
+        self.send_limiter = AIMDRateLimiter()
+        self.user_failures = {}
 
     def run(self):
         asyncio.run(self.run_async())
@@ -113,34 +122,51 @@ class SignalInterface(MessengerInterface):
 
         async with semaphore.Bot(self.phone_number, socket_path=self.socket, profile_name=self.profile_name,
                                  profile_picture=self.profile_picture) as bot:
-            backoff_time = random.uniform(2, 6)
-            message_counter = 0
-            err_counter = 0
-            for report_type, userid, message in self.bot.get_available_user_messages():
-                self.log.info(f"Try to send report {message_counter}")
-                disable_unicode = not self.bot.get_user_setting(userid, BotUserSettings.FORMATTING)
-                for elem in message:
-                    success = await bot.send_message(userid, adapt_text(elem.message, just_strip=disable_unicode),
-                                                     attachments=elem.images)
-                    if not success:
-                        break
-
-                    backoff_time = self.backoff_timer(backoff_time, not success, userid)
-
-                if success:
-                    err_counter = 0
-                    self.log.warning(f"({message_counter}) Sent daily report to {userid}")
-                    self.bot.confirm_message_send(report_type, userid)
-                else:
-                    err_counter += 1
-                    self.log.error(
-                        f"({message_counter}) Error sending daily report to {userid}")
-                    # Disable user, hacky workaround for https://github.com/eknoes/covidbot/issues/103
-                    self.bot.disable_user(userid)
-                    if err_counter > 3:
-                        raise Exception("Can't send reports on signal")
-
-                message_counter += 1
+            async with SendPipeline("signal", self.max_in_flight, limiter=self.send_limiter,
+                                    max_failures=3) as pipeline:
+                for message_counter, (report_type, userid, message) in enumerate(
+                        self.bot.get_available_user_messages()):
+                    disable_unicode = not self.bot.get_report_user_setting(userid, BotUserSettings.FORMATTING)
+                    await pipeline.submit(lambda report_type=report_type, userid=userid, message=message,
+                                          disable_unicode=disable_unicode, message_counter=message_counter:
+                                          self.send_report(bot, report_type, userid, message, disable_unicode,
+                                                           message_counter))
+
+    async def send_report(self, bot: semaphore.Bot, report_type: str, userid: str, message: List[BotResponse],
+                          disable_unicode: bool, message_counter: int) -> bool:
+        """
+        Sends a daily report to a user and confirms it
+
+        Args:
+            bot: Connected semaphore bot
+            report_type: Type of the report
+            userid: Receiver
+            message: Messages the report consists of
+            disable_unicode: True if the user disabled formatting
+            message_counter: Number of the report in this run, for logging
+
+        Returns:
+            bool: True if the report was sent
+        """
+        self.log.info(f"Try to send report {message_counter}")
+        success = True
+        for elem in message:
+            success = await bot.send_message(userid, adapt_text(elem.message, just_strip=disable_unicode),
+                                             attachments=elem.images)
+            if not success:
+                break
+
+        if success:
+            self.user_failures.pop(userid, None)
+            self.log.warning(f"({message_counter}) Sent daily report to {userid}")
+            self.bot.confirm_message_send(report_type, userid)
+            return True
+
+        self.log.error(f"({message_counter}) Error sending daily report to {userid}")
+        self.raise_send_failure(userid)
+        # Disable user, hacky workaround for https://github.com/eknoes/covidbot/issues/103
+        self.bot.disable_user(userid)
+        return False
 
     async def send_message_to_users(self, message: str, users: List[str]) -> None:
         """
@@ -156,36 +182,40 @@ class SignalInterface(MessengerInterface):
 
         async with semaphore.Bot(self.phone_number, socket_path=self.socket, profile_name=self.profile_name,
                                  profile_picture=self.profile_picture) as bot:
-            backoff_time = random.uniform(0.5, 2)
-            for user in users:
-                disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
-                success = await bot.send_message(user, adapt_text(message, just_strip=disable_unicode))
-                backoff_time = self.backoff_timer(backoff_time, not success, user)
+            async with SendPipeline("signal", self.max_in_flight, limiter=self.send_limiter) as pipeline:
+                for user in users:
+                    disable_unicode = not self.bot.get_user_setting(user, BotUserSettings.FORMATTING)
+                    text = adapt_text(message, just_strip=disable_unicode)
+                    await pipeline.submit(lambda user=user, text=text: self.send_text(bot, user, text))
+
+    async def send_text(self, bot: semaphore.Bot, user_id: str, text: str) -> bool:
+        success = await bot.send_message(user_id, text)
+        if success:
+            self.user_failures.pop(user_id, None)
+            self.log.info(f"Sent message to {user_id}")
+            return True
+
+        self.log.error(f"Error sending message to {user_id}")
+        self.raise_send_failure(user_id)
+        return False
 
-    def backoff_timer(self, current_backoff: float, failed: bool, user_id: str) -> float:
+    def raise_send_failure(self, user_id: str) -> None:
         """
-        Sleeps and calculates the new backoff time, depending whether sending the message failed or not
+        Counts a failed send to a user. signald does not tell us whether we were rate limited, so a failure is
+        reported as rate limiting until sending to the user failed MAX_USER_FAILURES times in a row. Then the failure
+        is caused by the user and the method returns.
+
         Args:
-            current_backoff: current backoff time in seconds
-            failed: True if sending the message led to an error
-            user_id: ID of the receiver
+            user_id: Receiver of the failed message
 
-        Returns:
-            float: new backoff time
+        Raises:
+            RateLimited: If the failure should lower the send rate
         """
-        if not failed:
-            self.log.info(f"Sent message to {user_id}")
-            if current_backoff > 2:
-                new_backoff = 0.7 * current_backoff
-            else:
-                new_backoff = current_backoff
-        else:
-            self.log.error(f"Error sending message to {user_id}")
-            new_backoff = 2*current_backoff
-            self.log.warning(f"New backoff time: {new_backoff}s")
-        self.log.info(f"Sleeping {new_backoff}s to avoid server limitations")
-        time.sleep(new_backoff)
-        return new_backoff
+        failures = self.user_failures.get(user_id, 0) + 1
+        if failures < self.MAX_USER_FAILURES:
+            self.user_failures[user_id] = failures
+            raise RateLimited(f"Sending to {user_id} failed")
+        self.user_failures.pop(user_id, None)
 
     async def send_to_dev(self, message: str, bot: semaphore.Bot):
         await bot.send_message(self.dev_chat, adapt_text(message))
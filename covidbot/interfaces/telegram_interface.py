@@ -1,19 +1,23 @@
+import asyncio
 import html
 import logging
 import os
 import signal
 import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
-from typing import List, Dict, Union
+from typing import List, Union, Callable, TypeVar, Optional, Set
 
 import telegram
 import ujson as json
 from telegram import Update, ParseMode, InlineKeyboardMarkup, InlineKeyboardButton, ChatAction, \
     InputMediaPhoto
-from telegram.error import BadRequest, TelegramError, Unauthorized, ChatMigrated
+from telegram.error import BadRequest, TelegramError, Unauthorized, ChatMigrated, RetryAfter
 from telegram.ext import Updater, CallbackContext, MessageHandler, Filters, CallbackQueryHandler
 
+from covidbot.interfaces.flood_limiter import TelegramFloodLimiter
+from covidbot.interfaces.media_store import MediaIdStore
 from covidbot.interfaces.messenger_interface import MessengerInterface
 from covidbot.metrics import SENT_IMAGES_COUNT, SENT_MESSAGE_COUNT, BOT_RESPONSE_TIME, RECV_MESSAGE_COUNT, \
     BOT_SEND_MESSAGE_ERRORS
@@ -37,6 +41,8 @@ datenschutz - Datenschutzerklärung
 loeschmich - Lösche alle Daten
 '''
 
+T = TypeVar('T')
+
 
 class TelegramCallbacks(Enum):
     SUBSCRIBE = "subscribe"
@@ -51,15 +57,21 @@ class TelegramCallbacks(Enum):
 
 class TelegramInterface(MessengerInterface):
     bot: Bot
-    cache: Dict[str, str] = {}
+    file_ids: MediaIdStore
     log = logging.getLogger(__name__)
     dev_chat_id: int
     deleted_callbacks: List[int] = []
+    flood_limiter: TelegramFloodLimiter
+    send_workers: int
 
-    def __init__(self, bot: Bot, api_key: str, dev_chat_id: int):
+    def __init__(self, bot: Bot, api_key: str, dev_chat_id: int, send_workers: int = 8,
+                 file_id_store: str = 'resources/media-ids.sqlite'):
         self.dev_chat_id = dev_chat_id
         self.bot = bot
         self.updater = Updater(api_key)
+        self.file_ids = MediaIdStore(file_id_store, 'telegram')
+        self.flood_limiter = TelegramFloodLimiter()
+        self.send_workers = send_workers
 
     def run(self):
         # Adapt messages for text-handling
@@ -126,71 +138,122 @@ class TelegramInterface(MessengerInterface):
         Returns:
 
         """
-        success = True
         try:
-            for response in responses:
-                if response.images:
+            return self.send_responses(chat_id, responses, disable_web_page_preview)
+        except (BadRequest, Unauthorized, ChatMigrated) as e:
+            new_chat_id = self.handle_send_error(chat_id, e)
+            if new_chat_id:
+                return self.send_message(new_chat_id, responses, disable_web_page_preview)
+            return False
+
+    def send_responses(self, chat_id: int, responses: List[BotResponse], disable_web_page_preview=False,
+                       chat_action=True) -> bool:
+        """
+        Sends list of :py:class:BotResponse to a certain chat, without accessing the database, so it can be called
+        from worker threads. Errors are raised and have to be passed to :py:meth:handle_send_error.
+        Args:
+            chat_id:
+            responses:
+            disable_web_page_preview:
+            chat_action: Whether to show that photos are uploaded, which costs an additional request
+
+        Returns:
+            bool: True if all messages were sent
+        """
+        success = True
+        for response in responses:
+            if response.images:
+                if chat_action:
+                    self.flood_limiter.acquire(chat_id)
                     self.updater.bot.send_chat_action(chat_id=chat_id, action=ChatAction.UPLOAD_PHOTO)
-                    if len(response.images) == 1 and not response.choices:
-                        photo = response.images[0]
-                        caption = None
-                        if len(response.message) <= 1024:
-                            caption = response.message
-
-                        message_obj = self.updater.bot.send_photo(chat_id, self.get_input_media_photo(photo).media,
-                                                                  caption=caption, parse_mode=ParseMode.HTML)
-                        SENT_IMAGES_COUNT.inc(len(response.images))
-
-                        if message_obj.photo[0]:
-                            self.set_file_id(photo, message_obj.photo[0].file_id)
-
-                        if caption:
-                            if not message_obj:
-                                success = False
-                            continue
-                    else:
-                        files = []
-                        for photo in response.images:
-                            files.append(self.get_input_media_photo(photo))
-
-                        sent_messages = self.updater.bot.send_media_group(chat_id, files)
-                        if sent_messages:
-                            for i in range(0, len(sent_messages)):
-                                if sent_messages[i].photo:
-                                    self.set_file_id(response.images[i], sent_messages[i].photo[0].file_id)
-                        SENT_IMAGES_COUNT.inc(len(response.images))
-
-                messages = split_message(response.message, max_bytes=4096)
-                reply_markup = None
-                for i in range(0, len(messages)):
-                    if response.choices and i == len(messages) - 1:
-                        buttons = []
-                        for choice in response.choices:
-                            buttons.append([InlineKeyboardButton(choice.label, callback_data=choice.callback_data)])
-                        reply_markup = InlineKeyboardMarkup(buttons)
-
-                    if self.updater.bot.send_message(chat_id, messages[i], parse_mode=ParseMode.HTML,
-                                                     disable_web_page_preview=disable_web_page_preview,
-                                                     reply_markup=reply_markup):
-                        SENT_MESSAGE_COUNT.inc()
-                    else:
-                        success = False
-        except BadRequest as e:
-            self.log.warning(f"Bad Request on sending Telegram message to {chat_id}: {e.message}", exc_info=e)
-            success = False
+                if len(response.images) == 1 and not response.choices:
+                    photo = response.images[0]
+                    caption = None
+                    if len(response.message) <= 1024:
+                        caption = response.message
+
+                    self.flood_limiter.acquire(chat_id)
+                    message_obj = self.retry_after_flood(lambda: self.updater.bot.send_photo(
+                        chat_id, self.get_input_media_photo(photo).media, caption=caption,
+                        parse_mode=ParseMode.HTML))
+                    SENT_IMAGES_COUNT.inc(len(response.images))
+
+                    if message_obj.photo[0]:
+                        self.set_file_id(photo, message_obj.photo[0].file_id)
+
+                    if caption:
+                        if not message_obj:
+                            success = False
+                        continue
+                else:
+                    self.flood_limiter.acquire(chat_id, len(response.images))
+                    sent_messages = self.retry_after_flood(lambda: self.updater.bot.send_media_group(
+                        chat_id, [self.get_input_media_photo(photo) for photo in response.images]))
+                    if sent_messages:
+                        for i in range(0, len(sent_messages)):
+                            if sent_messages[i].photo:
+                                self.set_file_id(response.images[i], sent_messages[i].photo[0].file_id)
+                    SENT_IMAGES_COUNT.inc(len(response.images))
+
+            messages = split_message(response.message, max_bytes=4096)
+            reply_markup = None
+            for i in range(0, len(messages)):
+                if response.choices and i == len(messages) - 1:
+                    buttons = []
+                    for choice in response.choices:
+                        buttons.append([InlineKeyboardButton(choice.label, callback_data=choice.callback_data)])
+                    reply_markup = InlineKeyboardMarkup(buttons)
+
+                self.flood_limiter.acquire(chat_id)
+                if self.retry_after_flood(lambda: self.updater.bot.send_message(
+                        chat_id, messages[i], parse_mode=ParseMode.HTML,
+                        disable_web_page_preview=disable_web_page_preview, reply_markup=reply_markup)):
+                    SENT_MESSAGE_COUNT.inc()
+                else:
+                    success = False
+        return success
+
+    def retry_after_flood(self, send: Callable[[], T]) -> T:
+        """
+        Calls send and retries once if Telegram asks us to slow down. All other sends are paused meanwhile.
+        """
+        try:
+            return send()
+        except RetryAfter as e:
+            self.log.warning(f"Hit Telegram flood limit, retrying after {e.retry_after}s")
+            BOT_SEND_MESSAGE_ERRORS.labels(platform='telegram', error='retry-after').inc()
+            self.flood_limiter.pause(e.retry_after)
+            time.sleep(e.retry_after)
+            return send()
+
+    def handle_send_error(self, chat_id: int, error: TelegramError) -> Optional[int]:
+        """
+        Handles an error raised by :py:meth:send_responses, e.g. by deleting users that blocked the bot. Does not send
+        any messages, so it does not block the event loop.
+        Args:
+            chat_id:
+            error:
+
+        Returns:
+            Optional[int]: ID of the migrated chat, the messages have to be sent there again
+        """
+        if isinstance(error, BadRequest):
+            self.log.warning(f"Bad Request on sending Telegram message to {chat_id}: {error.message}", exc_info=error)
             BOT_SEND_MESSAGE_ERRORS.labels(platform='telegram', error='bad-request').inc()
-        except Unauthorized:
+        elif isinstance(error, Unauthorized):
             self.bot.delete_user(chat_id)
             logging.warning(f"Deleted user {chat_id} as he blocked us")
             BOT_SEND_MESSAGE_ERRORS.labels(platform='telegram', error='unauthorized').inc()
-        except ChatMigrated as e:
-            if self.bot.change_platform_id(str(chat_id), str(e.new_chat_id)):
-                self.log.info(f"Migrated Chat {chat_id} to {e.new_chat_id}")
-                return self.send_message(e.new_chat_id, responses, disable_web_page_preview)
+        elif isinstance(error, ChatMigrated):
+            if self.bot.change_platform_id(str(chat_id), str(error.new_chat_id)):
+                self.log.info(f"Migrated Chat {chat_id} to {error.new_chat_id}")
+                return error.new_chat_id
             else:
-                self.log.warning(f"Could not migrate {chat_id} to {e.new_chat_id}")
+                self.log.warning(f"Could not migrate {chat_id} to {error.new_chat_id}")
                 self.bot.disable_user(chat_id)
-        return success
+        else:
+            raise error
+        return None
 
     @BOT_RESPONSE_TIME.time()
     def adapt_edited_message(self, update: Update, context: CallbackContext) -> None:
@@ -274,40 +337,68 @@ class TelegramInterface(MessengerInterface):
         if not self.bot.user_messages_available():
             return
 
-        # Avoid flood limits of 30 messages / second
-        sliding_flood_window = []
-        for report_type, userid, message in self.bot.get_available_user_messages():
-            if len(sliding_flood_window) >= 25:
-                # We want to send 25 messages per second max
-                flood_window_diff = time.perf_counter() - sliding_flood_window.pop(0)
-                if flood_window_diff < 1.05:  # safety margin
-                    self.log.info(f"Sleep for {1.05 - flood_window_diff}s")
-                    time.sleep(1.05 - flood_window_diff)
-
-            sent_msg = self.send_message(userid, message, disable_web_page_preview=True)
-            if sent_msg:
+        async def send_report(report_type: str, userid: str, message: List[BotResponse]):
+            if await self.send_concurrently(executor, userid, message, disable_web_page_preview=True):
                 self.bot.confirm_message_send(report_type, userid)
-                sliding_flood_window.append(time.perf_counter())
-
-            self.log.warning(f"Sent report to {userid}!")
+                self.log.warning(f"Sent report to {userid}!")
+
+        with ThreadPoolExecutor(max_workers=self.send_workers) as executor:
+            tasks = set()
+            for report_type, userid, message in self.bot.get_available_user_messages():
+                if len(tasks) >= self.send_workers:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    self.log_send_errors(done)
+                tasks.add(asyncio.ensure_future(send_report(report_type, userid, message)))
+            if tasks:
+                done, _ = await asyncio.wait(tasks)
+                self.log_send_errors(done)
 
     async def send_message_to_users(self, message: str, users: List[Union[str, int]]):
         if not users:
             users = map(lambda x: x.platform_id, self.bot.get_all_users())
 
         message = UserHintService.format_commands(message, self.bot.command_formatter)
-        sliding_flood_window = []
-        for uid in users:
-            if len(sliding_flood_window) >= 5:
-                # We want to send 25 messages per second max (might be even more due to append_report)
-                flood_window_diff = time.perf_counter() - sliding_flood_window.pop(0)
-                if flood_window_diff < 1.05:  # safety margin
-                    self.log.info(f"Sleep for {1.05 - flood_window_diff}s")
-                    time.sleep(1.05 - flood_window_diff)
-
-            self.updater.bot.send_message(uid, message, parse_mode=telegram.ParseMode.HTML)
-            sliding_flood_window.append(time.perf_counter())
-            self.log.warning(f"Sent message to {str(uid)}")
+
+        async def send(uid: Union[str, int]):
+            if await self.send_concurrently(executor, uid, [BotResponse(message)]):
+                self.log.warning(f"Sent message to {str(uid)}")
+
+        with ThreadPoolExecutor(max_workers=self.send_workers) as executor:
+            tasks = set()
+            for uid in users:
+                if len(tasks) >= self.send_workers:
+                    done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    self.log_send_errors(done)
+                tasks.add(asyncio.ensure_future(send(uid)))
+            if tasks:
+                done, _ = await asyncio.wait(tasks)
+                self.log_send_errors(done)
+
+    async def send_concurrently(self, executor: ThreadPoolExecutor, chat_id: Union[str, int],
+                                responses: List[BotResponse], disable_web_page_preview=False) -> bool:
+        """
+        Sends the responses in a worker thread, paced by the shared flood limiter. Errors are handled in the event
+        loop thread, as the database connection must not be used by the workers.
+        """
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                executor, self.send_responses, int(chat_id), responses, disable_web_page_preview, False)
+        except (BadRequest, Unauthorized, ChatMigrated) as e:
+            new_chat_id = self.handle_send_error(int(chat_id), e)
+            if new_chat_id:
+                return await self.send_concurrently(executor, new_chat_id, responses, disable_web_page_preview)
+            return False
+
+    def log_send_errors(self, tasks: Set[asyncio.Future]) -> None:
+        """
+        Retrieves the results of finished send tasks, so unexpected errors are logged instead of getting lost
+        """
+        for task in tasks:
+            try:
+                task.result()
+            except Exception as e:
+                self.log.exception(f"Unexpected error while sending Telegram message: {e}", exc_info=e)
+                BOT_SEND_MESSAGE_ERRORS.labels(platform='telegram', error='unexpected').inc()
 
     def error_callback(self, update: object, context: CallbackContext):
         # Send all errors to maintainers
@@ -367,11 +458,12 @@ class TelegramInterface(MessengerInterface):
 
     # Telegram file cache
     def get_input_media_photo(self, filename: str) -> Union[InputMediaPhoto]:
-        if filename in self.cache.keys():
-            return InputMediaPhoto(self.cache[filename])
+        file_id = self.file_ids.get(filename)
+        if file_id:
+            return InputMediaPhoto(file_id)
 
         with open(filename, "rb") as f:
             return InputMediaPhoto(f, filename=filename)
 
     def set_file_id(self, filename: str, file_id: str):
-        self.cache[filename] = file_id
+        self.file_ids.put(filename, file_id)
@@ -1,11 +1,12 @@
 import logging
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import List, Optional, Iterable
 
 from TwitterAPI import TwitterAPI, TwitterResponse
 
 from covidbot.covid_data import CovidData, Visualization
+from covidbot.interfaces.media_store import MediaIdStore
 from covidbot.location_service import LocationService
 from covidbot.metrics import SENT_MESSAGE_COUNT, API_RATE_LIMIT, API_RESPONSE_TIME, \
     API_RESPONSE_CODE
@@ -23,15 +24,20 @@ class TwitterInterface(SingleCommandInterface):
     twitter: TwitterAPI
     handle_regex = re.compile('@(\w){1,15}')
     location_service: LocationService
+    media_ids: MediaIdStore
 
     INFECTIONS_UID = "infections"
     VACCINATIONS_UID = "vaccinations"
     ICU_UID = "icu"
 
+    # Do not reuse media that expires in the meantime
+    MEDIA_EXPIRY_MARGIN = timedelta(minutes=15)
+
     def __init__(self, consumer_key: str, consumer_secret: str, access_token_key: str, access_token_secret: str,
                  user_manager: UserManager, covid_data: CovidData, visualization: Visualization,
-                 no_write: bool = False):
+                 no_write: bool = False, media_id_store: str = 'resources/media-ids.sqlite'):
         super().__init__(user_manager, covid_data, visualization, 15, no_write)
+        self.media_ids = MediaIdStore(media_id_store, 'twitter')
         self.twitter = TwitterAPI(consumer_key, consumer_secret, access_token_key, access_token_secret,
                                   api_version='1.1')
         self.twitter.CONNECTION_TIMEOUT = 30
@@ -56,14 +62,7 @@ class TwitterInterface(SingleCommandInterface):
                 # Upload filenames
                 media_ids = []
                 for file in message.images:
-                    with open(file, "rb") as f:
-                        upload_resp = self.twitter.request('media/upload', None, {'media': f.read()})
-                        if upload_resp.status_code != 200:
-                            raise ValueError(
-                                f"Could not upload graph to twitter. API response {upload_resp.status_code}: "
-                                f"{upload_resp.text}")
-
-                        media_ids.append(upload_resp.json()['media_id'])
+                    media_ids.append(self.upload_media(file))
 
                 data['media_ids'] = ",".join(map(str, media_ids))
 
@@ -83,6 +82,28 @@ class TwitterInterface(SingleCommandInterface):
                 raise ValueError(f"Could not send tweet: API Code {response.status_code}: {response.text}")
         return True
 
+    def upload_media(self, filename: str) -> str:
+        """
+        Uploads a graph, or returns the media ID of a previous upload of the same file that did not expire yet
+        """
+        media_id = self.media_ids.get(filename)
+        if media_id:
+            return media_id
+
+        with open(filename, "rb") as f:
+            upload_resp = self.twitter.request('media/upload', None, {'media': f.read()})
+        if upload_resp.status_code != 200:
+            raise ValueError(
+                f"Could not upload graph to twitter. API response {upload_resp.status_code}: "
+                f"{upload_resp.text}")
+
+        upload = upload_resp.json()
+        media_id = str(upload['media_id'])
+        # Twitter deletes media not attached to a tweet after expires_after_secs, usually 24h
+        expires_after = upload.get('expires_after_secs', 86400)
+        self.media_ids.put(filename, media_id, timedelta(seconds=expires_after) - self.MEDIA_EXPIRY_MARGIN)
+        return media_id
+
     @staticmethod
     def update_twitter_metrics(response: TwitterResponse):
         quota = response.get_quota()
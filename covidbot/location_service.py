@@ -1,54 +1,310 @@
 import logging
-from typing import List, Optional
+import os
+import sqlite3
+import threading
+import time
+from datetime import timedelta
+from typing import Dict, List, Optional, Tuple
 
 import requests
 import ujson as json
 from shapely.geometry import shape, Point
+from shapely.geometry.base import BaseGeometry
+from shapely.prepared import prep, PreparedGeometry
+from shapely.strtree import STRtree
 
-from covidbot.metrics import LOCATION_OSM_LOOKUP, LOCATION_GEO_LOOKUP
+from covidbot.metrics import LOCATION_OSM_LOOKUP, LOCATION_GEO_LOOKUP, LOCATION_GAZETTEER_LOOKUP, \
+    LOCATION_OSM_CACHE_HITS, LOCATION_OSM_CACHE_MISSES
 
 
 class GeoLookup:
-    json_data: Optional[dict]
+    """
+    Finds the district for coordinates. The district polygons are loaded once and indexed in an STRtree, so a lookup
+    is a bounding box query followed by exact tests against the few candidates.
+    """
     filename: str
+    rs: Optional[List[int]]
+    geometries: Optional[List[BaseGeometry]]
+    prepared: Optional[List[PreparedGeometry]]
+    tree: Optional[STRtree]
+    geometry_index: Dict[int, int]
 
     def __init__(self, filename: str):
         self.filename = filename
+        self.rs = None
+        self.geometries = None
+        self.prepared = None
+        self.tree = None
+        self.geometry_index = {}
 
     def __enter__(self):
-        with open(self.filename, "r") as file:
-            self.json_data = json.load(file)
+        self.load()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        del self.json_data
+        pass
+
+    def load(self) -> None:
+        if self.tree is not None:
+            return
+
+        with open(self.filename, "r") as file:
+            json_data = json.load(file)
+
+        self.rs = []
+        self.geometries = []
+        for feature in json_data['features']:
+            self.rs.append(int(feature['properties']['RS']))
+            self.geometries.append(shape(feature['geometry']))
+
+        self.prepared = [prep(geometry) for geometry in self.geometries]
+        self.geometry_index = {id(geometry): i for i, geometry in enumerate(self.geometries)}
+        self.tree = STRtree(self.geometries)
 
     def find_rs(self, lon: float, lat: float) -> Optional[int]:
-        if not self.json_data:
-            raise Exception("GeoLookup has to be used in with context")
+        return self.find_rs_many([(lon, lat)])[0]
+
+    def find_rs_many(self, points: List[Tuple[float, float]]) -> List[Optional[int]]:
+        """
+        Finds the districts for several coordinates
+        :param points: List of (lon, lat) tuples
+        :return: RS of the district for each point, None if it is not within a district
+        """
+        self.load()
+        result = []
+        for lon, lat in points:
+            point = Point(lon, lat)
+            rs = None
+            for candidate in self.tree.query(point):
+                # Shapely < 2.0 returns the geometries, newer versions their indices
+                if isinstance(candidate, BaseGeometry):
+                    index = self.geometry_index[id(candidate)]
+                else:
+                    index = int(candidate)
+
+                if self.prepared[index].contains(point):
+                    rs = self.rs[index]
+                    break
+            result.append(rs)
+        return result
+
+
+class Gazetteer:
+    """
+    Offline lookup of German place names, mapped to the RS of the districts they are located in. The file is created
+    from a GeoNames export with :py:meth:`Gazetteer.build`, one line per name with the comma separated RS.
+    """
+    filename: str
+    names: Optional[Dict[str, List[int]]]
+    log = logging.getLogger(__name__)
+
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.names = None
+
+    def load(self) -> None:
+        if self.names is not None:
+            return
+
+        self.names = {}
+        if not os.path.isfile(self.filename):
+            self.log.warning(f"Gazetteer {self.filename} does not exist, using Nominatim only")
+            return
+
+        with open(self.filename, "r", encoding="utf-8") as file:
+            for line in file:
+                name, rs = line.rstrip("\n").split("\t")
+                self.names[name] = [int(district_id) for district_id in rs.split(",")]
+
+    def find(self, name: str) -> List[int]:
+        self.load()
+        return list(self.names.get(self.normalize(name), []))
+
+    @staticmethod
+    def normalize(name: str) -> str:
+        return " ".join(name.lower().split())
+
+    @staticmethod
+    def name_variants(name: str) -> List[str]:
+        """
+        Returns the normalized name and its short forms, e.g. Frankfurt (Oder) is also found by Frankfurt
+        """
+        variants = [Gazetteer.normalize(name)]
+        for separator in [",", "("]:
+            short_name = Gazetteer.normalize(name.split(separator)[0])
+            if short_name and short_name not in variants:
+                variants.append(short_name)
+        return variants
+
+    @staticmethod
+    def build(geonames_file: str, geolookup: GeoLookup, target: str) -> int:
+        """
+        Creates the gazetteer file from a GeoNames export, e.g. DE.txt from https://download.geonames.org/export/dump/.
+        The district of a place is determined by its coordinates, names that are shorter than 3 characters are skipped.
+        :param geonames_file: Tab separated GeoNames file
+        :param geolookup: GeoLookup to find the district for the coordinates
+        :param target: Filename of the gazetteer
+        :return: Number of names in the gazetteer
+        """
+        places = []
+        with open(geonames_file, "r", encoding="utf-8") as file:
+            for line in file:
+                fields = line.rstrip("\n").split("\t")
+                # Only populated places and administrative areas
+                if len(fields) < 9 or fields[6] not in ["P", "A"]:
+                    continue
+
+                names = [fields[1], fields[2]] + [alt_name for alt_name in fields[3].split(",") if alt_name]
+                places.append((names, float(fields[5]), float(fields[4])))
+
+        districts = geolookup.find_rs_many([(lon, lat) for _, lon, lat in places])
+        gazetteer: Dict[str, List[int]] = {}
+        for (names, _, _), rs in zip(places, districts):
+            if not rs:
+                continue
+
+            for name in names:
+                if len(name) < 3 or name.isdigit():
+                    continue
+
+                for variant in Gazetteer.name_variants(name):
+                    if "\t" in variant:
+                        continue
+
+                    gazetteer.setdefault(variant, [])
+                    if rs not in gazetteer[variant]:
+                        gazetteer[variant].append(rs)
+
+        with open(target, "w", encoding="utf-8") as file:
+            for name in sorted(gazetteer.keys()):
+                file.write(f"{name}\t{','.join(map(str, gazetteer[name]))}\n")
+        return len(gazetteer)
+
+
+class NominatimCache:
+    """
+    Persistent LRU cache for Nominatim results, stored in a SQLite file so it is shared between the bot processes and
+    survives restarts. Empty results are cached as well, but expire earlier.
+    """
+    filename: str
+    max_entries: int
+    ttl: timedelta
+    negative_ttl: timedelta
+    connection: Optional[sqlite3.Connection]
+    lock: threading.Lock
 
-        point = Point(lon, lat)
+    def __init__(self, filename: str, max_entries: int = 10000, ttl: timedelta = timedelta(days=30),
+                 negative_ttl: timedelta = timedelta(days=1)):
+        self.filename = filename
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.connection = None
+        self.lock = threading.Lock()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        if not self.connection:
+            self.connection = sqlite3.connect(self.filename, check_same_thread=False)
+            self.connection.execute('CREATE TABLE IF NOT EXISTS nominatim_cache (query TEXT, strict INTEGER, '
+                                    'result TEXT, created REAL, last_access REAL, PRIMARY KEY(query, strict))')
+            self.connection.execute('CREATE INDEX IF NOT EXISTS nominatim_cache_access '
+                                    'ON nominatim_cache (last_access)')
+            self.connection.commit()
+        return self.connection
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        return " ".join(query.lower().split())
+
+    def get(self, query: str, strict: bool) -> Optional[List[int]]:
+        """
+        Returns the cached result of a query
+        :param query: Query sent to Nominatim
+        :param strict: Whether it was a strict query
+        :return: List of RS, which is empty for a cached query without result, None if nothing is cached
+        """
+        now = time.time()
+        with self.lock:
+            connection = self._get_connection()
+            row = connection.execute('SELECT result, created FROM nominatim_cache WHERE query=? AND strict=?',
+                                     [self.normalize(query), int(strict)]).fetchone()
+            if row:
+                result = [int(rs) for rs in row[0].split(",") if rs]
+                ttl = self.ttl if result else self.negative_ttl
+                if row[1] + ttl.total_seconds() >= now:
+                    connection.execute('UPDATE nominatim_cache SET last_access=? WHERE query=? AND strict=?',
+                                       [now, self.normalize(query), int(strict)])
+                    connection.commit()
+                    LOCATION_OSM_CACHE_HITS.labels('found' if result else 'not_found').inc()
+                    return result
 
-        # check each polygon to see if it contains the point
-        for feature in self.json_data['features']:
-            polygon = shape(feature['geometry'])
-            if polygon.contains(point):
-                return int(feature['properties']['RS'])
+        LOCATION_OSM_CACHE_MISSES.inc()
+        return None
+
+    def put(self, query: str, strict: bool, result: List[int]) -> None:
+        now = time.time()
+        with self.lock:
+            connection = self._get_connection()
+            connection.execute('INSERT OR REPLACE INTO nominatim_cache (query, strict, result, created, last_access) '
+                               'VALUES (?, ?, ?, ?, ?)',
+                               [self.normalize(query), int(strict), ",".join(str(rs) for rs in result if rs), now, now])
+            # Evict least recently used entries
+            connection.execute('DELETE FROM nominatim_cache WHERE rowid IN (SELECT rowid FROM nominatim_cache '
+                               'ORDER BY last_access DESC LIMIT -1 OFFSET ?)', [self.max_entries])
+            connection.commit()
 
 
 class LocationService:
     geolookup: Optional[GeoLookup]
+    gazetteer: Gazetteer
+    cache: Optional[NominatimCache]
 
-    def __init__(self, filename: str):
+    def __init__(self, filename: str, gazetteer_filename: str = 'resources/gazetteer.tsv',
+                 cache_filename: Optional[str] = 'resources/nominatim-cache.sqlite'):
         self.geolookup = GeoLookup(filename)
+        self.gazetteer = Gazetteer(gazetteer_filename)
+        self.cache = None
+        if cache_filename:
+            self.cache = NominatimCache(cache_filename)
 
     @LOCATION_GEO_LOOKUP.time()
     def find_rs(self, lon: float, lat: float) -> Optional[int]:
-        with self.geolookup as lookup:
-            return lookup.find_rs(lon, lat)
+        return self.geolookup.find_rs(lon, lat)
+
+    @LOCATION_GEO_LOOKUP.time()
+    def find_rs_many(self, points: List[Tuple[float, float]]) -> List[Optional[int]]:
+        return self.geolookup.find_rs_many(points)
 
-    @LOCATION_OSM_LOOKUP.time()
     def find_location(self, name: str, strict=False) -> List[int]:
+        """
+        Finds the districts for a place name. The offline gazetteer is used first, Nominatim only if the name is
+        unknown or if it is ambiguous and a strict search is requested
+        """
+        with LOCATION_GAZETTEER_LOOKUP.time():
+            result = self.gazetteer.find(name)
+
+        if result and (not strict or len(result) == 1):
+            return result
+
+        if self.cache:
+            result = self.cache.get(name, strict)
+            if result is not None:
+                return result
+
+        result = self.find_location_online(name, strict)
+        if result is None:
+            return []
+
+        if self.cache:
+            self.cache.put(name, strict, result)
+        return result
+
+    @LOCATION_OSM_LOOKUP.time()
+    def find_location_online(self, name: str, strict=False) -> Optional[List[int]]:
+        """
+        Queries Nominatim for a place name
+        :return: List of RS, None if Nominatim could not be queried
+        """
         p = {'countrycodes': 'de', 'format': 'jsonv2'}
         if strict:
             p['city'] = name
@@ -62,24 +318,23 @@ class LocationService:
         if request.status_code < 200 or request.status_code > 299:
             logging.warning(f"Did not get a 2XX response from Nominatim for query {name} "
                             f"but {request.status_code}: {request.reason}")
-            return []
+            return None
         response = request.json()
         result = []
         stricter_results = []
-        with self.geolookup as geolookup:
-            for item in response:
-                if strict and item['importance'] < 0.4:
-                    continue
+        if strict:
+            response = [item for item in response if item['importance'] >= 0.4]
 
-                rs = geolookup.find_rs(float(item['lon']), float(item['lat']))
-                if rs and rs not in result:
-                    result.append(rs)
+        districts = self.geolookup.find_rs_many([(float(item['lon']), float(item['lat'])) for item in response])
+        for item, rs in zip(response, districts):
+            if rs and rs not in result:
+                result.append(rs)
 
-                if strict and item['display_name'].find(name) == 0:
-                    first_part = item['display_name'].split(",")[0]
-                    if first_part == name:
-                        return [rs]
-                    stricter_results.append(rs)
+            if strict and item['display_name'].find(name) == 0:
+                first_part = item['display_name'].split(",")[0]
+                if first_part == name:
+                    return [rs]
+                stricter_results.append(rs)
 
         if strict and stricter_results:
             return stricter_results
@@ -19,17 +19,49 @@ AVERAGE_SUBSCRIPTION_COUNT = Gauge('bot_avg_subscriptions', 'Average No. of subs
 # Visualization related
 CREATED_GRAPHS = Counter('bot_viz_created_graph_count', 'Number of created graphs', ['type'])
 CACHED_GRAPHS = Counter('bot_viz_cached_graph_count', 'Number of created graphs', ['type'])
+GRAPH_WARMUP_TIME = Summary('bot_viz_warmup_time', 'Time used to render the graphs after a data update')
+DEDUPLICATED_GRAPHS = Counter('bot_viz_deduplicated_graph_count', 'Graph requests served by a running render',
+                              ['type'])
+GRAPHICS_CACHE_SIZE = Gauge('bot_viz_cache_size_bytes', 'Size of the graphics directory')
+GRAPHICS_CACHE_FILES = Gauge('bot_viz_cache_files', 'Number of files in the graphics directory')
+GRAPHICS_CACHE_EVICTIONS = Counter('bot_viz_cache_eviction_count', 'Deleted graphics', ['reason'])
 
 # Location Service
 LOCATION_OSM_LOOKUP = Summary('bot_location_osm_lookup', 'Duration of OSM Requests')
 LOCATION_GEO_LOOKUP = Summary('bot_location_geo_lookup', 'Time used for geolocation lookup')
 LOCATION_DB_LOOKUP = Summary('bot_location_db_lookup', 'Time used for database lookup')
+LOCATION_GAZETTEER_LOOKUP = Summary('bot_location_gazetteer_lookup', 'Time used for offline gazetteer lookup')
+LOCATION_OSM_CACHE_HITS = Counter('bot_location_osm_cache_hit_count', 'OSM lookups served from the cache',
+                                  ['result'])
+LOCATION_OSM_CACHE_MISSES = Counter('bot_location_osm_cache_miss_count', 'OSM lookups not found in the cache')
 
 # Twitter Metrics
 API_RATE_LIMIT = Gauge('bot_api_rate_limit', 'Current Rate Limit', ['platform', 'type'])
 API_RESPONSE_CODE = Counter('bot_api_response_code', 'Twitter API response codes', ['platform', 'code'])
 API_RESPONSE_TIME = Summary('bot_api_response_time', 'Twitter API response time', ['platform'])
 
+# Uploaded media
+MEDIA_ID_CACHE_HITS = Counter('bot_media_id_cache_hit_count', 'Uploads saved by reusing a media ID', ['platform'])
+MEDIA_ID_CACHE_MISSES = Counter('bot_media_id_cache_miss_count', 'Files that had to be uploaded', ['platform'])
+
+# Send pipeline
+SEND_PIPELINE_THROUGHPUT = Gauge('bot_send_pipeline_throughput', 'Messages per second sent in the current run',
+                                 ['platform'])
+SEND_PIPELINE_RATE = Gauge('bot_send_pipeline_rate', 'Current rate limit of the send pipeline in messages per second',
+                           ['platform'])
+
 # Error Metrics
 BOT_SEND_MESSAGE_ERRORS = Counter('bot_send_message_error', 'Number of errors while sending a message',
                                   ['platform', 'error'])
+
+# Data cache
+DISTRICT_DATA_CACHE_HITS = Counter('bot_district_data_cache_hit_count', 'DistrictData served from the in-process cache')
+DISTRICT_DATA_CACHE_MISSES = Counter('bot_district_data_cache_miss_count', 'DistrictData fetched from the database')
+REPORT_CACHE_HITS = Counter('bot_report_cache_hit_count', 'Report parts served from the rendering cache', ['type'])
+REPORT_CACHE_MISSES = Counter('bot_report_cache_miss_count', 'Report parts that had to be rendered', ['type'])
+
+# Updater
+UPDATER_STAGE_TIME = Summary('bot_updater_stage_time', 'Time used for each stage of a data update',
+                             ['updater', 'stage'])
+UPDATER_IMPORTED_ROWS = Counter('bot_updater_imported_row_count', 'Rows written by a history import', ['updater'])
+UPDATER_PROGRESS = Gauge('bot_updater_progress', 'Timestamp of the last day written by a history import', ['updater'])
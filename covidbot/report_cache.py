@@ -0,0 +1,55 @@
+from dataclasses import replace
+from typing import Callable, Dict, Hashable, List, Optional
+
+from covidbot.interfaces.bot_response import BotResponse
+from covidbot.metrics import REPORT_CACHE_HITS, REPORT_CACHE_MISSES
+
+
+class ReportCache:
+    """
+    Memoizes rendered report sections and whole reports for the current version, so users with identical
+    subscriptions and settings share one rendering. All entries are dropped as soon as the version changes.
+    """
+    version: Optional[Hashable]
+    sections: Dict[Hashable, str]
+    reports: Dict[Hashable, List[BotResponse]]
+
+    def __init__(self):
+        self.version = None
+        self.sections = {}
+        self.reports = {}
+
+    def set_version(self, version: Hashable) -> None:
+        if version != self.version:
+            self.sections = {}
+            self.reports = {}
+            self.version = version
+
+    def get_section(self, key: Hashable, render: Callable[[], str]) -> str:
+        """
+        Returns a rendered section of a report
+        :param key: Identifies the section, must include everything the text depends on besides the version
+        :param render: Renders the section if it is not cached
+        :return: Text of the section
+        """
+        if key in self.sections:
+            REPORT_CACHE_HITS.labels('section').inc()
+        else:
+            REPORT_CACHE_MISSES.labels('section').inc()
+            self.sections[key] = render()
+        return self.sections[key]
+
+    def get_report(self, key: Hashable, render: Callable[[], List[BotResponse]]) -> List[BotResponse]:
+        """
+        Returns a rendered report. The interfaces adapt the messages in place, so each caller gets its own
+        :py:class:`BotResponse` objects, the rendered text and graphics are shared.
+        :param key: Identifies the report, must include everything the report depends on besides the version
+        :param render: Renders the report if it is not cached
+        :return: List of BotResponse
+        """
+        if key in self.reports:
+            REPORT_CACHE_HITS.labels('report').inc()
+        else:
+            REPORT_CACHE_MISSES.labels('report').inc()
+            self.reports[key] = render()
+        return [replace(response) for response in self.reports[key]]
@@ -25,6 +25,18 @@ class BotUserSettings(Enum):
         elif setting == BotUserSettings.FORMATTING:
             return True
 
+    @staticmethod
+    def bit(setting: BotUserSettings) -> int:
+        return 1 << list(BotUserSettings).index(setting)
+
+    @staticmethod
+    def default_bitmask() -> int:
+        bitmask = 0
+        for setting in BotUserSettings:
+            if BotUserSettings.default(setting):
+                bitmask |= BotUserSettings.bit(setting)
+        return bitmask
+
     @staticmethod
     def title(setting: BotUserSettings) -> str:
         if setting == BotUserSettings.BETA:
@@ -7,6 +7,8 @@ from covidbot.__main__ import parse_config, get_connection
 from covidbot.covid_data import CovidData, RKIUpdater, VaccinationGermanyUpdater, RValueGermanyUpdater, \
     Visualization, DistrictData
 from covidbot.bot import Bot, UserDistrictActions
+from covidbot.graph_warmup import GraphWarmup
+from covidbot.settings import BotUserSettings
 from covidbot.user_manager import UserManager
 
 
@@ -19,6 +21,8 @@ class TestBot(TestCase):
         cls.conn = get_connection(cfg)
 
         with cls.conn.cursor(dictionary=True) as cursor:
+            cursor.execute("DROP TABLE IF EXISTS covid_data_calculated;")
+            cursor.execute("DROP TABLE IF EXISTS incidence_intervals;")
             cursor.execute("DROP TABLE IF EXISTS covid_data;")
             cursor.execute("DROP TABLE IF EXISTS covid_vaccinations;")
             cursor.execute("DROP TABLE IF EXISTS covid_r_value;")
@@ -100,6 +104,34 @@ class TestBot(TestCase):
         self.assertEqual([], [1 for _ in self.interface.get_available_user_messages()],
                          "New subscriber should get his first report on next day")
 
+    def test_shared_report(self):
+        hessen_id = self.interface.find_district_id("Hessen")[1][0].id
+        uid1 = self.user_manager.get_user_id("uid1")
+        uid2 = self.user_manager.get_user_id("uid2")
+        self.user_manager.add_subscription(uid1, hessen_id)
+        self.user_manager.add_subscription(uid2, hessen_id)
+
+        report1 = self.interface.reportHandler("", uid1)
+        report2 = self.interface.reportHandler("", uid2)
+        self.assertEqual(report1, report2, "Users with the same configuration should get the same report")
+        self.assertIsNot(report1[0], report2[0], "Each user should get its own BotResponse")
+
+        self.user_manager.set_user_setting(uid2, BotUserSettings.REPORT_GRAPHICS, False)
+        self.assertNotEqual(report1, self.interface.reportHandler("", uid2),
+                            "Different settings should result in a different report")
+
+    def test_graph_warmup(self):
+        uid1 = self.user_manager.get_user_id("uid1")
+        self.user_manager.add_subscription(uid1, 0)
+        self.user_manager.add_subscription(uid1, self.interface.find_district_id("Hessen")[1][0].id)
+
+        warmup = GraphWarmup(self.conn, self.data, self.interface.visualization)
+        self.assertEqual({uid1: [0, 6]}, warmup.get_subscriptions())
+        self.assertEqual(self.user_manager.get_user(uid1, with_subscriptions=True).subscriptions,
+                         warmup.get_subscriptions()[uid1], "Subscriptions should be ordered like in reports")
+        # Country and Hessen: infections and incidence each, one multi-incidence graph
+        self.assertGreaterEqual(warmup.run(), 5, "All graphs of subscribed districts should be rendered")
+
     def test_sort_districts(self):
         districts = [DistrictData(incidence=0, name="A", id=1), DistrictData(incidence=0, name="C", id=3),
                      DistrictData(incidence=0, name="B", id=2)]
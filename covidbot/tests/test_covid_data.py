@@ -1,10 +1,11 @@
-from datetime import date
+from datetime import date, timedelta
 from unittest import TestCase
 
 from mysql.connector import MySQLConnection
 
 from covidbot.__main__ import parse_config, get_connection
 from covidbot.covid_data import CovidData, DistrictData, TrendValue, RKIUpdater
+from covidbot.covid_data.covid_data import CovidDatabaseCreator
 
 
 class CovidDataTest(TestCase):
@@ -23,6 +24,8 @@ class CovidDataTest(TestCase):
         self.data = CovidData(self.conn)
 
         with self.conn.cursor() as cursor:
+            cursor.execute("TRUNCATE TABLE covid_data_calculated;")
+            cursor.execute("TRUNCATE TABLE incidence_intervals;")
             cursor.execute("TRUNCATE TABLE covid_data;")
             cursor.execute("TRUNCATE TABLE covid_vaccinations;")
             cursor.execute("TRUNCATE TABLE covid_r_value;")
@@ -41,6 +44,7 @@ class CovidDataTest(TestCase):
 
             updater = RKIUpdater(self.conn)
             updater.calculate_aggregated_values(date.fromisoformat("2021-01-16"))
+            CovidDatabaseCreator.update_derived_data(cursor)
 
     def tearDown(self) -> None:
         del self.data
@@ -61,6 +65,13 @@ class CovidDataTest(TestCase):
         self.assertEqual(1, len(self.data.search_district_by_name("Kassel Land")), "Kassel Land should match LK Kassel")
         self.assertEqual(1, len(self.data.search_district_by_name("Bundesland Hessen")), "Exact match should be chosen")
 
+    def test_find_ags_typo(self):
+        self.assertEqual(1, len(self.data.search_district_by_name("Gottingen")), "Umlauts should be optional")
+        self.assertEqual(2, len(self.data.search_district_by_name("Muenchen")), "Transliterated umlauts should match")
+        self.assertEqual(2, len(self.data.search_district_by_name("munchen")), "Accents should be ignored")
+        self.assertEqual(2, len(self.data.search_district_by_name("Kasell")), "Typos should be tolerated")
+        self.assertEqual([], self.data.search_district_by_name("Hallo"), "Short words should not match fuzzy")
+
     def test_get_district_data(self):
         data = self.data.get_district_data(3151)
 
@@ -75,6 +86,73 @@ class CovidDataTest(TestCase):
         non_existent = self.data.get_district_data(9999999999999)
         self.assertIsNone(non_existent, "get_district_data should return None for non-existing data")
 
+    def test_get_district_data_many(self):
+        district_ids = [3151, 0, 3, 9999999999999, 3151]
+        data = self.data.get_district_data_many(district_ids)
+
+        self.assertEqual([3151, 0, 3], list(data.keys()),
+                         "get_district_data_many should keep the order and omit districts without data")
+        for district_id in data:
+            self.assertEqual(self.data.get_district_data(district_id), data[district_id],
+                             "get_district_data_many should return the same data as get_district_data")
+        self.assertEqual({}, self.data.get_district_data_many([]))
+
+    def test_trend_comparison_days(self):
+        with self.conn.cursor() as cursor:
+            cursor.execute("SELECT MAX(date) FROM covid_data_calculated WHERE rs=3151")
+            max_date = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM covid_data_calculated WHERE rs=3151")
+            self.assertGreater(cursor.fetchone()[0], 8, "Test data should contain more than a week")
+
+            # Values of all other days would result in the opposite trends
+            cursor.execute("UPDATE covid_data_calculated SET new_cases=200, new_deaths=1, incidence=40 WHERE rs=3151")
+            cursor.execute("UPDATE covid_data_calculated SET new_cases=100, incidence=50 WHERE rs=3151 AND date=%s",
+                           [max_date])
+            cursor.execute("UPDATE covid_data_calculated SET incidence=60 WHERE rs=3151 AND date=%s",
+                           [max_date - timedelta(days=1)])
+            cursor.execute("UPDATE covid_data_calculated SET new_cases=50 WHERE rs=3151 AND date=%s",
+                           [max_date - timedelta(days=7)])
+        RKIUpdater(self.conn).increment_data_version()
+        self.conn.commit()
+
+        data = self.data.get_district_data(3151)
+        self.assertEqual(max_date, data.date)
+        self.assertEqual(TrendValue.DOWN, data.incidence_trend, "Incidence should be compared to yesterday")
+        self.assertEqual(TrendValue.UP, data.cases_trend, "New cases should be compared to last week")
+        self.assertEqual(TrendValue.SAME, data.deaths_trend, "New deaths should be compared to last week")
+
+    def test_district_data_cache(self):
+        data = self.data.get_district_data(3151)
+        self.assertIs(data, self.data.get_district_data(3151), "Unchanged data should be served from cache")
+
+        RKIUpdater(self.conn).increment_data_version()
+        self.conn.commit()
+        self.assertIsNot(data, self.data.get_district_data(3151), "New data should invalidate the cache")
+        self.assertEqual(data, self.data.get_district_data(3151))
+
+    def test_update_calculated_data(self):
+        before = self.data.get_district_data(3151)
+        with self.conn.cursor() as cursor:
+            cursor.execute("UPDATE covid_data SET total_cases=total_cases + 10 WHERE rs=3151 AND date=%s",
+                           [date.fromisoformat("2021-01-15")])
+            CovidDatabaseCreator.update_calculated_data(cursor, date.fromisoformat("2021-01-15"))
+            cursor.execute("SELECT new_cases FROM covid_data_calculated WHERE rs=3151 AND date=%s",
+                           [date.fromisoformat("2021-01-16")])
+            self.assertEqual(before.new_cases - 10, cursor.fetchone()[0],
+                             "Changes should be propagated to the new cases of the following day")
+
+    def test_incidence_interval(self):
+        data = self.data.get_district_data(3151)
+        threshold, since_above = CovidData.get_incidence_interval(data.incidence)
+        self.assertEqual(threshold, data.incidence_interval_threshold)
+
+        operator = ">" if since_above else "<="
+        with self.conn.cursor() as cursor:
+            cursor.execute(f"SELECT MAX(date) FROM covid_data WHERE rs=3151 AND incidence {operator} %s",
+                           [threshold])
+            self.assertEqual(cursor.fetchone()[0], data.incidence_interval_since,
+                             "Precomputed interval should start at the last day on the other side of the threshold")
+
     def test_fill_trend(self):
         today = DistrictData("Test1", 1, new_cases=5, new_deaths=5, incidence=5)
         last_week = DistrictData("Test1", 1, new_cases=5, new_deaths=6, incidence=4)
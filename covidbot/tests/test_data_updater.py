@@ -1,3 +1,5 @@
+import logging
+from datetime import date
 from unittest import TestCase
 
 from mysql.connector import MySQLConnection
@@ -5,7 +7,9 @@ from mysql.connector import MySQLConnection
 from covidbot.__main__ import parse_config, get_connection
 from covidbot.covid_data import RKIUpdater, VaccinationGermanyUpdater, RValueGermanyUpdater, \
     VaccinationGermanyImpfdashboardUpdater
-from covidbot.covid_data import clean_district_name, ICUGermanyUpdater, RulesGermanyUpdater
+from covidbot.covid_data import clean_district_name, ICUGermanyUpdater, RulesGermanyUpdater, \
+    ICUGermanyHistoryUpdater, RKIHistoryUpdater
+from covidbot.covid_data.updater.aggregation import HierarchyAggregator
 
 
 class TestUpdater(TestCase):
@@ -22,6 +26,8 @@ class TestUpdater(TestCase):
 
     def test_update(self):
         with self.conn.cursor() as c:
+            c.execute("DROP TABLE covid_data_calculated")
+            c.execute("DROP TABLE incidence_intervals")
             c.execute("DROP TABLE covid_data")
             c.execute("DROP TABLE covid_vaccinations")
             c.execute("DROP TABLE covid_r_value")
@@ -41,6 +47,45 @@ class TestUpdater(TestCase):
         updater = RulesGermanyUpdater(self.conn)
         self.assertTrue(updater.update(), "RulesGermanyUpdater should update")
 
+    def test_parse_features(self):
+        def feature(rs, county, bez, population, state_id, state, cases, deaths, incidence, state_incidence, day):
+            return {'attributes': {'RS': rs, 'county': county, 'BEZ': bez, 'EWZ': population, 'BL_ID': state_id,
+                                   'BL': state, 'cases': cases, 'deaths': deaths, 'cases7_per_100k': incidence,
+                                   'cases7_bl_per_100k': state_incidence, 'last_update': f"{day}.01.2021, 00:00 Uhr"}}
+
+        features = [feature("06611", "SK Kassel", "Kreisfreie Stadt", 200000, "6", "Hessen", 100, 10, 50.0, 40.0, 16),
+                    feature("06633", "LK Kassel", "Landkreis", 200000, "6", "Hessen", 50, 5, 30.0, 40.0, 16),
+                    feature("03159", "LK Göttingen", "Landkreis", 400000, "3", "Niedersachsen", 200, 20, 70.0,
+                            80.0, 16),
+                    feature("03241", "Region Hannover", "Region", 1000000, "3", "Niedersachsen", 700, 1, 90.0,
+                            80.0, 17)]
+
+        covid_data, rs_data = RKIUpdater.parse_features(features, date(2021, 1, 15), date(2021, 1, 16))
+        self.assertIn((6, date(2021, 1, 16), 150, 40.0, 15), covid_data, "State values should be summed up")
+        self.assertIn((0, date(2021, 1, 16), 350, 60.0, 35), covid_data,
+                      "Germany incidence should be weighted by the state population")
+        self.assertNotIn(3241, [row[0] for row in covid_data], "Data from the future should be skipped")
+        self.assertEqual([0, 6, 3], [row[0] for row in rs_data[:3]], "Parents should be inserted first")
+        self.assertEqual((6, 'Hessen', 'Bundesland', 400000, 0), rs_data[1])
+
+        covid_data, rs_data = RKIUpdater.parse_features(features, date(2021, 1, 16), date(2021, 1, 16))
+        self.assertEqual([], covid_data, "Known data should be skipped")
+
+    def test_aggregation_levels(self):
+        parents = {0: None, 3: 0, 6: 0, 3159: 3, 6611: 6, 6633: 6, 11: 0, 11000: 11, 11001: 11000}
+        self.assertEqual([[11000], [3, 6, 11], [0]], HierarchyAggregator.get_levels(parents),
+                         "Parents should be ordered bottom-up by their depth")
+        self.assertRaises(ValueError, HierarchyAggregator.get_levels, {1: 2, 2: 1})
+
+    def test_parse_icu_archive(self):
+        archive = "bundesland,kreis,anzahl_standorte,betten_frei,betten_belegt,faelle_covid_aktuell_beatmet\n" \
+                  "01,01001,2,20,30,1\n" \
+                  "11,11000,40,500,1500,100\n"
+        rows = ICUGermanyHistoryUpdater.parse_archive(archive, date(2020, 4, 30))
+        self.assertEqual(['01001', date(2020, 4, 30), '20', '30', None, '1', date(2020, 4, 30)], rows[0],
+                         "Old archive format should be parsed")
+        self.assertEqual('11', rows[1][0], "Berlin should be mapped to its state")
+
     def test_clean_district_name(self):
         expected = [("Region Hannover", "Hannover"), ("LK Kassel", "Kassel"),
                     ("LK Dillingen a.d.Donau", "Dillingen a.d.Donau"),
@@ -48,3 +93,63 @@ class TestUpdater(TestCase):
         for item in expected:
             self.assertEqual(item[1], clean_district_name(item[0]),
                              "Clean name of " + item[0] + " should be " + item[1])
+
+
+class FakeCursor:
+    def __init__(self):
+        self.chunks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    def execute(self, query, args=None):
+        pass
+
+    def executemany(self, query, rows):
+        self.chunks.append(list(rows))
+
+    def fetchall(self):
+        return []
+
+
+class FakeConnection:
+    def __init__(self):
+        self.fake_cursor = FakeCursor()
+        self.commits = 0
+
+    def cursor(self, *args, **kwargs):
+        return self.fake_cursor
+
+    def commit(self):
+        self.commits += 1
+
+
+class TestHistoryImport(TestCase):
+    def test_resume_import(self):
+        lines = ["time_iso8601,1001,1002,sum_cases",
+                 "2021-01-01T00:00:00+0100,1,2,3",
+                 "2021-01-02T00:00:00+0100,3,4,7",
+                 "",
+                 "2021-01-03T00:00:00+0100,5,6,11",
+                 "2021-01-04T00:00:00+0100,7,8,15"]
+        checkpoints = []
+
+        conn = FakeConnection()
+        updater = RKIHistoryUpdater.__new__(RKIHistoryUpdater)
+        updater.connection = conn
+        updater.log = logging.getLogger(__name__)
+        updater.CHUNK_SIZE = 2
+        updater.get_resource_lines = lambda url: iter(lines)
+        updater.get_checkpoint = lambda name: date(2021, 1, 2)
+        updater.set_checkpoint = lambda name, checkpoint: checkpoints.append(checkpoint)
+        updater.increment_data_version = lambda: None
+
+        self.assertTrue(updater.update_cases(), "New cases should be imported")
+        self.assertEqual([[(1001, date(2021, 1, 3), 9), (1002, date(2021, 1, 3), 12)],
+                          [(1001, date(2021, 1, 4), 16), (1002, date(2021, 1, 4), 20)]], conn.fake_cursor.chunks,
+                         "Only days after the checkpoint should be written, with cumulative cases of all days")
+        self.assertEqual([date(2021, 1, 3), date(2021, 1, 4)], checkpoints, "Each chunk should set a checkpoint")
+        self.assertEqual(2, conn.commits, "Each chunk should be committed")
@@ -0,0 +1,26 @@
+import time
+from unittest import TestCase
+
+from covidbot.interfaces.flood_limiter import TokenBucket, TelegramFloodLimiter
+
+
+class TestFloodLimiter(TestCase):
+    def test_token_bucket(self):
+        bucket = TokenBucket(rate=10, capacity=2)
+        self.assertEqual(0, bucket.reserve(), "Burst should be available immediately")
+        self.assertEqual(0, bucket.reserve(), "Burst should be available immediately")
+        self.assertAlmostEqual(0.1, bucket.reserve(), delta=0.01, msg="Tokens should be refilled with the rate")
+        self.assertAlmostEqual(0.2, bucket.reserve(), delta=0.01, msg="Reservations should queue up")
+
+    def test_chat_limit(self):
+        limiter = TelegramFloodLimiter(global_rate=1000)
+        start = time.monotonic()
+        for _ in range(TelegramFloodLimiter.CHAT_BURST):
+            limiter.acquire(1)
+            limiter.acquire(2)
+        self.assertLess(time.monotonic() - start, 0.1, "Different chats should not slow down each other")
+
+        self.assertGreater(limiter.get_chat_bucket(1).reserve(), 0, "Chat limit should be exceeded")
+        self.assertGreater(limiter.get_chat_bucket(-1).rate, 0)
+        self.assertLess(limiter.get_chat_bucket(-1).rate, limiter.get_chat_bucket(1).rate,
+                        "Groups should have a lower limit")
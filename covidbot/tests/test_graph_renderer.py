@@ -0,0 +1,39 @@
+import os
+import tempfile
+import time
+from unittest import TestCase
+
+from covidbot.covid_data.graph_renderer import GraphRenderer
+
+
+def write_graph(filepath: str, content: str) -> None:
+    time.sleep(0.2)
+    with open(filepath, "w") as f:
+        f.write(content)
+
+
+class TestGraphRenderer(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_inline(self):
+        filepath = os.path.join(self.directory.name, "graph.jpg")
+        future = GraphRenderer().submit("test", filepath, write_graph, "inline")
+        self.assertEqual(filepath, future.result())
+        self.assertEqual(["graph.jpg"], os.listdir(self.directory.name), "No temporary files should be left")
+
+    def test_deduplication(self):
+        renderer = GraphRenderer(max_workers=1)
+        try:
+            filepath = os.path.join(self.directory.name, "graph.jpg")
+            first = renderer.submit("test", filepath, write_graph, "first")
+            second = renderer.submit("test", filepath, write_graph, "second")
+            self.assertIs(first, second, "Running renders should be shared")
+            self.assertEqual(filepath, second.result())
+            with open(filepath) as f:
+                self.assertEqual("first", f.read())
+        finally:
+            renderer.shutdown()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+from unittest import TestCase
+
+from covidbot.covid_data.graphics_cache import GraphicsCache
+
+
+class TestGraphicsCache(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def create_file(self, name: str, size: int, accessed: timedelta, modified: timedelta) -> str:
+        path = os.path.join(self.directory.name, name)
+        with open(path, "wb") as f:
+            f.write(b"0" * size)
+        now = time.time()
+        os.utime(path, (now - accessed.total_seconds(), now - modified.total_seconds()))
+        return path
+
+    def test_max_age(self):
+        old = self.create_file("old.jpg", 10, timedelta(days=8), timedelta(days=8))
+        old_used = self.create_file("old-used.jpg", 10, timedelta(minutes=5), timedelta(days=8))
+        new = self.create_file("new.jpg", 10, timedelta(days=2), timedelta(days=2))
+
+        self.assertEqual(1, GraphicsCache(self.directory.name).cleanup())
+        self.assertFalse(os.path.exists(old))
+        self.assertTrue(os.path.exists(old_used), "Recently used files should not be deleted")
+        self.assertTrue(os.path.exists(new))
+
+    def test_max_bytes(self):
+        lru = self.create_file("lru.jpg", 100, timedelta(hours=5), timedelta(hours=5))
+        used = self.create_file("used.jpg", 100, timedelta(hours=2), timedelta(hours=5))
+        recent = self.create_file("recent.jpg", 100, timedelta(minutes=5), timedelta(minutes=5))
+
+        cache = GraphicsCache(self.directory.name, max_bytes=150)
+        self.assertEqual(2, cache.cleanup())
+        self.assertFalse(os.path.exists(lru))
+        self.assertFalse(os.path.exists(used))
+        self.assertTrue(os.path.exists(recent), "Files used within min_age should not be deleted")
+
+        self.assertEqual(0, GraphicsCache(self.directory.name, max_bytes=250).cleanup())
+
+    def test_touch(self):
+        path = self.create_file("graph.jpg", 100, timedelta(hours=5), timedelta(hours=5))
+        mtime = os.stat(path).st_mtime
+        GraphicsCache.touch(path)
+        self.assertEqual(mtime, os.stat(path).st_mtime, "Modification time should be kept")
+
+        self.create_file("other.jpg", 100, timedelta(hours=4), timedelta(hours=4))
+        GraphicsCache(self.directory.name, max_bytes=150).cleanup()
+        self.assertTrue(os.path.exists(path), "Touched file should be kept")
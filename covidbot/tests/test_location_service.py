@@ -1,6 +1,9 @@
+import os
+import tempfile
+from datetime import timedelta
 from unittest import TestCase
 
-from covidbot.location_service import LocationService
+from covidbot.location_service import LocationService, Gazetteer, NominatimCache
 
 
 class TestLocationService(TestCase):
@@ -17,6 +20,45 @@ class TestLocationService(TestCase):
         self.assertIsNone(self.location_service.find_rs(2.323020153685483, 48.83753707055439),
                           "Paris should not resolve to a RS")
 
+    def test_find_rs_many(self):
+        points = [(10.47304756818778, 52.49145414079065), (2.323020153685483, 48.83753707055439)]
+        self.assertEqual([3151, None], self.location_service.find_rs_many(points))
+        self.assertEqual([self.location_service.find_rs(lon, lat) for lon, lat in points],
+                         self.location_service.find_rs_many(points))
+
     def test_find_location(self):
         self.assertCountEqual([3151], self.location_service.find_location("Neubokel"))
         self.assertCountEqual([6631, 6633, 16069], self.location_service.find_location("Simmershausen"))
+
+    def test_gazetteer(self):
+        with tempfile.TemporaryDirectory() as directory:
+            geonames = os.path.join(directory, "DE.txt")
+            with open(geonames, "w") as f:
+                f.write("1\tNeubokel\tNeubokel\tNeu Bokel\t52.49145414079065\t10.47304756818778\tP\tPPL\tDE\n")
+                f.write("2\tParis\tParis\t\t48.83753707055439\t2.323020153685483\tP\tPPLC\tFR\n")
+
+            gazetteer_file = os.path.join(directory, "gazetteer.tsv")
+            self.assertEqual(2, Gazetteer.build(geonames, self.location_service.geolookup, gazetteer_file),
+                             "Name and alternative name should be imported, places outside Germany not")
+
+            gazetteer = Gazetteer(gazetteer_file)
+            self.assertEqual([3151], gazetteer.find("Neubokel"))
+            self.assertEqual([3151], gazetteer.find(" neu  bokel "), "Lookup should be normalized")
+            self.assertEqual([], gazetteer.find("Paris"))
+
+    def test_nominatim_cache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = NominatimCache(os.path.join(directory, "cache.sqlite"), max_entries=2,
+                                   negative_ttl=timedelta(seconds=-1))
+            self.assertIsNone(cache.get("Neubokel", False))
+            cache.put("Neubokel", False, [3151])
+            self.assertEqual([3151], cache.get(" neubokel", False), "Query should be normalized")
+            self.assertIsNone(cache.get("Neubokel", True), "Strict queries should be cached separately")
+
+            cache.put("Paris", False, [])
+            self.assertIsNone(cache.get("Paris", False), "Expired empty results should not be returned")
+
+            cache.put("Simmershausen", False, [6631, 6633, 16069])
+            cache.put("Kassel", False, [6611, 6633])
+            self.assertIsNone(cache.get("Neubokel", False), "Least recently used entry should be evicted")
+            self.assertEqual([6611, 6633], cache.get("Kassel", False))
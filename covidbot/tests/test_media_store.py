@@ -0,0 +1,42 @@
+import os
+import tempfile
+from datetime import timedelta
+from unittest import TestCase
+
+from covidbot.interfaces.media_store import MediaIdStore
+
+
+class TestMediaIdStore(TestCase):
+    def setUp(self) -> None:
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_file = os.path.join(self.directory.name, "media-ids.sqlite")
+        self.image = os.path.join(self.directory.name, "graph.jpg")
+        with open(self.image, "wb") as f:
+            f.write(b"first")
+
+    def tearDown(self) -> None:
+        self.directory.cleanup()
+
+    def test_persistence(self):
+        MediaIdStore(self.db_file, "telegram").put(self.image, "file-1")
+
+        store = MediaIdStore(self.db_file, "telegram")
+        self.assertEqual("file-1", store.get(self.image), "Media IDs should be shared between instances")
+        self.assertIsNone(MediaIdStore(self.db_file, "twitter").get(self.image),
+                          "Media IDs should be separated by platform")
+
+    def test_changed_content(self):
+        store = MediaIdStore(self.db_file, "telegram")
+        store.put(self.image, "file-1")
+        with open(self.image, "wb") as f:
+            f.write(b"second version")
+
+        self.assertIsNone(store.get(self.image), "A changed file has to be uploaded again")
+
+    def test_ttl(self):
+        store = MediaIdStore(self.db_file, "twitter")
+        store.put(self.image, "media-1", timedelta(hours=1))
+        self.assertEqual("media-1", store.get(self.image), "Media should be reused before it expires")
+
+        store.put(self.image, "media-2", timedelta(seconds=-1))
+        self.assertIsNone(store.get(self.image), "Expired media has to be uploaded again")
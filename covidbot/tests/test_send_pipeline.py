@@ -0,0 +1,75 @@
+import asyncio
+from unittest import TestCase
+
+from covidbot.interfaces.send_pipeline import SendPipeline, AIMDRateLimiter, RateLimited
+
+
+class TestSendPipeline(TestCase):
+    def test_in_flight_limit(self):
+        running = []
+        max_running = []
+
+        async def send():
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0.01)
+            running.pop()
+            return True
+
+        async def run():
+            async with SendPipeline("test", max_in_flight=3, limiter=AIMDRateLimiter(rate=1000, max_rate=1000)) \
+                    as pipeline:
+                for _ in range(20):
+                    await pipeline.submit(send)
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        self.assertEqual(20, pipeline.sent, "All messages should be sent")
+        self.assertEqual(3, max(max_running), "Not more than max_in_flight messages should be sent at once")
+
+    def test_aimd(self):
+        limiter = AIMDRateLimiter(rate=1000, min_rate=200, max_rate=1000, increase=10, decrease=0.5)
+        results = [None, None, None, False, True]
+
+        async def send():
+            result = results.pop(0)
+            if result is None:
+                raise RateLimited()
+            return result
+
+        async def run():
+            async with SendPipeline("test", max_in_flight=1, limiter=limiter) as pipeline:
+                for _ in range(5):
+                    await pipeline.submit(send)
+            return pipeline
+
+        pipeline = asyncio.run(run())
+        self.assertEqual(4, pipeline.failed)
+        self.assertEqual(210, limiter.rate, "Rate should be halved when rate limited, but not below min_rate, "
+                                            "and increased additively on success. Other failures should not "
+                                            "change it.")
+
+    def test_max_failures(self):
+        results = [False, True, False, False, False, False]
+
+        async def send():
+            return results.pop(0)
+
+        async def run():
+            async with SendPipeline("test", max_in_flight=1, limiter=AIMDRateLimiter(rate=1000, max_rate=1000),
+                                    max_failures=3) as pipeline:
+                for _ in range(6):
+                    await pipeline.submit(send)
+
+        self.assertRaises(Exception, asyncio.run, run())
+        self.assertEqual([], results, "Pipeline should only stop after more than max_failures failures in a row")
+
+    def test_exception(self):
+        async def send():
+            raise ValueError("Can't send")
+
+        async def run():
+            async with SendPipeline("test", limiter=AIMDRateLimiter(rate=1000, max_rate=1000)) as pipeline:
+                await pipeline.submit(send)
+
+        self.assertRaises(ValueError, asyncio.run, run())
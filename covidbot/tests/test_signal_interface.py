@@ -0,0 +1,62 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import patch
+
+from covidbot.interfaces.bot_response import BotResponse
+from covidbot.interfaces.send_pipeline import AIMDRateLimiter
+from covidbot.interfaces.signal_interface import SignalInterface
+
+
+class FakeSemaphoreBot:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+    async def send_message(self, receiver, message, attachments=None) -> bool:
+        return False
+
+
+class FakeBot:
+    def __init__(self, users):
+        self.users = users
+        self.confirmed = []
+        self.disabled = []
+
+    def user_messages_available(self):
+        return True
+
+    def get_available_user_messages(self):
+        for user in self.users:
+            yield "daily-report", user, [BotResponse("Report")]
+
+    def get_report_user_setting(self, user, setting):
+        return True
+
+    def confirm_message_send(self, report_type, user):
+        self.confirmed.append(user)
+
+    def disable_user(self, user):
+        self.disabled.append(user)
+
+
+class TestSignalInterface(TestCase):
+    @patch("covidbot.interfaces.signal_interface.semaphore.Bot", FakeSemaphoreBot)
+    def test_failed_send_lowers_rate(self):
+        bot = FakeBot(["+49123"])
+        interface = SignalInterface(bot, "+49000", "socket", "dev")
+        interface.send_limiter = AIMDRateLimiter(rate=100, max_rate=100)
+
+        asyncio.run(interface.send_unconfirmed_reports())
+        self.assertLess(interface.send_limiter.rate, 100, "A failed send should lower the send rate")
+        self.assertEqual([], bot.disabled, "A user should not be disabled on the first failure")
+        self.assertEqual([], bot.confirmed)
+
+        rate = interface.send_limiter.rate
+        asyncio.run(interface.send_unconfirmed_reports())
+        self.assertEqual(rate, interface.send_limiter.rate, "A failure caused by the user should not lower the rate")
+        self.assertEqual(["+49123"], bot.disabled, "A user should be disabled if sending fails again")
@@ -1,10 +1,11 @@
-from datetime import datetime
+from datetime import datetime, date, timedelta
 from unittest import TestCase
 
 from mysql.connector import MySQLConnection
 
 from covidbot.__main__ import parse_config, get_connection
 from covidbot.covid_data import CovidData
+from covidbot.settings import BotUserSettings
 from covidbot.user_manager import UserManager
 from covidbot.utils import ReportType
 
@@ -79,6 +80,39 @@ class TestSubscriptionManager(TestCase):
         self.test_manager.delete_user(uid1)
         self.assertIsNone(self.test_manager.get_user(uid1), "Return None for a non existing user")
 
+    def test_user_settings(self):
+        uid1 = self.test_manager.get_user_id("testuser1")
+        uid2 = self.test_manager.get_user_id("testuser2")
+        self.test_manager.set_user_setting(uid1, BotUserSettings.BETA, True)
+        self.test_manager.set_user_setting(uid1, BotUserSettings.REPORT_GRAPHICS, False)
+
+        users = {user.id: user for user in self.test_manager.get_all_user(with_subscriptions=True)}
+        for setting in BotUserSettings:
+            self.assertEqual(self.test_manager.get_user_setting(uid1, setting), users[uid1].get_setting(setting),
+                             "Bulk loaded settings should be equal to the stored settings")
+            self.assertEqual(BotUserSettings.default(setting), users[uid2].get_setting(setting),
+                             "Users without settings should have the default settings")
+
+    def test_pending_reports(self):
+        uid = self.test_manager.get_user_id("testuser1")
+        self.test_manager.set_user_activated(uid)
+        self.test_manager.add_subscription(uid, 1)
+        self.test_manager.add_report_subscription(uid, ReportType.CASES_GERMANY)
+        data_update = date.today()
+        self.assertFalse(self.test_manager.has_pending_reports(data_update, [ReportType.CASES_GERMANY]),
+                         "New users should get their first report on the next day")
+
+        with self.conn.cursor() as cursor:
+            cursor.execute('UPDATE bot_user SET created=%s WHERE user_id=%s', [datetime.now() - timedelta(days=2), uid])
+        self.assertTrue(self.test_manager.has_pending_reports(data_update, [ReportType.CASES_GERMANY]))
+        self.assertEqual({uid: [ReportType.CASES_GERMANY]},
+                         self.test_manager.get_pending_reports(data_update, [ReportType.CASES_GERMANY]))
+
+        self.test_manager.add_sent_report(uid, ReportType.CASES_GERMANY)
+        self.assertFalse(self.test_manager.has_pending_reports(data_update, [ReportType.CASES_GERMANY]),
+                         "A sent report should not be pending anymore")
+        self.assertEqual({}, self.test_manager.get_pending_reports(data_update, [ReportType.CASES_GERMANY]))
+
     def test_new_user(self):
         uid1 = self.test_manager.get_user_id("testuser1")
         self.assertIsNotNone(self.test_manager.get_user(uid1), "Getting a user_id should create the user if not "
@@ -121,6 +155,11 @@ class TestSubscriptionManager(TestCase):
         self.assertCountEqual([1, 2], map(lambda u: u.id, self.test_manager.get_all_user()),
                               "All users with subscriptions should be returned")
 
+        self.assertEqual([uid2], [u.id for u in self.test_manager.get_all_user(with_subscriptions=True,
+                                                                                 filter_ids=[uid2])],
+                         "Only the requested users should be returned")
+        self.assertEqual([], self.test_manager.get_all_user(filter_ids=[]))
+
         self.test_manager.rm_subscription(uid2, 1)
         self.assertEqual(uid2, len(self.test_manager.get_all_user()),
                          "Users with removed subscriptions should still exist")
@@ -147,6 +186,10 @@ class TestSubscriptionManager(TestCase):
         CovidData(self.conn)
 
         with self.conn.cursor() as cursor:
+            # noinspection SqlWithoutWhere
+            cursor.execute("DELETE FROM covid_data_calculated")
+            # noinspection SqlWithoutWhere
+            cursor.execute("DELETE FROM incidence_intervals")
             # noinspection SqlWithoutWhere
             cursor.execute("DELETE FROM covid_data")
             cursor.execute("TRUNCATE TABLE covid_vaccinations;")
@@ -1,7 +1,7 @@
 import logging
 from dataclasses import dataclass
-from datetime import datetime
-from typing import List, Optional, Tuple, Union
+from datetime import datetime, date
+from typing import Dict, List, Optional, Tuple, Union
 
 from mysql.connector import MySQLConnection, IntegrityError, OperationalError
 
@@ -18,6 +18,10 @@ class BotUser:
     subscribed_reports: Optional[List[ReportType]] = None
     subscriptions: Optional[List[int]] = None
     activated: bool = False
+    settings: int = BotUserSettings.default_bitmask()
+
+    def get_setting(self, setting: BotUserSettings) -> bool:
+        return bool(self.settings & BotUserSettings.bit(setting))
 
 
 class UserManager(object):
@@ -60,7 +64,12 @@ class UserManager(object):
                 'REFERENCES bot_user(user_id))')
             cursor.execute('CREATE TABLE IF NOT EXISTS bot_user_sent_reports (id INTEGER PRIMARY KEY AUTO_INCREMENT,'
                            ' user_id INTEGER NOT NULL, sent_report DATETIME DEFAULT NOW(), report VARCHAR(40),'
-                           ' FOREIGN KEY(user_id) REFERENCES bot_user(user_id))')
+                           ' FOREIGN KEY(user_id) REFERENCES bot_user(user_id),'
+                           ' INDEX user_report_sent(user_id, report, sent_report))')
+            # Add index to existing tables
+            cursor.execute("SHOW INDEX FROM bot_user_sent_reports WHERE Key_name='user_report_sent'")
+            if not cursor.fetchall():
+                cursor.execute('CREATE INDEX user_report_sent ON bot_user_sent_reports (user_id, report, sent_report)')
             cursor.execute('CREATE TABLE IF NOT EXISTS report_subscriptions '
                            '(user_id INTEGER, added DATETIME(6) DEFAULT CURRENT_TIMESTAMP(6), '
                            'report VARCHAR(40) NOT NULL, '
@@ -136,7 +145,20 @@ class UserManager(object):
                 return False
             return True
 
-    def get_all_user(self, with_subscriptions=False, filter_id=None) -> List[BotUser]:
+    def get_all_user(self, with_subscriptions=False, filter_id=None,
+                     filter_ids: Optional[List[int]] = None) -> List[BotUser]:
+        """
+        Returns the users of this platform
+        :param with_subscriptions: Whether subscribed districts and reports should be loaded
+        :param filter_id: Only return the user with this ID
+        :param filter_ids: Only return the users with these IDs
+        :return: Users ordered by ID, subscriptions ordered by the time they were added
+        """
+        if filter_id:
+            filter_ids = [filter_id]
+        elif filter_ids is not None and not filter_ids:
+            return []
+
         result = []
         with self.connection.cursor(dictionary=True) as cursor:
             if with_subscriptions:
@@ -149,10 +171,15 @@ class UserManager(object):
                         "FROM bot_user WHERE platform=%s"
             args = [self.platform]
 
-            if filter_id:
-                query += " AND bot_user.user_id=%s"
-                args.append(filter_id)
-            query += " ORDER BY bot_user.user_id"
+            if filter_ids:
+                query += f" AND bot_user.user_id IN ({', '.join(['%s'] * len(filter_ids))})"
+                args += filter_ids
+
+            if with_subscriptions:
+                # Reports show the most recently added subscriptions, see Bot.get_multi_incidence_districts
+                query += " ORDER BY bot_user.user_id, s.added, s.rs"
+            else:
+                query += " ORDER BY bot_user.user_id"
 
             cursor.execute(query, args)
 
@@ -187,6 +214,30 @@ class UserManager(object):
             if current_user:
                 result.append(current_user)
 
+            # Settings of all users, instead of querying them one by one
+            users = {user.id: user for user in result}
+            query = "SELECT s.user_id, setting, value FROM bot_user_settings s " \
+                    "JOIN bot_user ON bot_user.user_id = s.user_id WHERE platform=%s"
+            args = [self.platform]
+            if filter_ids:
+                query += f" AND bot_user.user_id IN ({', '.join(['%s'] * len(filter_ids))})"
+                args += filter_ids
+
+            cursor.execute(query, args)
+            for row in cursor.fetchall():
+                if row['user_id'] not in users or row['value'] is None:
+                    continue
+
+                try:
+                    setting = BotUserSettings(row['setting'])
+                except ValueError:
+                    continue
+
+                if row['value']:
+                    users[row['user_id']].settings |= BotUserSettings.bit(setting)
+                else:
+                    users[row['user_id']].settings &= ~BotUserSettings.bit(setting)
+
         return result
 
     def get_user(self, user_id: int, with_subscriptions=False) -> Optional[BotUser]:
@@ -227,6 +278,51 @@ class UserManager(object):
             if row:
                 return row['sent_report']
 
+    def get_pending_reports(self, data_update: date, reports: List[ReportType]) -> Dict[int, List[ReportType]]:
+        """
+        Returns all activated users of this platform that did not receive a report for the current data yet
+        :param data_update: Date of the current data
+        :param reports: Report types that should be checked
+        :return: Pending reports by user id
+        """
+        result: Dict[int, List[ReportType]] = {}
+        if not reports:
+            return result
+
+        query, args = self._pending_reports_query(data_update, reports)
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute(f'SELECT u.user_id, r.report {query}', args)
+            for row in cursor.fetchall():
+                result.setdefault(row['user_id'], []).append(ReportType(row['report']))
+        return result
+
+    def has_pending_reports(self, data_update: date, reports: List[ReportType]) -> bool:
+        """
+        Checks whether any user of this platform did not receive a report for the current data yet
+        :param data_update: Date of the current data
+        :param reports: Report types that should be checked
+        :return: True if a report is pending
+        """
+        if not reports:
+            return False
+
+        query, args = self._pending_reports_query(data_update, reports)
+        with self.connection.cursor(dictionary=True) as cursor:
+            cursor.execute(f'SELECT EXISTS(SELECT 1 {query}) as pending', args)
+            return bool(cursor.fetchone()['pending'])
+
+    def _pending_reports_query(self, data_update: date, reports: List[ReportType]) -> Tuple[str, List]:
+        # Users created today get their first report on the next day
+        placeholders = ', '.join(['%s'] * len(reports))
+        query = ('FROM bot_user u '
+                 'JOIN report_subscriptions r ON r.user_id = u.user_id '
+                 f'WHERE u.platform=%s AND u.activated=1 AND u.created < %s AND r.report IN ({placeholders}) '
+                 'AND EXISTS(SELECT 1 FROM subscriptions s WHERE s.user_id = u.user_id) '
+                 'AND NOT EXISTS(SELECT 1 FROM bot_user_sent_reports sr '
+                 'WHERE sr.user_id = u.user_id AND sr.report = r.report AND sr.sent_report >= %s)')
+        args = [self.platform, date.today()] + [report.value for report in reports] + [data_update]
+        return query, args
+
     def set_language(self, user_id: int, language: str) -> bool:
         with self.connection.cursor(dictionary=True) as cursor:
             cursor.execute("UPDATE bot_user SET language=%s WHERE user_id=%s", [language, user_id])